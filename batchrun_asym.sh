@@ -1,22 +1,10 @@
 #!/bin/bash
 
-all_demands=(450 600 750 900 1050 1200 1350 1500 1650 1800)
-batch_demands=(1350 1500 1650 1800)
+# Processes of the pool, and CPLEX threads per process
+processes=${PROCESSES:-$(nproc)}
+threads=${THREADS:-1}
 
-for ns_d in "${batch_demands[@]}"
-do
-    for ew_d in "${all_demands[@]}"
-    do
-        if [ $ew_d -lt $ns_d ]
-        then
-            echo "Skipping demand ${ns_d}, ${ew_d} for symmetry"
-            continue
-        fi
-
-        # Run the python script
-        python batchrunner_script.py $ns_d $ew_d
-        echo "Done with demand ${ns_d}, ${ew_d}"
-    done
-done
+# All demand pairs of asymm_demand.json; rerunning resumes the campaign where it stopped
+python -m batchrunners.scheduler asymm_demand.json --processes $processes --threads $threads
 
 echo "All done"
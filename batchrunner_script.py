@@ -2,19 +2,70 @@ import os
 import sys
 
 from batchrunners.generators.dataframe import DataframeGenerator
+from batchrunners.cache import SolveCache
+from batchrunners.catalog import Catalog
+from batchrunners.parallel import run_parallel_sweep
+from batchrunners.workqueue import WorkQueue, collect_sweep, submit_sweep
+from ctmmodels.archive import SolutionArchive
+
+DF_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    'dataframes'
+)
 
 def run_test_case(demand1, demand2):
     demand = (demand1, demand2)
+    df_path = DF_PATH
     dg = DataframeGenerator(
-        df_path=os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            'dataframes'
-        )
+        df_path=df_path,
+        archive=SolutionArchive(os.path.join(df_path, 'solution_archive.pkl')),
+        catalog=Catalog(os.path.join(df_path, 'catalog.sqlite')),
+        cache=SolveCache(os.path.join(df_path, 'solve_cache'))
     )
     dg.run_on_simplex(demand, folder='asymm_demand_ringbarrier')
 
+def campaign_generator():
+    df_path = DF_PATH
+    return DataframeGenerator(
+        df_path=df_path,
+        catalog=Catalog(os.path.join(df_path, 'catalog.sqlite')),
+        cache=SolveCache(os.path.join(df_path, 'solve_cache'))
+    )
+
+def run_campaign(ns_demands, ew_demands, threads=1):
+    '''All (NS, EW) demand pairs at once, over a process pool with `threads` CPLEX threads per worker'''
+    demands = [(ns_d, ew_d) for ns_d in ns_demands for ew_d in ew_demands]
+    run_parallel_sweep(campaign_generator(), demands, folder='asymm_demand_ringbarrier', threads=threads)
+
+def submit_campaign(queue_path, ns_demands, ew_demands, threads=1):
+    '''All (NS, EW) demand pairs, queued for `python -m batchrunners.workqueue work QUEUE` on every node'''
+    demands = [(ns_d, ew_d) for ns_d in ns_demands for ew_d in ew_demands]
+    submit_sweep(campaign_generator(), WorkQueue(queue_path), demands, folder='asymm_demand_ringbarrier', threads=threads)
+
+def collect_campaign(queue_path):
+    left = collect_sweep(campaign_generator(), WorkQueue(queue_path))
+    print("Sweeps not done yet: {}".format(left))
+
 def main():
-    run_test_case(int(sys.argv[1]), int(sys.argv[2]))
+    # batchrunner_script.py NS_DEMAND EW_DEMAND
+    # batchrunner_script.py --campaign NS_DEMANDS EW_DEMANDS [THREADS], with comma-separated demands
+    # batchrunner_script.py --submit QUEUE NS_DEMANDS EW_DEMANDS [THREADS]
+    # batchrunner_script.py --collect QUEUE
+    if sys.argv[1] == '--campaign':
+        run_campaign(
+            [int(d) for d in sys.argv[2].split(',')],
+            [int(d) for d in sys.argv[3].split(',')],
+            int(sys.argv[4]) if len(sys.argv) > 4 else 1)
+    elif sys.argv[1] == '--submit':
+        submit_campaign(
+            sys.argv[2],
+            [int(d) for d in sys.argv[3].split(',')],
+            [int(d) for d in sys.argv[4].split(',')],
+            int(sys.argv[5]) if len(sys.argv) > 5 else 1)
+    elif sys.argv[1] == '--collect':
+        collect_campaign(sys.argv[2])
+    else:
+        run_test_case(int(sys.argv[1]), int(sys.argv[2]))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,164 @@
+'''
+Adaptive sampling of the weight simplex.
+
+generate_simplex samples the simplex on a regular grid, while the green plan and KPIs of a sweep stay
+the same over large regions of it. AdaptiveSimplex starts from the coarse grid generate_simplex(coarse)
+and only subdivides, into four, the triangles of the grid whose corners have different green plans or
+KPIs further apart than tol times the range of the KPI over the coarse grid, down to levels
+subdivisions. Coarser triangles are subdivided first, then those with the larger KPI jumps.
+
+Points are integer lattice points (i, j, k) with i + j + k = coarse * 2**levels, so that neighbouring
+triangles share their midpoints; weights gives their (alpha, beta, gamma). interpolate_onto_grid
+brings values at the sampled points onto generate_simplex(steps), for plot_simplex: linearly within
+the smallest sampled triangle that contains each grid point.
+'''
+
+import heapq
+import itertools
+
+import numpy as np
+
+from batchrunners.const import generate_simplex, serpentine_order
+
+
+def _midpoint(u, v):
+    return tuple((a + b) // 2 for a, b in zip(u, v))
+
+
+class AdaptiveSimplex(object):
+
+    def __init__(self, coarse=2, levels=3, tol=0.05, kpis=('delay', 'throughput')):
+        self.coarse = coarse
+        self.levels = levels
+        self.tol = tol
+        self.kpis = kpis
+        self.resolution = coarse * 2**levels
+
+        # {point: {'plan': plan hash, kpi: value}}
+        self.values = {}
+        # Range of every KPI over the coarse grid, which jumps are measured against
+        self.scale = None
+
+        # Triangles, (level, corners), waiting for the values of their corners, to subdivide, and done
+        self._unclassified = []
+        self._queue = []
+        self._leaves = []
+
+        step = 2**levels
+        for i in range(coarse):
+            for j in range(coarse - i):
+                k = coarse - i - j
+                # The upward triangle at (i, j), and the downward one next to it
+                self._unclassified.append((0, ((i*step, j*step, k*step), ((i+1)*step, j*step, (k-1)*step), (i*step, (j+1)*step, (k-1)*step))))
+                if k >= 2:
+                    self._unclassified.append((0, (((i+1)*step, j*step, (k-1)*step), (i*step, (j+1)*step, (k-1)*step), ((i+1)*step, (j+1)*step, (k-2)*step))))
+
+    def weights(self, point):
+        '''(alpha, beta, gamma) of a lattice point'''
+        return tuple(float(c) / self.resolution for c in point)
+
+    def coarse_points(self):
+        step = 2**self.levels
+        return serpentine_order([(i*step, j*step, (self.coarse - i - j)*step)
+                                 for i in range(self.coarse + 1) for j in range(self.coarse - i + 1)])
+
+    def add(self, point, plan, **kpis):
+        '''Results of a solved point: the hash of its green plan, and its KPIs'''
+        self.values[point] = dict(kpis, plan=plan)
+
+    def jump(self, corners):
+        '''Largest difference of a KPI between corners, relative to the KPI's range; inf if the plans differ'''
+        values = [self.values[c] for c in corners]
+        if len(set(v['plan'] for v in values)) > 1:
+            return float('inf')
+        return max([abs(u[k] - v[k]) / self.scale[k]
+                    for u, v in itertools.combinations(values, 2) for k in self.kpis] or [0.0])
+
+    def _classify(self):
+        if self.scale is None:
+            self.scale = {}
+            for k in self.kpis:
+                values = [v[k] for v in self.values.values()]
+                self.scale[k] = (max(values) - min(values)) or max(abs(v) for v in values) or 1.0
+
+        unclassified = []
+        for level, corners in self._unclassified:
+            if not all(c in self.values for c in corners):
+                unclassified.append((level, corners))
+                continue
+            jump = self.jump(corners)
+            if level < self.levels and jump > self.tol:
+                heapq.heappush(self._queue, (level, -jump, corners))
+            else:
+                self._leaves.append((level, corners))
+        self._unclassified = unclassified
+
+    def next_points(self, limit=None):
+        '''
+        Points to solve next: the coarse grid first, then the midpoints of the next triangle to subdivide
+        that were not solved yet, at most limit of them. An empty list once nothing is left to subdivide.
+        '''
+        if not self.values:
+            points = self.coarse_points()
+            if limit is not None and len(points) > limit:
+                raise ValueError("A budget of {} solves does not cover the {} points of the coarse grid".format(limit, len(points)))
+            return points
+
+        self._classify()
+        while self._queue:
+            level, jump, corners = heapq.heappop(self._queue)
+            a, b, c = corners
+            midpoints = [_midpoint(a, b), _midpoint(b, c), _midpoint(a, c)]
+            new = [m for m in midpoints if m not in self.values]
+            if limit is not None and len(new) > limit:
+                # Out of budget for this one; triangles that share solved midpoints may still fit
+                self._leaves.append((level, corners))
+                continue
+
+            ab, bc, ac = midpoints
+            self._unclassified.extend((level + 1, t) for t in [(a, ab, ac), (ab, b, bc), (ac, bc, c), (ab, bc, ac)])
+            if new:
+                return new
+            self._classify()
+        return []
+
+    def leaves(self):
+        '''Triangles, (level, corners), that were not subdivided; together they cover the simplex'''
+        if self.values:
+            self._classify()
+        return self._leaves + [(level, corners) for level, _, corners in self._queue] + self._unclassified
+
+
+def _barycentric(point, corners):
+    matrix = np.array([[c[0] for c in corners], [c[1] for c in corners], [1.0, 1.0, 1.0]])
+    return np.linalg.solve(matrix, [point[0], point[1], 1.0])
+
+
+def interpolate_onto_grid(sampler, data, steps=10, nearest=False):
+    '''
+    Values of data, {lattice point: number or array}, at the points of generate_simplex(steps), as
+    [(weights, value)]. Values are linear within the smallest leaf triangle of the sampler that contains
+    a grid point; with nearest, e.g. for plan ids, they are those of its closest corner.
+    '''
+    leaves = sorted(sampler.leaves(), key=lambda leaf: -leaf[0])
+    grid = []
+    for weights in generate_simplex(steps):
+        point = np.array(weights) * sampler.resolution
+        value = None
+        for _, corners in leaves:
+            if not all(c in data for c in corners):
+                continue
+            l = _barycentric(point, corners)
+            if (l >= -1e-9).all():
+                if nearest:
+                    value = data[corners[int(np.argmax(l))]]
+                else:
+                    value = sum(w * np.asarray(data[c], dtype=np.float64) for w, c in zip(l, corners))
+                break
+
+        if value is None:
+            # Not covered by a triangle with known corners: the closest sampled point
+            closest = min(data, key=lambda c: np.abs(np.array(c) - point).sum())
+            value = data[closest]
+        grid.append((weights, value))
+    return grid
@@ -0,0 +1,132 @@
+'''
+Disk-backed cache of solved points, so that repeating a sweep does not solve the same model again.
+
+A point is addressed by a hash of everything that determines its solution: the model class, the
+constructor parameters, demand, weights and the ctmmodels version (bump ctmmodels.__version__ when a
+change to the models changes their solutions). Each entry is one pickle holding the misc dict of
+DataframeGenerator.run_model, with the solution arrays the result frames are rebuilt from.
+
+The cache is capped in size; entries are evicted least recently used first, with the file modification
+time, which is refreshed on every hit, as the recency.
+'''
+
+import hashlib
+import json
+import numbers
+import os
+import pickle
+
+import numpy as np
+
+import ctmmodels
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, numbers.Real):
+        # 1 and 1.0 are the same weight, and 0.1 + 0.2 should hit the entry of 0.3
+        return round(float(value), 9)
+    return value
+
+
+def point_key(model_class, parameters, demand, alpha, beta, gamma):
+    '''Hash of the inputs of a solve'''
+    inputs = {
+        'model': model_class.__name__,
+        'parameters': parameters,
+        'demand': demand,
+        'weights': (alpha, beta, gamma),
+        'version': ctmmodels.__version__,
+    }
+    return hashlib.sha1(json.dumps(_canonical(inputs), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class SolveCache(object):
+
+    def __init__(self, path, max_bytes=2 * 1024**3):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # Counters of this session; time_saved adds up the solver runtimes of the hits
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key):
+        '''Cached misc dict of a point, or None'''
+        filename = self._file(key)
+        try:
+            with open(filename, 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        os.utime(filename, None)
+        self.hits += 1
+        self.time_saved += entry.get('runtime', 0.0)
+        return entry
+
+    def put(self, key, misc):
+        # The solve's SolveSolution belongs to a live model, and the KPIs are recomputed from the arrays
+        misc = {k: v for k, v in misc.items() if k not in ('solution', 'kpis')}
+
+        # Several workers can write the same entry; each writes its own file, and the last rename wins
+        tmp = '{}.{}.tmp'.format(self._file(key), os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(misc, f, protocol=2)
+        os.rename(tmp, self._file(key))
+
+        self.evict()
+
+    def entries(self):
+        '''(mtime, size, filename) of every entry, least recently used first'''
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                filename = os.path.join(self.path, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    # Evicted by another worker in the meantime
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        '''Removes least recently used entries until the cache fits in max_bytes'''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'time_saved': self.time_saved,
+            'entries': len(self.entries()),
+            'bytes': self.size(),
+        }
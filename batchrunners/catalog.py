@@ -0,0 +1,110 @@
+'''
+SQLite catalog of solves, to find runs by model, parameters and results instead of by folder name.
+
+Each solve is one row: the model class, the constructor parameters (all of them as JSON, and the
+common ones as columns), demand, weights, solver status, runtime, KPIs, and where its arrays are
+stored (a ColumnStore path and row). Queries are plain SQL conditions on those columns, e.g.
+
+    catalog.query("model LIKE '%RingBarrier' AND demand_min >= ? AND alpha > ?", (900, 0.5))
+'''
+
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+from batchrunners.store import json_value
+
+
+PARAMETER_COLUMNS = [
+    'time_range', 'time_step', 'g_min', 'g_max', 'sat_flow_rate', 'flow_rate_reduction',
+    'r_left', 'r_through', 'r_right',
+]
+
+RESULT_COLUMNS = [
+    'status', 'runtime', 'time_to_incumbent', 'delay', 'throughput', 'flow', 'objective_value',
+]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solves (
+    id INTEGER PRIMARY KEY,
+    created REAL,
+    model TEXT,
+    parameters TEXT,
+    demand TEXT,
+    demand_min REAL,
+    demand_max REAL,
+    {parameters},
+    alpha REAL,
+    beta REAL,
+    gamma REAL,
+    status TEXT,
+    runtime REAL,
+    time_to_incumbent REAL,
+    delay REAL,
+    throughput REAL,
+    flow REAL,
+    objective_value REAL,
+    store_path TEXT,
+    store_row INTEGER
+);
+CREATE INDEX IF NOT EXISTS solves_model ON solves (model, demand_min, demand_max);
+CREATE INDEX IF NOT EXISTS solves_weights ON solves (alpha, beta, gamma);
+'''.format(parameters=',\n    '.join('{} REAL'.format(c) for c in PARAMETER_COLUMNS))
+
+
+class Catalog(object):
+
+    def __init__(self, path):
+        self.path = path
+        # Pipelined sweeps record from their writer thread; one thread uses the connection at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, model, parameters, demand, alpha, beta, gamma, results, store_path=None, store_row=None):
+        '''
+        Adds one solve. model is the model class name; parameters the constructor parameters other than
+        demand and the weights; results a dict with any of the RESULT_COLUMNS. Returns the row id.
+        '''
+        demands = np.atleast_1d(np.asarray(demand, dtype=np.float64))
+
+        row = {
+            'created': time.time(),
+            'model': model,
+            'parameters': json.dumps(json_value(parameters), sort_keys=True),
+            'demand': json.dumps(json_value(demand)),
+            'demand_min': float(demands.min()),
+            'demand_max': float(demands.max()),
+            'alpha': alpha,
+            'beta': beta,
+            'gamma': gamma,
+            'store_path': store_path,
+            'store_row': json_value(store_row),
+        }
+        for c in PARAMETER_COLUMNS:
+            row[c] = json_value(parameters.get(c))
+        for c in RESULT_COLUMNS:
+            row[c] = json_value(results.get(c))
+
+        columns = sorted(row)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO solves ({}) VALUES ({})'.format(', '.join(columns), ', '.join('?' * len(columns))),
+                [row[c] for c in columns])
+        return cursor.lastrowid
+
+    def query(self, where=None, params=(), columns='*'):
+        '''DataFrame of the solves matching an SQL condition, e.g. query("alpha > ?", (0.5,))'''
+        import pandas as pd
+
+        sql = 'SELECT {} FROM solves'.format(columns if isinstance(columns, str) else ', '.join(columns))
+        if where:
+            sql += ' WHERE ' + where
+        return pd.read_sql_query(sql + ' ORDER BY id', self.connection, params=params)
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM solves').fetchone()[0]
@@ -81,4 +81,15 @@ def generate_simplex(steps=10):
     normalized = []
     for point in simplex:
         normalized.append((float(point[0]) / steps, float(point[1]) / steps, float(point[2]) / steps))
-    return normalized
\ No newline at end of file
+    return normalized
+
+def serpentine_order(simplex):
+    '''
+    Orders the points of a simplex grid so that successive weight vectors stay close: by alpha, with
+    beta running up and down on alternate alpha levels
+    '''
+    levels = sorted(set(p[0] for p in simplex))
+    ordered = []
+    for n, a in enumerate(levels):
+        ordered.extend(sorted([p for p in simplex if p[0] == a], key=lambda p: p[1], reverse=(n % 2 == 1)))
+    return ordered
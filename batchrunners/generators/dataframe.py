@@ -1,56 +1,191 @@
 import os
+import time
 import numpy as np
-import pandas as pd
 
+from batchrunners.adaptive import AdaptiveSimplex, interpolate_onto_grid
+from batchrunners.cache import point_key
 from batchrunners.const import *
+from batchrunners.plans import PlanPool, encode_plan, plan_hash
+from batchrunners.store import ColumnStore
 from ctmmodels.const import *
+from ctmmodels.archive import archived_mip_start
 from ctmmodels.delaythroughput import DelayThroughputSimplex as OldModel
 from ctmmodels.ringbarrier import DTSimplexRingBarrier as Model
 
 
+# Store columns that identify a point of a sweep; a point solved again replaces its row
+POINT_KEY = ('demand', 'alpha', 'beta', 'gamma')
+
+
 class DataframeGenerator(object):
 
-    def __init__(self, parameters=DEFAULT_PARAMETERS, time_range=TIME_RANGE, df_path=DF_PATH):
-        self.time_range = TIME_RANGE
+    def __init__(self, parameters=DEFAULT_PARAMETERS, time_range=TIME_RANGE, df_path=DF_PATH, archive=None, catalog=None, cache=None, model_cache=None, threads=None, model_class=Model):
+        self.time_range = time_range
 
         self.parameters = parameters
-        self.parameters['time_range'] = TIME_RANGE
+        self.parameters['time_range'] = time_range
         self.df_path = df_path
 
-    def run_model(self, demand, alpha=1, beta=0, gamma=0, log_output=True):
-        model = Model(
+        # Archive of solved green plans (SolutionArchive) to warm start from, if any
+        self.archive = archive
+
+        # Catalog (SQLite) that every solve is recorded in, if any
+        self.catalog = catalog
+
+        # Cache (SolveCache) of solved points, if any
+        self.cache = cache
+
+        # Cache (ModelCache) of built models, if any
+        self.model_cache = model_cache
+
+        # CPLEX threads per solve (all cores by default); set it when several solves share a node
+        self.threads = threads
+
+        # Model swept; any model with the simplex objective (alpha, beta, gamma)
+        self.model_class = model_class
+
+    def build_model(self, demand, alpha=1, beta=0, gamma=0):
+        model = self.model_class(
             demand=demand,
             alpha=alpha,
             beta=beta,
             gamma=gamma,
             **self.parameters
         )
-        model.generate()
-        runtime = model.solve(log_output=log_output)
+        if self.model_cache is not None:
+            self.model_cache.generate(model)
+        else:
+            model.generate()
 
-        dfx, dfy, dfg = model.return_solution()
-        dfparams = model.return_parameters()
-        obj_values = model.return_objective_value()
+        if self.threads is not None:
+            model.model.parameters.threads = self.threads
+        return model
+
+    def results_model(self, demand, alpha=1, beta=0, gamma=0):
+        '''
+        Model with only its sets and parameters, no variables or constraints: enough for the result
+        frames and KPIs of solution arrays, e.g. those of a cached point, but not to solve
+        '''
+        model = self.model_class(
+            demand=demand,
+            alpha=alpha,
+            beta=beta,
+            gamma=gamma,
+            **self.parameters
+        )
+        model.generate_sets()
+        model.generate_parameters()
+        return model
+
+    def run_model(self, demand, alpha=1, beta=0, gamma=0, log_output=True, model=None, mip_start=None):
+        '''
+        Solves the model for one set of weights. A model that was already built for this demand can be
+        passed in, in which case only its objective is swapped; mip_start is used as a warm start.
+        With a cache, points that were solved before are returned from it without solving. Their misc
+        has no 'solution' (SolveCache.put leaves it out), so a sweep that warm starts each point from
+        the previous one starts the solve after a hit cold. Points are cached in the canonical
+        orientation of their demand, so a point that is a rotation of a cached one (see
+        ctmmodels.symmetry) is a hit too.
+        '''
+        return self.finish_point(*self.solve_point(demand, alpha, beta, gamma, log_output, model, mip_start))
+
+    def solve_point(self, demand, alpha=1, beta=0, gamma=0, log_output=True, model=None, mip_start=None):
+        '''
+        The solver half of run_model: solves the point, or looks it up in the cache, and takes what
+        finish_point needs from the model before its next solve. Returns the arguments of finish_point.
+        A hit with no model passed in does not build one; it gets a results_model.
+        '''
+        key, r = None, 0
+        if self.cache is not None:
+            model_class = self.model_class if model is None else type(model)
+            r, canonical_demand, canonical_preload = model_class.canonical_rotation(demand, self.parameters.get('preload'))
+            parameters = dict(self.parameters)
+            if canonical_preload is not None:
+                parameters['preload'] = canonical_preload
+
+            key = point_key(model_class, parameters, canonical_demand, alpha, beta, gamma)
+            cached = self.cache.get(key)
+            if cached is not None:
+                if model is None:
+                    model = self.results_model(demand, alpha, beta, gamma)
+                return model, cached, key, r, True
+
+        if model is None:
+            model = self.build_model(demand, alpha, beta, gamma)
+        else:
+            model.set_weights(alpha, beta, gamma)
+
+        mip_starts = [mip_start]
+        if self.archive is not None:
+            mip_starts.append(archived_mip_start(model, self.archive))
+
+        runtime = model.solve(log_output=log_output, mip_start=mip_starts)
+
+        if self.archive is not None:
+            self.archive.add(model)
 
         misc = {}
+        misc['runtime'] = runtime
+        misc['status'] = model.model.solve_details.status
+        misc['time_to_incumbent'] = model._time_to_incumbent
+        misc['solution'] = model.model.solution
+        misc['obj_value'] = model.model.objective_value
+        misc['arrays'] = model.solution_arrays()
+
+        return model, misc, key, r, False
+
+    def finish_point(self, model, misc, key=None, r=0, cached=False):
+        '''
+        The rest of run_model: the result frames and KPIs of a point from solve_point, which only read the
+        solution arrays, so the model can be solving its next point meanwhile. Caches solved points.
+        '''
+        if cached:
+            return self.cached_point(model, misc, r)
+
+        values = misc['arrays']
+        dfx, dfy, dfg = model.return_solution(values)
+        dfparams = model.return_parameters()
+        kpis = model.kpis(values, misc['obj_value'])
+
         misc['capacity'] = dfparams.capacity[(3,0,1)]
         misc['maxflow'] = dfparams.max_flow[(3,0,1)]
-        misc['runtime'] = runtime
-        misc['delay'] = obj_values[0]
-        misc['throughput'] = obj_values[1]
-        misc['obj_value'] = obj_values[2]
-        
+        misc['delay'] = kpis.delay
+        misc['throughput'] = kpis.throughput
+        misc['kpis'] = kpis
+
+        if self.cache is not None:
+            self.cache.put(key, dict(misc, arrays=model.rotate_solution(values, r)))
+
+        return dfx, dfy, dfg, misc
+
+    def cached_point(self, model, misc, r):
+        '''Results of a cached point for the model; the cached solution is rotated back by r'''
+        values = model.rotate_solution(misc['arrays'], (APPROACHES - r) % APPROACHES)
+        dfx, dfy, dfg = model.return_solution(values)
+
+        misc = dict(misc)
+        misc['arrays'] = values
+        misc['kpis'] = model.kpis(values, misc['obj_value'])
+
         return dfx, dfy, dfg, misc
 
     def save_df(self, df, filename):
         df.to_pickle(filename + ".pkl")
 
-    def run_on_simplex(self, demand, simplex_slice=generate_simplex(10), log_output=False, folder='simplex', parameters=None, save_decision_variables=False, varying_label=None):
+    def run_on_simplex(self, demand, simplex_slice=generate_simplex(10), log_output=False, folder='simplex', parameters=None, save_decision_variables=False, varying_label=None, warm_start=True, save_pickles=False):
         '''
         Runs the model on a 3-simplex, across a set of parameters.
         By default, the varying parameter is demand.
+        With warm_start, the points are visited in serpentine order and each solve starts from the
+        solution of the previous point.
+        Every point is appended to the ColumnStore in store_<label> as soon as it is solved: its
+        parameters, results and the id of its green plan, plus volumes and flows with
+        save_decision_variables, as float32 (T x cells) and (T x edges) tensors that SolutionTensors
+        reads by cell, edge or time. The plans themselves are kept once each in the PlanPool in
+        store_<label>/plans. The memory_report of the model is kept in the store meta, to size worker
+        pools by; pass lean=True in the parameters for models without constraint objects.
+        save_pickles also writes the old per-point pickles.
         '''
-
         if parameters is None:
             parameters = self.parameters
         if varying_label is None:
@@ -58,22 +193,167 @@ class DataframeGenerator(object):
 
         _df_tuples = []
         _path = os.path.join(self.df_path, folder)
-    
-        for p in simplex_slice:
-            a, b, c = p
-            dfx, dfy, dfg, misc = self.run_model(demand=demand, alpha=a, beta=b, gamma=c, log_output=log_output)
-            _df_tuples.append((demand, misc['runtime'], misc['delay'], misc['throughput'], misc['obj_value'], a, b, c))
-
-            if save_decision_variables:
-                self.save_df(dfx, "{}/volumes/volumes_{}_a{}_b{}_c{}".format(_path, varying_label, a, b, c))
-                self.save_df(dfy, "{}/flows/flows_{}_a{}_b{}_c{}".format(_path, varying_label, a, b, c))
-
-            self.save_df(dfg, "{}/greentimes/greentimes_{}_a{}_b{}_c{}".format(_path, varying_label, a, b, c))
-
-            print("Done with point ({}, {}, {})!\n".format(a, b, c))
-        
-        df = pd.DataFrame(data=_df_tuples,columns=['demand', 'runtime', 'delay', 'throughput', 'objective_value', 'alpha', 'beta', 'gamma'])
-        self.save_df(df, "{}/results_simplex_{}".format(_path, varying_label))
+
+        sweep_start = time.time()
+
+        # Only the objective depends on the weights, so the model is built once for the whole simplex
+        model = self.build_model(demand)
+        meta = self.sweep_meta(model)
+
+        store, plans = self.open_store(_path, varying_label, parameters, meta)
+        print("Model memory: {}".format(store.meta['memory']))
+
+        if warm_start:
+            simplex_slice = serpentine_order(simplex_slice)
+        mip_start = None
+
+        try:
+            for p in simplex_slice:
+                a, b, c = p
+                dfx, dfy, dfg, misc = self.run_model(demand=demand, alpha=a, beta=b, gamma=c, log_output=log_output, model=model, mip_start=mip_start)
+
+                if warm_start:
+                    mip_start = misc.get('solution')
+
+                _df_tuples.append(self.record_point(store, plans, meta, parameters, demand, p, misc,
+                                                    time.time() - sweep_start, save_decision_variables))
+
+                if save_pickles:
+                    self.save_point_frames(dfx, dfy, dfg, _path, varying_label, p, save_decision_variables)
+
+                print("Done with point ({}, {}, {})!\n".format(a, b, c))
+        finally:
+            self.save_archive()
+
+        print("Simplex sweep done in {} seconds".format(time.time() - sweep_start))
+        if self.cache is not None:
+            print("Solve cache: {}".format(self.cache.stats()))
+
+        self.save_results(_df_tuples, _path, varying_label)
+
+    def run_adaptive_simplex(self, demand, coarse=2, levels=3, budget=66, tol=0.05, kpis=('delay', 'throughput'), grid_steps=10, log_output=False, folder='simplex', parameters=None, save_decision_variables=False, varying_label=None):
+        '''
+        Runs the model on an adaptively refined 3-simplex (see batchrunners.adaptive): the coarse grid
+        generate_simplex(coarse), then the midpoints of the triangles across which the green plan changes
+        or the kpis (keys of run_model's misc) jump by more than tol of their range, for at most budget
+        solves. Each point is warm started from the closest point solved before.
+        The solved points go to the store and catalog as in run_on_simplex, and to results_adaptive_<label>;
+        results_simplex_<label> has their results interpolated onto generate_simplex(grid_steps), so that
+        plot_obj_values and plot_simplex work as for a regular sweep.
+        '''
+        if parameters is None:
+            parameters = self.parameters
+        if varying_label is None:
+            varying_label = "d{}".format(demand)
+
+        _path = os.path.join(self.df_path, folder)
+        sweep_start = time.time()
+
+        model = self.build_model(demand)
+        meta = self.sweep_meta(model)
+        store, plans = self.open_store(_path, varying_label, parameters, meta)
+
+        sampler = AdaptiveSimplex(coarse, levels, tol, kpis)
+        rows = {}
+        solutions = {}
+
+        try:
+            points = sampler.next_points(budget)
+            while points:
+                for q in points:
+                    a, b, c = sampler.weights(q)
+                    closest = min(solutions, key=lambda s: sum(abs(x - y) for x, y in zip(s, q))) if solutions else None
+                    dfx, dfy, dfg, misc = self.run_model(demand=demand, alpha=a, beta=b, gamma=c, log_output=log_output, model=model, mip_start=solutions.get(closest))
+
+                    if misc.get('solution') is not None:
+                        solutions[q] = misc['solution']
+
+                    rows[q] = self.record_point(store, plans, meta, parameters, demand, (a, b, c), misc,
+                                                time.time() - sweep_start, save_decision_variables)
+                    green = misc['arrays']['g']
+                    sampler.add(q, plan_hash(encode_plan(green), green.shape), **{k: misc[k] for k in kpis})
+
+                points = sampler.next_points(budget - len(rows))
+        finally:
+            self.save_archive()
+
+        print("Adaptive sweep: {} solves instead of {}, in {} seconds".format(
+            len(rows), len(generate_simplex(sampler.resolution)), time.time() - sweep_start))
+
+        self.save_results([rows[q] for q in sorted(rows)], _path, varying_label, prefix='results_adaptive')
+
+        # demand, then the numeric columns interpolated, then the weights of the grid point
+        grid = interpolate_onto_grid(sampler, {q: row[1:7] for q, row in rows.items()}, grid_steps)
+        self.save_results([(demand,) + tuple(values) + weights for weights, values in grid], _path, varying_label)
+
+    def save_archive(self):
+        '''Saves the solution archive, if it has a file; sweeps call it when they end, however they end'''
+        if self.archive is not None and self.archive.path is not None:
+            self.archive.save()
+
+    def sweep_meta(self, model):
+        '''What the store of a sweep records about its model: class, cell layout and memory_report'''
+        return dict(
+            model=type(model).__name__,
+            movements=[list(c) for c in model.set_C_I],
+            cells=[list(c) for c in model.set_C],
+            edges=[[list(i), list(j)] for i, j in model.set_E],
+            memory=model.memory_report(),
+            plan_rows={block: keys for block, keys, _ in model.variable_blocks()}['g'],
+        )
+
+    def open_store(self, path, varying_label, parameters, meta):
+        '''ColumnStore and PlanPool of a sweep, with the sweep_meta of its model in the store meta'''
+        store = ColumnStore(os.path.join(path, "store_{}".format(varying_label)))
+        store.set_meta(parameters=parameters, varying_label=varying_label,
+                       **{k: v for k, v in meta.items() if k != 'plan_rows'})
+        plans = PlanPool(os.path.join(store.path, 'plans'))
+        return store, plans
+
+    def record_point(self, store, plans, meta, parameters, demand, point, misc, elapsed, save_decision_variables=False):
+        '''
+        Writes a solved point to the sweep's store, over its row if the point was solved before, and
+        to the catalog if any. Returns its row of the results_simplex frame.
+        '''
+        a, b, c = point
+        values = misc['arrays']
+        row = dict(
+            demand=np.asarray(demand, dtype=np.float64),
+            alpha=a, beta=b, gamma=c,
+            runtime=misc['runtime'],
+            delay=misc['delay'],
+            throughput=misc['throughput'],
+            objective_value=misc['obj_value'],
+            time_to_incumbent=misc['time_to_incumbent'],
+            elapsed=elapsed,
+            plan=np.int32(plans.add(values['g'], meta['plan_rows'])),
+        )
+        if save_decision_variables:
+            row['volume'] = values['x'].T.astype(np.float32)
+            row['flow'] = values['y'].T.astype(np.float32)
+        store_row = store.upsert(POINT_KEY, **row)
+
+        if self.catalog is not None:
+            self.catalog.record(meta['model'], parameters, demand, a, b, c, dict(
+                misc, objective_value=misc['obj_value'], flow=misc['kpis'].flow),
+                store_path=store.path, store_row=store_row)
+
+        return (demand, misc['runtime'], misc['delay'], misc['throughput'], misc['obj_value'], misc['time_to_incumbent'], elapsed, a, b, c)
+
+    def save_point_frames(self, dfx, dfy, dfg, path, varying_label, point, save_decision_variables=False):
+        '''The old per-point pickles of a sweep'''
+        a, b, c = point
+        if save_decision_variables:
+            self.save_df(dfx, "{}/volumes/volumes_{}_a{}_b{}_c{}".format(path, varying_label, a, b, c))
+            self.save_df(dfy, "{}/flows/flows_{}_a{}_b{}_c{}".format(path, varying_label, a, b, c))
+
+        self.save_df(dfg, "{}/greentimes/greentimes_{}_a{}_b{}_c{}".format(path, varying_label, a, b, c))
+
+    def save_results(self, df_tuples, path, varying_label, prefix='results_simplex'):
+        import pandas as pd
+
+        df = pd.DataFrame(data=df_tuples,columns=['demand', 'runtime', 'delay', 'throughput', 'objective_value', 'time_to_incumbent', 'elapsed', 'alpha', 'beta', 'gamma'])
+        self.save_df(df, "{}/{}_{}".format(path, prefix, varying_label))
 
     def test_package(self):
         print("Hello!")
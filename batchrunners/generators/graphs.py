@@ -1,13 +1,15 @@
+'''
+Plots of sweep results. matplotlib, seaborn and ternary are only imported by the methods that draw,
+so that importing this module costs nothing in workers that never plot.
+'''
+
 import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import ternary
 
 from batchrunners.const import *
+from batchrunners.const import _all_phases, _all_phases_labels
+from batchrunners.plans import PlanPool, plan_intervals
 from ctmmodels.const import *
-from ctmmodels.delaythroughput import DelayThroughputSimplex as Model
 
 
 class GraphGenerator(object):
@@ -21,6 +23,10 @@ class GraphGenerator(object):
         self.folder = folder
 
     def plot_volume(self, dfx, cell_path, title, filename='volume.png'):
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        import seaborn as sns
+
         dfx_approach = pd.concat([
             dfx[dfx.cell == c].sort_values(by='timestep')
             for c in cell_path
@@ -50,6 +56,10 @@ class GraphGenerator(object):
             return fig
 
     def plot_flow(self, dfy, cell_path, title, filename='flow.png'):
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        import seaborn as sns
+
         dfy_approach = pd.concat([
             dfy[dfy.cell_from == c].groupby(['cell_from', 'timestep']).agg({'flow': 'sum'}).sort_values(by='timestep')
             for c in cell_path
@@ -78,14 +88,27 @@ class GraphGenerator(object):
         else:
             return fig
 
-    def plot_greentime(self, dfg, title, filename='greentime.png'):
-        dfg_map = dfg.pivot(index='timestep', columns='cell', values='is_green')
+    def plot_greentime(self, plans, title, filename='greentime.png', plan_id=None):
+        '''
+        Green times of a point: plans is the sweep's PlanPool and plan_id the point's plan in the store,
+        drawn by plot_plan. A greentime DataFrame from the old per-point pickles (save_pickles) is still
+        pivoted and plotted per movement.
+        '''
+        if isinstance(plans, PlanPool):
+            if plan_id is None:
+                raise ValueError('plot_greentime needs the plan_id of the point in the PlanPool')
+            return self.plot_plan(plans, plan_id, title, filename)
+
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        dfg_map = plans.pivot(index='timestep', columns='cell', values='is_green')
 
         fig, axs = plt.subplots(8,1,figsize=(18,18), sharey=True)
 
         for ndx, t in enumerate(_all_phases):
             sns.lineplot(data=dfg_map[t], ax=axs[ndx])
-            axs[ndx].text(0.01,.5,self.all_phases_labels[ndx],
+            axs[ndx].text(0.01,.5,_all_phases_labels[ndx],
                 horizontalalignment='left',
                 transform=axs[ndx].transAxes,
                 fontsize='large')
@@ -99,6 +122,42 @@ class GraphGenerator(object):
         else:
             return fig
 
+    def plot_plan(self, pool, plan_id, title, filename='plan.png'):
+        '''Green intervals of a plan from a sweep's PlanPool, one bar row per phase or movement'''
+        import matplotlib.pyplot as plt
+
+        plan = pool.plan(plan_id)
+        rows = pool.rows() or list(range(plan.shape[0]))
+
+        fig, ax = plt.subplots(figsize=(18, 0.6 * len(rows) + 2))
+
+        bars = {}
+        for n, start, duration in plan_intervals(plan):
+            bars.setdefault(n, []).append((start, duration))
+        for n, intervals in bars.items():
+            ax.broken_barh(intervals, (n - 0.4, 0.8))
+
+        ax.set_yticks(range(len(rows)))
+        ax.set_yticklabels([str(r) for r in rows])
+        ax.set_xlabel('Timesteps')
+        ax.set_xticks(self.time_ticks, minor=True)
+        ax.set_title(title)
+
+        if self.headless:
+            fig.savefig(os.path.join(self.image_path, self.folder, filename))
+            plt.close(fig)
+        else:
+            return fig
+
+    def plot_plan_ids(self, store, title, filename='plans.png'):
+        '''Which points of a sweep share a green plan: the plan id of each point on the simplex'''
+        points = zip(store.column('alpha'), store.column('beta'), store.column('gamma'), store.column('plan'))
+        plan_dict = {
+            (a*self.simplex_range, b*self.simplex_range, c*self.simplex_range): int(p)
+            for a, b, c, p in points
+        }
+        return self.plot_simplex(plan_dict, title, filename)
+
     def plot_obj_values(self, df, title_partial, filename_partial='obj'):
         df_nparr = df.values
         delay_dict = {}
@@ -123,6 +182,9 @@ class GraphGenerator(object):
         self.plot_simplex(runtime_dict, "{} (Runtime)".format(title_partial), "{}_runtime.png".format(filename_partial))
 
     def plot_simplex(self, data, title, filename, tax=None, cb_kwargs={}):
+        import matplotlib.pyplot as plt
+        import ternary
+
         if tax is None:
             fig, tax = ternary.figure(scale=self.simplex_range)
             fig.set_size_inches(10, 8)
@@ -0,0 +1,183 @@
+'''
+Parallel simplex sweeps over a process pool.
+
+A campaign sweeps a list of demands over the same simplex of weights. Its (demand, weights) points are
+cut into tasks of chunk_size consecutive points of one demand, in the order run_on_simplex visits them.
+A worker builds the model of the task's demand and warm starts each point from the previous point of
+the same task only, so a point is solved the same way whichever worker runs its task, and whenever.
+Every worker's CPLEX is limited to a fixed number of threads, and by default the pool has as many
+processes as that leaves cores for.
+
+Workers only solve. The parent receives the tasks back in task order and writes each demand's store,
+catalog rows and results_simplex_<label> frame through the DataframeGenerator, exactly as
+run_on_simplex does, so a parallel campaign leaves the same files as the sequential sweeps.
+'''
+
+import multiprocessing
+import os
+import time
+
+from batchrunners.cache import SolveCache
+from batchrunners.const import generate_simplex, serpentine_order
+from batchrunners.generators.dataframe import DataframeGenerator
+from ctmmodels.modelcache import ModelCache
+
+# DataframeGenerator of a worker process, set up by _init_worker
+_generator = None
+
+
+def _worker_settings(generator, threads):
+    '''What a worker needs to set up its own copy of the generator'''
+    return dict(
+        parameters=generator.parameters,
+        time_range=generator.time_range,
+        df_path=generator.df_path,
+        model_class=generator.model_class,
+        threads=threads,
+        cache=None if generator.cache is None else (generator.cache.path, generator.cache.max_bytes),
+        model_cache=None if generator.model_cache is None else generator.model_cache.path,
+    )
+
+
+def _init_worker(settings):
+    global _generator
+
+    # Workers solve and cache; the catalog and the stores are written by the parent only
+    _generator = DataframeGenerator(
+        parameters=dict(settings['parameters']),
+        time_range=settings['time_range'],
+        df_path=settings['df_path'],
+        cache=None if settings['cache'] is None else SolveCache(*settings['cache']),
+        model_cache=None if settings['model_cache'] is None else ModelCache(settings['model_cache']),
+        threads=settings['threads'],
+        model_class=settings['model_class'])
+    _generator.parameters.update(settings['parameters'])
+
+
+def _solve_task(task):
+    '''Solves the points of a task in a worker; returns the sweep_meta of the model and the results'''
+    demand, varying_label, points, options = task
+    dg = _generator
+
+    model = dg.build_model(demand)
+    meta = dg.sweep_meta(model)
+    path = os.path.join(dg.df_path, options['folder'])
+
+    results = []
+    mip_start = None
+    for p in points:
+        a, b, c = p
+        dfx, dfy, dfg, misc = dg.run_model(demand=demand, alpha=a, beta=b, gamma=c, log_output=options['log_output'], model=model, mip_start=mip_start)
+
+        if options['warm_start']:
+            mip_start = misc.get('solution')
+
+        if options['save_pickles']:
+            dg.save_point_frames(dfx, dfy, dfg, path, varying_label, p, options['save_decision_variables'])
+
+        # The SolveSolution belongs to this worker's model
+        misc = {k: v for k, v in misc.items() if k != 'solution'}
+        results.append((p, misc, time.time() - options['start']))
+
+    return meta, results
+
+
+def sweep_options(folder='simplex', log_output=False, save_decision_variables=False, warm_start=True, save_pickles=False):
+    '''Options of the tasks of a sweep, as _solve_task reads them'''
+    return dict(folder=folder, log_output=log_output, save_decision_variables=save_decision_variables,
+                warm_start=warm_start, save_pickles=save_pickles, start=time.time())
+
+
+def campaign_tasks(demands, simplex_slice, chunk_size, warm_start=True):
+    '''(demand, varying_label, points) of every task, demand by demand'''
+    tasks = []
+    for demand in demands:
+        points = serpentine_order(simplex_slice) if warm_start else list(simplex_slice)
+        for n in range(0, len(points), chunk_size):
+            tasks.append((demand, "d{}".format(demand), points[n:n + chunk_size]))
+    return tasks
+
+
+def solve_tasks(generator, tasks, options, processes=None, threads=1):
+    '''
+    Solves tasks, (demand, varying_label, points), with copies of the generator in a pool of processes,
+    and yields (task, outcome) in task order as they complete. The outcome is (sweep_meta, results),
+    or the exception the task failed with. With a single process the tasks are solved in this process.
+    '''
+    if processes is None:
+        processes = max(1, multiprocessing.cpu_count() // threads)
+    settings = _worker_settings(generator, threads)
+
+    if processes == 1:
+        _init_worker(settings)
+        for task in tasks:
+            try:
+                outcome = _solve_task(task + (options,))
+            except Exception as e:
+                outcome = e
+            yield task, outcome
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker, (settings,))
+    try:
+        outcomes = pool.imap(_solve_task, [task + (options,) for task in tasks])
+        for task in tasks:
+            try:
+                outcome = next(outcomes)
+            except Exception as e:
+                outcome = e
+            yield task, outcome
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def run_parallel_sweep(generator, demands, simplex_slice=generate_simplex(10), folder='simplex', processes=None, threads=1, chunk_size=11, log_output=False, save_decision_variables=False, warm_start=True, save_pickles=False):
+    '''
+    Runs generator.run_on_simplex for every demand, with the points spread across a pool of
+    processes, each running CPLEX with `threads` threads. The workers use the generator's parameters,
+    model class, solve cache and model cache; its catalog is filled by this process. The archive is
+    not used.
+    '''
+    if processes is None:
+        processes = max(1, multiprocessing.cpu_count() // threads)
+
+    path = os.path.join(generator.df_path, folder)
+    parameters = generator.parameters
+
+    options = sweep_options(folder, log_output, save_decision_variables, warm_start, save_pickles)
+    campaign_start = options['start']
+    tasks = campaign_tasks(demands, simplex_slice, chunk_size, warm_start)
+    outcomes = solve_tasks(generator, tasks, options, processes, threads)
+
+    for demand in demands:
+        varying_label = "d{}".format(demand)
+        store = None
+        _df_tuples = []
+
+        for _ in [t for t in tasks if t[1] == varying_label]:
+            _, outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                outcomes.close()
+                raise outcome
+
+            meta, points = outcome
+            if store is None:
+                store, plans = generator.open_store(path, varying_label, parameters, meta)
+
+            for p, misc, elapsed in points:
+                _df_tuples.append(generator.record_point(store, plans, meta, parameters, demand, p, misc,
+                                                         elapsed, save_decision_variables))
+
+        generator.save_results(_df_tuples, path, varying_label)
+        print("Done with demand {} ({} points) at {} seconds".format(demand, len(_df_tuples), time.time() - campaign_start))
+
+    # Lets the pool shut down
+    for _ in outcomes:
+        pass
+
+    print("Campaign of {} demands on {} processes x {} threads done in {} seconds".format(
+        len(demands), processes, threads, time.time() - campaign_start))
@@ -0,0 +1,186 @@
+'''
+Pipelined simplex sweeps: building, solving and writing overlap.
+
+A sweep of run_on_simplex does three kinds of work one after the other: building the model of a
+demand (Python, one thread), solving its points (CPLEX, which releases the GIL while it solves) and
+turning each solution into result frames and store rows (Python and numpy). Here they are three
+stages on their own threads, linked by bounded queues:
+
+    build   builds the models of the next demands, at most depth models ahead of the solver
+    solve   solves the points of one model after the other, in this thread, so Ctrl-C still
+            stops CPLEX; it only keeps the solution arrays of each point
+    write   finish_point, the store, catalog and results_simplex frames of the solved points,
+            which may trail the solver by up to depth sweeps
+
+so that the model of demand k+1 is built and the points of demand k-1 are written while demand k is
+solving. Every stage times the work it does and the time it waits on its neighbours; the report of a
+run gives each stage's utilization, its busy time over the wall time of the run.
+'''
+
+import os
+import threading
+import time
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from batchrunners.const import generate_simplex, serpentine_order
+
+
+# Ends the items of a queue
+_DONE = None
+
+
+class Stage(object):
+    '''Time a pipeline stage spends working, and waiting for input or for room in its output'''
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.waiting_input = 0.0
+        self.waiting_output = 0.0
+        self.items = 0
+        self.error = None
+
+    def get(self, queue):
+        start = time.time()
+        item = queue.get()
+        self.waiting_input += time.time() - start
+        return item
+
+    def put(self, queue, item):
+        start = time.time()
+        queue.put(item)
+        self.waiting_output += time.time() - start
+
+    def report(self, wall):
+        return dict(
+            items=self.items,
+            busy=self.busy,
+            waiting_input=self.waiting_input,
+            waiting_output=self.waiting_output,
+            utilization=self.busy / wall if wall else 0.0,
+        )
+
+
+def _build(generator, demands, built, stage):
+    try:
+        for demand in demands:
+            start = time.time()
+            model = generator.build_model(demand)
+            meta = generator.sweep_meta(model)
+            stage.busy += time.time() - start
+            stage.items += 1
+            stage.put(built, (demand, model, meta))
+    except Exception as e:
+        stage.error = e
+    finally:
+        stage.put(built, _DONE)
+
+
+def _write(generator, path, parameters, options, solved, stage):
+    store = plans = None
+    _df_tuples = []
+    while True:
+        item = stage.get(solved)
+        if item is _DONE:
+            return
+        if stage.error is not None:
+            # Drains the queue, so that the solver is not blocked; it stops on the error
+            continue
+
+        start = time.time()
+        try:
+            kind, demand, varying_label = item[:3]
+            if kind == 'open':
+                store, plans = generator.open_store(path, varying_label, parameters, item[3])
+                meta = item[3]
+                _df_tuples = []
+            elif kind == 'point':
+                p, point, elapsed = item[3:]
+                dfx, dfy, dfg, misc = generator.finish_point(*point)
+                _df_tuples.append(generator.record_point(store, plans, meta, parameters, demand, p, misc,
+                                                         elapsed, options['save_decision_variables']))
+                if options['save_pickles']:
+                    generator.save_point_frames(dfx, dfy, dfg, path, varying_label, p, options['save_decision_variables'])
+                stage.items += 1
+            else:
+                generator.save_results(_df_tuples, path, varying_label)
+        except Exception as e:
+            stage.error = e
+        stage.busy += time.time() - start
+
+
+def run_pipelined_sweep(generator, demands, simplex_slice=generate_simplex(10), folder='simplex', depth=1, log_output=False, save_decision_variables=False, warm_start=True, save_pickles=False):
+    '''
+    Runs generator.run_on_simplex for every demand, with the build of the next model and the writing
+    of the previous sweep overlapping the solves. Leaves the same files as the sequential sweeps.
+    Returns the utilization report of the build, solve and write stages.
+    '''
+    path = os.path.join(generator.df_path, folder)
+    parameters = generator.parameters
+    options = dict(save_decision_variables=save_decision_variables, save_pickles=save_pickles)
+    points = serpentine_order(simplex_slice) if warm_start else list(simplex_slice)
+
+    build, solve, write = Stage('build'), Stage('solve'), Stage('write')
+    built = Queue(maxsize=depth)
+    solved = Queue(maxsize=depth * len(points))
+
+    campaign_start = time.time()
+    threads = [
+        threading.Thread(target=_build, args=(generator, demands, built, build)),
+        threading.Thread(target=_write, args=(generator, path, parameters, options, solved, write)),
+    ]
+    for thread in threads:
+        # A Ctrl-C in the solver does not wait for the other stages
+        thread.daemon = True
+        thread.start()
+
+    try:
+        while True:
+            item = solve.get(built)
+            if item is _DONE:
+                break
+            demand, model, meta = item
+            varying_label = "d{}".format(demand)
+            solve.put(solved, ('open', demand, varying_label, meta))
+
+            sweep_start = time.time()
+            mip_start = None
+            for p in points:
+                start = time.time()
+                a, b, c = p
+                point = generator.solve_point(demand, a, b, c, log_output, model, mip_start)
+                if warm_start:
+                    mip_start = point[1].get('solution')
+                solve.busy += time.time() - start
+                solve.items += 1
+
+                solve.put(solved, ('point', demand, varying_label, p, point, time.time() - sweep_start))
+                if write.error is not None:
+                    raise write.error
+
+            solve.put(solved, ('close', demand, varying_label))
+            print("Solved demand {} ({} points) at {} seconds".format(demand, len(points), time.time() - campaign_start))
+
+        if build.error is not None:
+            raise build.error
+    finally:
+        solve.put(solved, _DONE)
+        generator.save_archive()
+
+    threads[1].join()
+    if write.error is not None:
+        raise write.error
+
+    wall = time.time() - campaign_start
+    report = {stage.name: stage.report(wall) for stage in (build, solve, write)}
+    report['wall'] = wall
+
+    print("Pipelined campaign of {} demands done in {} seconds".format(len(demands), wall))
+    for stage in (build, solve, write):
+        print("  {:<6} {:6.1%} busy, {:.1f}s waiting for input, {:.1f}s waiting for output".format(
+            stage.name, report[stage.name]['utilization'], stage.waiting_input, stage.waiting_output))
+    return report
@@ -0,0 +1,99 @@
+'''
+Compact, deduplicated storage of green plans.
+
+A green plan is the binary green block of a solution (phases or movements x timesteps). It is stored
+bit-packed, 8 entries per byte, and identified by a hash of its shape and bits. Neighbouring points of
+a sweep often end up with the same plan, so a sweep keeps its plans in a PlanPool, where each distinct
+plan is stored once, and the points only refer to it by id.
+
+plan_intervals gives the run-length form of a plan, (row, start, duration) for every green interval.
+'''
+
+import hashlib
+
+import numpy as np
+
+from batchrunners.store import ColumnStore
+
+
+def encode_plan(green):
+    '''Bit-packed form of a (row, t) green array'''
+    return np.packbits(np.round(green).astype(np.uint8).ravel())
+
+
+def decode_plan(packed, shape):
+    shape = tuple(shape)
+    return np.unpackbits(np.asarray(packed, dtype=np.uint8))[:int(np.prod(shape))].reshape(shape)
+
+
+def plan_hash(packed, shape):
+    digest = hashlib.sha1(np.array(shape, dtype=np.int64).tobytes())
+    digest.update(np.asarray(packed, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
+
+def plan_intervals(green, rows=None):
+    '''
+    Green intervals of a plan, as (row, start, duration) sorted by row and start. rows labels the rows
+    of the plan (phases or movements); row indices are used by default.
+    '''
+    green = np.round(green).astype(np.int8)
+    if rows is None:
+        rows = range(green.shape[0])
+
+    padded = np.zeros((green.shape[0], green.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = green
+    edges = np.diff(padded, axis=1)
+
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+
+    return [(rows[n], int(start), int(end - start)) for (n, start), (_, end) in zip(starts, ends)]
+
+
+class PlanPool(object):
+
+    def __init__(self, path):
+        self.store = ColumnStore(path)
+        self.ids = {}
+        if len(self.store):
+            for n, h in enumerate(self.store.column('hash')):
+                self.ids[h.decode('ascii')] = n
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def shape(self):
+        return tuple(self.store.meta['shape'])
+
+    def add(self, green, rows=None):
+        '''
+        Id of a plan in the pool, adding it if it is not there yet. rows, the labels of the plan rows,
+        are kept in the pool header when the first plan is added.
+        '''
+        if not self.store.meta:
+            self.store.set_meta(shape=list(green.shape), rows=None if rows is None else [list(r) for r in rows])
+        elif tuple(green.shape) != self.shape:
+            raise ValueError("Plan shape {} does not match the pool's {}".format(green.shape, self.shape))
+
+        packed = encode_plan(green)
+        h = plan_hash(packed, green.shape)
+        if h not in self.ids:
+            self.store.append(packed=packed, hash=np.array(h, dtype='S40'))
+            self.ids[h] = len(self.store) - 1
+        return self.ids[h]
+
+    def plan(self, n):
+        '''The (row, t) plan with id n'''
+        return decode_plan(self.store.column('packed', n), self.shape)
+
+    def plans(self, ids=None):
+        '''(plan, row, t) array of the plans with the given ids, e.g. a sweep's plan column; all by default'''
+        packed = self.store.column('packed', ids)
+        count = int(np.prod(self.shape))
+        return np.unpackbits(packed, axis=1)[:, :count].reshape((len(packed),) + self.shape)
+
+    def rows(self):
+        rows = self.store.meta.get('rows')
+        return None if rows is None else [tuple(r) for r in rows]
@@ -0,0 +1,353 @@
+'''
+Resumable sweep campaigns.
+
+A campaign is declared by a grid spec, a JSON file such as
+
+    {
+        "name": "asymm_demand_ringbarrier",
+        "model": "DTSimplexRingBarrier",
+        "time_range": 30,
+        "demands": {"ns": [1350, 1500], "ew": [450, 600, 750]},
+        "simplex": 10,
+        "parameters": {"g_min": 6, "g_max": 20}
+    }
+
+where model and time_range may also be lists, demands a list of demands (a number, or an [NS, EW]
+pair) instead of the NS x EW grid, simplex the number of steps of the weight simplex or weights an
+explicit list of [alpha, beta, gamma], and parameters overrides DEFAULT_PARAMETERS.
+
+Every (model, time_range, demand, weights) point of the grid is a job in a SQLite ledger kept in the
+campaign folder, with its state: pending, running, done or failed. A point is checkpointed as soon as
+it is solved: into its sweep's ColumnStore, then marked done in the ledger with its store row. Solves
+also go to a SolveCache in the campaign folder, so that points lost with an interrupted task are not
+solved again. Restarting a campaign puts the jobs left running back to pending and only runs what is
+not done; the results_simplex_<label> frame of a sweep is written once all its points are done.
+'''
+
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from batchrunners.cache import SolveCache
+from batchrunners.const import DEFAULT_PARAMETERS, DF_PATH, generate_simplex, serpentine_order
+from batchrunners.generators.dataframe import DataframeGenerator
+from batchrunners.parallel import solve_tasks, sweep_options
+from batchrunners.store import ColumnStore
+from ctmmodels.delaythroughput import DelayThroughputSimplex, DTSimplexParentModel
+from ctmmodels.ringbarrier import DTSimplexRingBarrier
+
+
+# Models a spec can name; all have the simplex objective
+MODELS = {
+    'DTSimplexRingBarrier': DTSimplexRingBarrier,
+    'DelayThroughputSimplex': DelayThroughputSimplex,
+    'DTSimplexParentModel': DTSimplexParentModel,
+}
+
+STATES = ('pending', 'running', 'done', 'failed')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    sweep TEXT,
+    position INTEGER,
+    model TEXT,
+    time_range INTEGER,
+    demand TEXT,
+    alpha REAL,
+    beta REAL,
+    gamma REAL,
+    state TEXT,
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    updated REAL,
+    runtime REAL,
+    store_path TEXT,
+    store_row INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, sweep, position);
+'''
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def _demand(value):
+    # JSON has no tuples; the models take an (NS, EW) pair as a tuple
+    return tuple(value) if isinstance(value, list) else value
+
+
+def expand_grid(spec):
+    '''
+    Jobs of a grid spec, as dicts with the ledger columns. A sweep is one (model, time_range, demand)
+    of the grid; its jobs are numbered in the order run_on_simplex visits them.
+    '''
+    demands = spec['demands']
+    if isinstance(demands, dict):
+        demands = [(ns, ew) for ns in demands['ns'] for ew in demands['ew']]
+    else:
+        demands = [_demand(d) for d in demands]
+
+    if 'weights' in spec:
+        weights = [tuple(float(w) for w in p) for p in spec['weights']]
+    else:
+        weights = generate_simplex(spec.get('simplex', 10))
+    weights = serpentine_order(weights)
+
+    jobs = []
+    for model in _as_list(spec['model']):
+        if model not in MODELS:
+            raise ValueError("Unknown model {}, expected one of {}".format(model, sorted(MODELS)))
+        for time_range in _as_list(spec.get('time_range', DEFAULT_PARAMETERS['time_range'])):
+            for demand in demands:
+                sweep = "{}/T{}/d{}".format(model, time_range, demand)
+                for n, (a, b, c) in enumerate(weights):
+                    jobs.append(dict(
+                        id="{}/{:.6g},{:.6g},{:.6g}".format(sweep, a, b, c),
+                        sweep=sweep, position=n, model=model, time_range=time_range,
+                        demand=json.dumps(demand), alpha=a, beta=b, gamma=c))
+    return jobs
+
+
+class JobLedger(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, jobs):
+        '''Adds the jobs that are not in the ledger yet, as pending'''
+        columns = ['id', 'sweep', 'position', 'model', 'time_range', 'demand', 'alpha', 'beta', 'gamma']
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs ({}, state, updated) VALUES ({}, 'pending', ?)".format(
+                    ', '.join(columns), ', '.join('?' * len(columns))),
+                [[job[c] for c in columns] + [time.time()] for job in jobs])
+
+    def set_state(self, ids, state, error=None):
+        with self.connection:
+            self.connection.executemany(
+                'UPDATE jobs SET state = ?, error = ?, updated = ?, attempts = attempts + ? WHERE id = ?',
+                [(state, error, time.time(), 1 if state == 'running' else 0, i) for i in ids])
+
+    def reset(self, states=('running',)):
+        '''Puts the jobs in the given states back to pending, e.g. those left running by a crash'''
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = 'pending' WHERE state IN ({})".format(', '.join('?' * len(states))),
+                states)
+        return cursor.rowcount
+
+    def finish(self, job_id, runtime, store_path, store_row):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, updated = ?, runtime = ?, store_path = ?, store_row = ? WHERE id = ?",
+                (time.time(), runtime, store_path, store_row, job_id))
+
+    def jobs(self, where=None, params=()):
+        '''Jobs matching an SQL condition, as dicts, in sweep order'''
+        sql = 'SELECT * FROM jobs'
+        if where:
+            sql += ' WHERE ' + where
+        cursor = self.connection.execute(sql + ' ORDER BY sweep, position', params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def counts(self):
+        '''Number of jobs in each state'''
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'))
+        return counts
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+class Progress(object):
+    '''Progress line of a campaign, with an ETA from the rate of the points solved in this run'''
+
+    def __init__(self, total, done=0):
+        self.total = total
+        self.done = done
+        self.failed = 0
+        self.solved = 0
+        self.start = time.time()
+
+    @staticmethod
+    def _duration(seconds):
+        return str(datetime.timedelta(seconds=int(seconds)))
+
+    def update(self, label, solved=1, failed=0):
+        self.solved += solved
+        self.done += solved
+        self.failed += failed
+
+        elapsed = time.time() - self.start
+        remaining = self.total - self.done - self.failed
+        eta = self._duration(elapsed / self.solved * remaining) if self.solved else '?'
+
+        print("[{}/{} {:5.1f}%{}] {} | {} elapsed, ETA {}".format(
+            self.done, self.total, 100.0 * self.done / self.total,
+            ", {} failed".format(self.failed) if self.failed else '', label, self._duration(elapsed), eta))
+        sys.stdout.flush()
+
+
+class Scheduler(object):
+
+    def __init__(self, spec, df_path=DF_PATH, catalog=None):
+        self.spec = spec
+        self.df_path = df_path
+        self.catalog = catalog
+
+        self.path = os.path.join(df_path, spec['name'])
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.ledger = JobLedger(os.path.join(self.path, 'ledger.sqlite'))
+        self.cache = SolveCache(os.path.join(self.path, 'solve_cache'))
+
+        self.grid = expand_grid(spec)
+        self.ledger.add(self.grid)
+
+    @classmethod
+    def from_file(cls, filename, **kwargs):
+        with open(filename) as f:
+            return cls(json.load(f), **kwargs)
+
+    def folder(self, model, time_range):
+        '''Folder of the sweeps of a model and time_range, under df_path'''
+        if len(_as_list(self.spec['model'])) == 1 and len(_as_list(self.spec.get('time_range'))) == 1:
+            return self.spec['name']
+        return os.path.join(self.spec['name'], "{}_T{}".format(model, time_range))
+
+    def generator(self, model, time_range, threads=None):
+        parameters = dict(DEFAULT_PARAMETERS, **self.spec.get('parameters', {}))
+        return DataframeGenerator(parameters=parameters, time_range=time_range, df_path=self.df_path,
+                                  catalog=self.catalog, cache=self.cache, model_class=MODELS[model],
+                                  threads=threads)
+
+    def status(self):
+        return self.ledger.counts()
+
+    def run(self, processes=1, threads=None, chunk_size=11, retry_failed=False):
+        '''
+        Runs the jobs of the grid that are not done, sweep by sweep, over `processes` processes, each
+        running CPLEX with `threads` threads (all cores by default, which suits a single process).
+        Failed jobs are only run again with retry_failed.
+        '''
+        self.ledger.reset(('running', 'failed') if retry_failed else ('running',))
+
+        ids = set(job['id'] for job in self.grid)
+        jobs = [job for job in self.ledger.jobs("state = 'pending'") if job['id'] in ids]
+        done = sum(1 for job in self.ledger.jobs("state = 'done'") if job['id'] in ids)
+        progress = Progress(len(ids), done)
+        print("Campaign {}: {} points done, {} to run".format(self.spec['name'], done, len(jobs)))
+
+        groups = []
+        for job in jobs:
+            key = (job['model'], job['time_range'])
+            if key not in groups:
+                groups.append(key)
+
+        for model, time_range in groups:
+            group = [job for job in jobs if (job['model'], job['time_range']) == (model, time_range)]
+            self.run_group(model, time_range, group, progress, processes, threads, chunk_size)
+
+        print("Campaign {}: {}".format(self.spec['name'], self.status()))
+
+    def run_group(self, model, time_range, jobs, progress, processes, threads, chunk_size):
+        '''Runs the pending jobs of one model and time_range, chunk_size points of a sweep per task'''
+        generator = self.generator(model, time_range, threads)
+        folder = self.folder(model, time_range)
+        path = os.path.join(self.df_path, folder)
+
+        tasks = []
+        task_jobs = []
+        sweeps = []
+        for job in jobs:
+            if job['sweep'] not in sweeps:
+                sweeps.append(job['sweep'])
+        for sweep in sweeps:
+            sweep_jobs = [job for job in jobs if job['sweep'] == sweep]
+            for n in range(0, len(sweep_jobs), chunk_size):
+                chunk = sweep_jobs[n:n + chunk_size]
+                demand = _demand(json.loads(chunk[0]['demand']))
+                tasks.append((demand, "d{}".format(demand), [(j['alpha'], j['beta'], j['gamma']) for j in chunk]))
+                task_jobs.append(chunk)
+
+        self.ledger.set_state([job['id'] for job in jobs], 'running')
+
+        options = sweep_options(folder, save_decision_variables=self.spec.get('save_decision_variables', False))
+        stores = {}
+        outcomes = solve_tasks(generator, tasks, options, processes, threads or 1)
+        for ((demand, varying_label, _), outcome), chunk in zip(outcomes, task_jobs):
+            if isinstance(outcome, Exception):
+                self.ledger.set_state([job['id'] for job in chunk], 'failed', repr(outcome))
+                progress.update("{} failed: {!r}".format(varying_label, outcome), solved=0, failed=len(chunk))
+                continue
+
+            meta, results = outcome
+            if varying_label not in stores:
+                stores[varying_label] = generator.open_store(path, varying_label, generator.parameters, meta)
+            store, plans = stores[varying_label]
+
+            for job, (p, misc, elapsed) in zip(chunk, results):
+                generator.record_point(store, plans, meta, generator.parameters, demand, p, misc, elapsed,
+                                       options['save_decision_variables'])
+                self.ledger.finish(job['id'], misc['runtime'], store.path, store.last_row)
+                progress.update("{} ({}, {}, {})".format(job['sweep'], *p))
+
+        for sweep in sweeps:
+            self.save_results(generator, path, sweep)
+
+    def save_results(self, generator, path, sweep):
+        '''Writes the results_simplex frame of a sweep from its store rows, once all its points are done'''
+        jobs = self.ledger.jobs('sweep = ?', (sweep,))
+        if not jobs or any(job['state'] != 'done' for job in jobs):
+            return
+
+        demand = _demand(json.loads(jobs[0]['demand']))
+        columns = ['runtime', 'delay', 'throughput', 'objective_value', 'time_to_incumbent', 'elapsed', 'alpha', 'beta', 'gamma']
+
+        # All the points of a sweep are in its store, possibly with rows of interrupted runs in between
+        frame = ColumnStore(jobs[0]['store_path']).frame(columns, [job['store_row'] for job in jobs])
+        _df_tuples = [(demand,) + tuple(row) for row in frame.itertuples(index=False)]
+
+        generator.save_results(_df_tuples, path, "d{}".format(demand))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Runs (or resumes) the sweep campaign of a grid spec')
+    parser.add_argument('spec', help='JSON grid spec')
+    parser.add_argument('--df-path', default=DF_PATH)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=None, help='CPLEX threads per process')
+    parser.add_argument('--chunk-size', type=int, default=11, help='points of a sweep per task')
+    parser.add_argument('--retry-failed', action='store_true')
+    parser.add_argument('--status', action='store_true', help='only print the job counts')
+    args = parser.parse_args()
+
+    from batchrunners.catalog import Catalog
+
+    if not os.path.isdir(args.df_path):
+        os.makedirs(args.df_path)
+    scheduler = Scheduler.from_file(args.spec, df_path=args.df_path,
+                                    catalog=Catalog(os.path.join(args.df_path, 'catalog.sqlite')))
+    if args.status:
+        print(scheduler.status())
+    else:
+        scheduler.run(args.processes, args.threads, args.chunk_size, args.retry_failed)
+
+
+if __name__ == '__main__':
+    main()
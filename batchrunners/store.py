@@ -0,0 +1,293 @@
+'''
+Columnar, appendable store for the results of simplex sweeps.
+
+A store is a directory with one raw binary file per column and a header.json that records the dtype
+and per-row shape of each column, and the number of rows written. Each row is one solved point: its
+parameter columns (demand, weights), its KPIs and, optionally, its solution tensors (volumes, flows,
+green times), all with a fixed shape per row.
+
+Rows are appended one at a time: the column files are written first and the header, which is the
+only thing readers trust, is replaced afterwards. A sweep that crashes loses at most the point it
+was on, and appending to an existing store resumes after its last complete row. Sweeps write their
+points with upsert, keyed by demand and weights, so a point solved again replaces its row instead of
+adding a second one.
+
+Scalar columns are float64 unless given as numpy scalars, with None stored as NaN. Values in the
+header meta are made JSON-friendly by json_value; e.g. the cell tuple keys of a preload become strings.
+
+Readers memory-map only the columns they ask for, so selecting a few columns or points of a large
+sweep does not load the rest.
+'''
+
+import json
+import os
+
+import numpy as np
+
+
+_STRINGS = (str, type(u''))
+
+
+def _json_key(key):
+    if isinstance(key, tuple):
+        return str(tuple(json_value(k) for k in key))
+    if isinstance(key, np.generic):
+        return str(key.item())
+    return key if isinstance(key, _STRINGS) else str(key)
+
+
+def json_value(value):
+    '''JSON-friendly copy of a value: numpy scalars and arrays made plain, dict keys made strings'''
+    if isinstance(value, dict):
+        return {_json_key(k): json_value(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [json_value(v) for v in value]
+    return value
+
+
+def _column_value(value):
+    '''Array of a row value; plain numbers and None (as NaN) are float64, numpy scalars keep their dtype'''
+    if value is None:
+        return np.array(np.nan)
+    a = np.asarray(value)
+    if a.dtype == object:
+        try:
+            a = np.array([np.nan if v is None else v for v in a.ravel()], dtype=np.float64).reshape(a.shape)
+        except (TypeError, ValueError):
+            # Not numbers; _row_arrays rejects the column
+            pass
+    elif a.ndim == 0 and not isinstance(value, np.generic) and a.dtype.kind in 'biuf':
+        a = a.astype(np.float64)
+    return a
+
+
+class ColumnStore(object):
+
+    HEADER = 'header.json'
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.columns = {}
+        self.column_order = []
+        self.meta = {}
+
+        # Index of the row written last, by append or upsert
+        self.last_row = None
+
+        if os.path.exists(os.path.join(path, self.HEADER)):
+            with open(os.path.join(path, self.HEADER)) as f:
+                header = json.load(f)
+            self.rows = header['rows']
+            self.column_order = header['column_order']
+            self.columns = {
+                name: (np.dtype(spec['dtype']), tuple(spec['shape']))
+                for name, spec in header['columns'].items()
+            }
+            self.meta = header['meta']
+
+    def __len__(self):
+        return self.rows
+
+    def _column_file(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _row_bytes(self, name):
+        dtype, shape = self.columns[name]
+        return dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+
+    def _write_header(self):
+        header = {
+            'rows': self.rows,
+            'column_order': self.column_order,
+            'columns': {
+                name: {'dtype': dtype.str, 'shape': list(shape)}
+                for name, (dtype, shape) in self.columns.items()
+            },
+            'meta': self.meta,
+        }
+
+        # Written to the side and renamed over the old header, so readers never see half of it
+        tmp = os.path.join(self.path, self.HEADER + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(header, f, indent=1, sort_keys=True)
+        os.rename(tmp, os.path.join(self.path, self.HEADER))
+
+    def set_meta(self, **meta):
+        '''Stores sweep-wide values (model class, parameters, labels) in the header'''
+        self.meta.update(json_value(meta))
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._write_header()
+
+    def append(self, **values):
+        '''
+        Appends one row and returns its index. The first row fixes the columns, their dtypes and shapes;
+        later rows must have the same columns.
+        '''
+        arrays = self._row_arrays(values)
+
+        for name in self.column_order:
+            with open(self._column_file(name), 'ab') as f:
+                # Drop whatever an interrupted append left after the last complete row
+                f.truncate(self.rows * self._row_bytes(name))
+                f.seek(0, os.SEEK_END)
+                f.write(arrays[name])
+
+        self.rows += 1
+        self._write_header()
+        self.last_row = self.rows - 1
+        return self.last_row
+
+    def upsert(self, key, **values):
+        '''
+        Writes a row over the first row whose key columns have the same values, e.g. a point of a sweep
+        that is solved again, or appends it if there is none. Returns its index.
+        '''
+        rows = self.find(**{name: values[name] for name in key})
+        if not len(rows):
+            return self.append(**values)
+
+        arrays = self._row_arrays(values)
+        row = int(rows[0])
+        for name in self.column_order:
+            with open(self._column_file(name), 'r+b') as f:
+                f.seek(row * self._row_bytes(name))
+                f.write(arrays[name])
+
+        self.last_row = row
+        return row
+
+    def find(self, tol=1e-9, **values):
+        '''Indices of the rows whose columns are equal to the given values'''
+        if self.rows == 0 or any(name not in self.columns for name in values):
+            return np.array([], dtype=np.int64)
+
+        match = np.ones(self.rows, dtype=bool)
+        for name, value in values.items():
+            column = np.asarray(self.column(name)).reshape(self.rows, -1)
+            value = _column_value(value).reshape(1, -1)
+            if column.dtype.kind in 'biuf':
+                match &= (np.abs(column - value) < tol).all(axis=1)
+            else:
+                match &= (column == value).all(axis=1)
+        return np.flatnonzero(match)
+
+    def _row_arrays(self, values):
+        '''Bytes of each column of a row, fixing the columns on the first row'''
+        arrays = {name: _column_value(value) for name, value in values.items()}
+
+        if not self.columns:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            objects = [name for name, a in arrays.items() if a.dtype == object]
+            if objects:
+                raise ValueError("Columns {} have no fixed-size dtype".format(sorted(objects)))
+            self.column_order = sorted(arrays)
+            self.columns = {name: (a.dtype, a.shape) for name, a in arrays.items()}
+        elif set(arrays) != set(self.columns):
+            raise ValueError("Row columns {} do not match the store columns {}".format(
+                sorted(arrays), self.column_order))
+
+        row = {}
+        for name in self.column_order:
+            dtype, shape = self.columns[name]
+            a = arrays[name]
+            if a.shape != shape:
+                raise ValueError("Column {} has shape {} per row, got {}".format(name, shape, a.shape))
+            row[name] = np.ascontiguousarray(a, dtype=dtype).tobytes()
+        return row
+
+    def column(self, name, rows=None):
+        '''Read-only memory map of a column, (rows,) + row shape, optionally indexed by rows'''
+        dtype, shape = self.columns[name]
+        if self.rows == 0:
+            array = np.empty((0,) + shape, dtype=dtype)
+        else:
+            array = np.memmap(self._column_file(name), dtype=dtype, mode='r', shape=(self.rows,) + shape)
+        return array if rows is None else array[rows]
+
+    def scalar_columns(self):
+        return [name for name in self.column_order if self.columns[name][1] == ()]
+
+    def frame(self, columns=None, rows=None):
+        '''
+        DataFrame of the chosen columns (all scalar columns by default), optionally restricted to
+        rows: an index array or a boolean mask, e.g. from a condition on another column.
+        Vector columns such as demand come out as tuples.
+        '''
+        import pandas as pd
+
+        if columns is None:
+            columns = self.scalar_columns()
+
+        index = np.arange(self.rows)
+        if rows is not None:
+            index = index[rows]
+
+        data = {}
+        for name in columns:
+            values = np.array(self.column(name, index))
+            if values.ndim > 1:
+                values = [tuple(v) for v in values.reshape(len(index), -1).tolist()]
+            data[name] = values
+
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def points(self, alpha, beta, gamma, tol=1e-9):
+        '''Row indices of the points with the given weights'''
+        return np.flatnonzero(
+            (np.abs(self.column('alpha') - alpha) < tol)
+            & (np.abs(self.column('beta') - beta) < tol)
+            & (np.abs(self.column('gamma') - gamma) < tol))
+
+
+class SolutionTensors(object):
+    '''
+    Volumes and flows of a sweep stored with save_decision_variables, as memory-mapped (points, T, cells)
+    and (points, T, edges) tensors. The cell and edge lists of the header give their last axis.
+    '''
+
+    def __init__(self, store):
+        if not isinstance(store, ColumnStore):
+            store = ColumnStore(store)
+        self.store = store
+
+        self.cells = [tuple(c) for c in store.meta['cells']]
+        self.edges = [(tuple(i), tuple(j)) for i, j in store.meta['edges']]
+        self.cell_ids = {c: n for n, c in enumerate(self.cells)}
+        self.edge_ids = {e: n for n, e in enumerate(self.edges)}
+
+    @property
+    def volume(self):
+        return self.store.column('volume')
+
+    @property
+    def flow(self):
+        return self.store.column('flow')
+
+    def cell_volume(self, cell, rows=None):
+        '''(points, T) volumes of one cell'''
+        volume = self.volume if rows is None else self.volume[rows]
+        return volume[:, :, self.cell_ids[cell]]
+
+    def edge_flow(self, i, j, rows=None):
+        '''(points, T) flows from cell i to cell j'''
+        flow = self.flow if rows is None else self.flow[rows]
+        return flow[:, :, self.edge_ids[(i, j)]]
+
+    def outflow(self, cell, rows=None):
+        '''(points, T) total flow out of a cell'''
+        edges = [n for n, (i, _) in enumerate(self.edges) if i == cell]
+        flow = self.flow if rows is None else self.flow[rows]
+        return flow[:, :, edges].sum(axis=2)
+
+    def at(self, t, rows=None):
+        '''(points, cells) volumes and (points, edges) flows at timestep t'''
+        volume = self.volume if rows is None else self.volume[rows]
+        flow = self.flow if rows is None else self.flow[rows]
+        return volume[:, t], flow[:, t]
@@ -0,0 +1,121 @@
+import unittest
+
+import numpy as np
+
+from batchrunners.adaptive import AdaptiveSimplex, interpolate_onto_grid
+from batchrunners.const import generate_simplex
+
+
+def sample(sampler, kpis, plan=lambda point: 0, budget=None):
+    '''Runs a sampler to the end on KPIs and plans given as functions of the lattice point'''
+    batches = []
+    points = sampler.next_points(budget)
+    while points:
+        batches.append(points)
+        for point in points:
+            sampler.add(point, plan(point), **{k: f(point) for k, f in kpis.items()})
+        points = sampler.next_points(None if budget is None else budget - len(sampler.values))
+    return batches
+
+
+def covered_area(sampler):
+    '''Sum of the areas of the leaves, in units of the smallest triangle'''
+    return sum(4 ** (sampler.levels - level) for level, _ in sampler.leaves())
+
+
+class AdaptiveSimplexTest(unittest.TestCase):
+
+    def test_coarse_grid_first(self):
+        sampler = AdaptiveSimplex(coarse=2, levels=2)
+        points = sampler.next_points()
+        self.assertEqual(len(points), 6)
+        self.assertEqual(sorted(sampler.weights(p) for p in points), sorted(generate_simplex(2)))
+        with self.assertRaises(ValueError):
+            AdaptiveSimplex(coarse=2, levels=2).next_points(limit=5)
+
+    def test_flat_simplex_is_not_refined(self):
+        sampler = AdaptiveSimplex(coarse=2, levels=3)
+        batches = sample(sampler, dict(delay=lambda p: 1.0, throughput=lambda p: 2.0))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(sampler.leaves()), 4)
+        self.assertEqual(covered_area(sampler), 4 * 4**3)
+
+    def test_refines_along_plan_changes(self):
+        sampler = AdaptiveSimplex(coarse=2, levels=3)
+        resolution = sampler.resolution
+        # The plan changes at alpha = 0.3
+        plan = lambda p: int(p[0] > 0.3 * resolution)
+        batches = sample(sampler, dict(delay=lambda p: 0.0, throughput=lambda p: 0.0), plan)
+
+        solved = set(sampler.values)
+        for batch in batches:
+            for point in batch:
+                self.assertEqual(sum(point), resolution)
+                self.assertTrue(all(c >= 0 for c in point))
+        # No point is handed out twice
+        self.assertEqual(sum(len(b) for b in batches), len(solved))
+        self.assertLess(len(solved), len(generate_simplex(resolution)))
+
+        leaves = sampler.leaves()
+        self.assertEqual(covered_area(sampler), 4 * 4**sampler.levels)
+        for level, corners in leaves:
+            if len(set(plan(c) for c in corners)) > 1:
+                # Triangles across the change are refined all the way
+                self.assertEqual(level, sampler.levels)
+
+    def test_refines_where_kpis_jump(self):
+        sampler = AdaptiveSimplex(coarse=2, levels=3, tol=0.1, kpis=('delay',))
+        resolution = sampler.resolution
+        # Flat below beta = 0.5, steep above
+        sample(sampler, dict(delay=lambda p: (float(p[1]) / resolution) ** 4))
+
+        levels = {}
+        for level, corners in sampler.leaves():
+            levels.setdefault(max(c[1] for c in corners) > resolution // 2, []).append(level)
+        self.assertEqual(set(levels[False]), set([0]))
+        self.assertGreater(min(levels[True]), 0)
+
+    def test_budget(self):
+        sampler = AdaptiveSimplex(coarse=2, levels=3)
+        plan = lambda p: int(p[0] > 0.3 * sampler.resolution)
+        sample(sampler, dict(delay=lambda p: 0.0, throughput=lambda p: 0.0), plan, budget=12)
+        self.assertLessEqual(len(sampler.values), 12)
+        self.assertGreater(len(sampler.values), 6)
+        self.assertEqual(covered_area(sampler), 4 * 4**sampler.levels)
+
+
+class InterpolateOntoGridTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sampler = AdaptiveSimplex(coarse=2, levels=2)
+        resolution = self.sampler.resolution
+        self.plan = lambda p: int(p[1] > 0.6 * resolution)
+        sample(self.sampler, dict(delay=lambda p: 0.0, throughput=lambda p: 0.0), self.plan)
+
+    def test_linear_values_are_exact(self):
+        linear = lambda w: 3.0 * w[0] - 2.0 * w[1] + 0.5 * w[2]
+        data = {p: linear(self.sampler.weights(p)) for p in self.sampler.values}
+        grid = interpolate_onto_grid(self.sampler, data, steps=10)
+
+        self.assertEqual([w for w, _ in grid], generate_simplex(10))
+        for weights, value in grid:
+            self.assertAlmostEqual(value, linear(weights))
+
+    def test_arrays(self):
+        data = {p: np.array(p, dtype=np.float64) for p in self.sampler.values}
+        for weights, value in interpolate_onto_grid(self.sampler, data, steps=4):
+            np.testing.assert_allclose(value, np.array(weights) * self.sampler.resolution, atol=1e-9)
+
+    def test_nearest(self):
+        data = {p: self.plan(p) for p in self.sampler.values}
+        resolution = self.sampler.resolution
+        for weights, value in interpolate_onto_grid(self.sampler, data, steps=8, nearest=True):
+            self.assertIn(value, (0, 1))
+            beta = weights[1]
+            # Away from the change, the plan of the closest corner is the plan there
+            if abs(beta - 0.6) > 2.0 / resolution:
+                self.assertEqual(value, int(beta > 0.6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from batchrunners.cache import SolveCache
+from batchrunners.test_store import needs_solver, small_parameters
+
+
+@needs_solver
+class CachedPointTest(unittest.TestCase):
+
+    def setUp(self):
+        from batchrunners.generators.dataframe import DataframeGenerator
+
+        class Generator(DataframeGenerator):
+            builds = 0
+
+            def build_model(self, *args, **kwargs):
+                Generator.builds += 1
+                return super(Generator, self).build_model(*args, **kwargs)
+
+        self.path = tempfile.mkdtemp()
+        self.generator = Generator(parameters=small_parameters(), time_range=4, df_path=self.path,
+                                   cache=SolveCache(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_hit_without_model(self):
+        dg = self.generator
+        dfx, dfy, dfg, misc = dg.run_model((450, 900), 0.5, 0.5, 0.0, log_output=False)
+        self.assertEqual(dg.builds, 1)
+        self.assertIn('solution', misc)
+
+        hx, hy, hg, hit = dg.run_model((450, 900), 0.5, 0.5, 0.0, log_output=False)
+        self.assertEqual(dg.builds, 1)
+        self.assertEqual(dg.cache.hits, 1)
+        # Hits have no SolveSolution to warm start from
+        self.assertNotIn('solution', hit)
+
+        self.assertEqual(hit['obj_value'], misc['obj_value'])
+        self.assertEqual(hit['kpis'].delay, misc['kpis'].delay)
+        np.testing.assert_array_equal(hx.volume.values, dfx.volume.values)
+        np.testing.assert_array_equal(hy.flow.values, dfy.flow.values)
+        np.testing.assert_array_equal(hg.values, dfg.values)
+
+    def test_rotated_hit(self):
+        from batchrunners.generators.dataframe import DataframeGenerator
+        from ctmmodels.symmetry import rotate_demand
+
+        dg = self.generator
+        demand = [300, 900, 450, 600]
+        dg.run_model(demand, 0.5, 0.3, 0.2, log_output=False)
+        # A half turn is a symmetry of every model
+        rotated = rotate_demand(demand, 2)
+        _, _, _, hit = dg.run_model(rotated, 0.5, 0.3, 0.2, log_output=False)
+        self.assertEqual(dg.cache.hits, 1)
+        self.assertEqual(dg.builds, 1)
+
+        fresh = DataframeGenerator(parameters=small_parameters(), time_range=4, df_path=self.path)
+        _, _, _, misc = fresh.run_model(rotated, 0.5, 0.3, 0.2, log_output=False)
+        self.assertAlmostEqual(hit['obj_value'], misc['obj_value'], places=6)
+        self.assertAlmostEqual(hit['kpis'].delay, misc['kpis'].delay, places=6)
+        self.assertAlmostEqual(hit['kpis'].throughput, misc['kpis'].throughput, places=6)
+        np.testing.assert_allclose(hit['kpis'].approach_delay, misc['kpis'].approach_delay, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from batchrunners.catalog import Catalog
+from batchrunners.store import ColumnStore
+from batchrunners.test_store import PRELOAD, model_preload, needs_solver, small_parameters
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.catalog = Catalog(os.path.join(self.path, 'catalog.sqlite'))
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.path)
+
+    def test_record_with_preload(self):
+        parameters = small_parameters(preload=PRELOAD, g_max=np.int64(4))
+        self.catalog.record('DTSimplexRingBarrier', parameters, (450, 900), 0.5, 0.5, 0.0,
+                            dict(delay=np.float64(12.5), throughput=3.0, status='optimal'),
+                            store_path='store', store_row=np.int64(0))
+
+        solves = self.catalog.query('demand_max >= ? AND alpha > ?', (900, 0.25))
+        self.assertEqual(len(solves), 1)
+        solve = solves.iloc[0]
+        self.assertEqual(solve['g_max'], 4)
+        self.assertEqual(solve['delay'], 12.5)
+        self.assertEqual(json.loads(solve['demand']), [450, 900])
+        self.assertEqual(json.loads(solve['parameters'])['preload'],
+                         {'(1, 0, 0)': 1.0, '(2, 0, 1)': 2.0, '(4, 1, 3)': 0.5})
+
+
+@needs_solver
+class SweepCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_sweep_with_preload(self):
+        from batchrunners.generators.dataframe import DataframeGenerator
+
+        catalog = Catalog(os.path.join(self.path, 'catalog.sqlite'))
+        dg = DataframeGenerator(parameters=small_parameters(preload=model_preload()), time_range=4,
+                                df_path=self.path, catalog=catalog)
+        points = [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0)]
+        dg.run_on_simplex((450, 900), simplex_slice=points)
+        # Solved again: new solves in the catalog, pointing at the same store rows
+        dg.run_on_simplex((450, 900), simplex_slice=points[::-1])
+
+        solves = catalog.query(columns=['alpha', 'delay', 'store_path', 'store_row', 'parameters'])
+        catalog.close()
+        self.assertEqual(len(solves), 4)
+        self.assertEqual(json.loads(solves['parameters'][0])['preload']['(1, 0, 1)'], 1.0)
+
+        store = ColumnStore(solves['store_path'][0])
+        self.assertEqual(len(store), 2)
+        for _, solve in solves.iterrows():
+            row = int(solve['store_row'])
+            self.assertEqual(store.column('alpha')[row], solve['alpha'])
+            self.assertAlmostEqual(store.column('delay')[row], solve['delay'])
+
+
+if __name__ == '__main__':
+    unittest.main()
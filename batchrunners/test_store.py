@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from batchrunners.const import DEFAULT_PARAMETERS
+from batchrunners.store import ColumnStore, json_value
+
+try:
+    import docplex
+except ImportError:
+    docplex = None
+
+# The models are Python 2 code (integer division, list comprehension scoping)
+needs_solver = unittest.skipIf(docplex is None or sys.version_info[0] > 2, 'needs docplex on Python 2')
+
+PRELOAD = {(1, 0, 0): 1.0, (2, 0, 1): 2.0, (4, 1, 3): 0.5}
+
+
+def small_parameters(**parameters):
+    '''Parameters of a model small enough for the promotional CPLEX'''
+    small = dict(DEFAULT_PARAMETERS, time_range=4, g_min=2, g_max=4)
+    small.update(parameters)
+    return small
+
+
+def model_preload(volume=1.0):
+    '''Preload of every cell of the swept model'''
+    from batchrunners.generators.dataframe import Model
+
+    model = Model(demand=450, **small_parameters())
+    model.generate_sets()
+    return {cell: volume for cell in model.S}
+
+
+class ColumnStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.path, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_json_value(self):
+        value = json_value({'preload': PRELOAD, 'g': np.int64(3), 'demand': (450, np.float32(900))})
+        self.assertEqual(value['preload'], {'(1, 0, 0)': 1.0, '(2, 0, 1)': 2.0, '(4, 1, 3)': 0.5})
+        self.assertEqual(value['g'], 3)
+        self.assertEqual(value['demand'], [450, 900.0])
+        json.dumps(value)
+
+    def test_meta_with_preload(self):
+        store = ColumnStore(self.store_path)
+        store.set_meta(parameters=small_parameters(preload=PRELOAD), varying_label='d450')
+        store.append(alpha=0.5)
+
+        meta = ColumnStore(self.store_path).meta
+        self.assertEqual(meta['varying_label'], 'd450')
+        self.assertEqual(meta['parameters']['preload']['(2, 0, 1)'], 2.0)
+        self.assertEqual(meta['parameters']['g_max'], 4)
+
+    def test_scalars_are_float64(self):
+        store = ColumnStore(self.store_path)
+        store.append(runtime=None, status=1, plan=np.int32(4))
+        store.append(runtime=1.5, status=2, plan=np.int32(5))
+
+        store = ColumnStore(self.store_path)
+        self.assertEqual(store.columns['runtime'][0], np.float64)
+        self.assertEqual(store.columns['status'][0], np.float64)
+        self.assertEqual(store.columns['plan'][0], np.int32)
+        self.assertTrue(np.isnan(store.column('runtime')[0]))
+        self.assertEqual(store.column('runtime')[1], 1.5)
+
+    def test_object_columns_are_rejected(self):
+        store = ColumnStore(self.store_path)
+        with self.assertRaises(ValueError):
+            store.append(solution={'g': 1}, alpha=0.5)
+
+    def test_upsert(self):
+        store = ColumnStore(self.store_path)
+        key = ('demand', 'alpha')
+        self.assertEqual(store.upsert(key, demand=[450.0, 900.0], alpha=0.5, delay=1.0), 0)
+        self.assertEqual(store.upsert(key, demand=[450.0, 900.0], alpha=1.0, delay=2.0), 1)
+        self.assertEqual(store.upsert(key, demand=[450.0, 900.0], alpha=0.5, delay=3.0), 0)
+        self.assertEqual(store.last_row, 0)
+
+        store = ColumnStore(self.store_path)
+        self.assertEqual(len(store), 2)
+        np.testing.assert_array_equal(store.column('delay'), [3.0, 2.0])
+        np.testing.assert_array_equal(store.find(alpha=1.0), [1])
+
+
+@needs_solver
+class SweepStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_rerun_with_preload(self):
+        from batchrunners.generators.dataframe import DataframeGenerator
+
+        parameters = small_parameters(preload=model_preload())
+        points = [(1.0, 0.0, 0.0), (0.5, 0.5, 0.0)]
+        for _ in range(2):
+            dg = DataframeGenerator(parameters=dict(parameters), time_range=4, df_path=self.path)
+            dg.run_on_simplex((450, 900), simplex_slice=points)
+
+        store = ColumnStore(os.path.join(self.path, 'simplex', 'store_d(450, 900)'))
+        self.assertEqual(len(store), len(points))
+        self.assertEqual(store.meta['parameters']['preload']['(1, 0, 1)'], 1.0)
+        self.assertEqual(sorted(map(tuple, np.c_[store.column('alpha'), store.column('beta')])),
+                         [(0.5, 0.5), (1.0, 0.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
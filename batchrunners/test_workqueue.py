@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from batchrunners.generators.dataframe import DataframeGenerator
+from batchrunners.parallel import _init_worker, _solve_task
+from batchrunners.store import ColumnStore
+from batchrunners.test_store import needs_solver, small_parameters
+from batchrunners.workqueue import Lease, WorkQueue, collect_sweep, submit_sweep
+
+
+TASKS = [
+    ((450, 900), 'd(450, 900)', [(1.0, 0.0, 0.0)]),
+    ((450, 900), 'd(450, 900)', [(0.0, 1.0, 0.0)]),
+    ((600, 600), 'd(600, 600)', [(1.0, 0.0, 0.0)]),
+]
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.generator = DataframeGenerator(parameters=small_parameters(), time_range=4, df_path=self.path)
+        self.queue = WorkQueue(os.path.join(self.path, 'queue'), lease=60, heartbeat=1, max_attempts=2)
+        self.queue.submit(self.generator, TASKS, dict(folder='simplex'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def expire(self, lease):
+        '''Makes a lease look abandoned, last renewed twice its length ago'''
+        stale = self.queue.now() - 2 * self.queue.lease
+        os.utime(lease.filename, (stale, stale))
+
+    def test_submit(self):
+        self.assertEqual(self.queue.counts(), dict(pending=3, claimed=0, done=0, failed=0, collected=0))
+        # Numbering goes on after the tasks already in the queue
+        self.queue.submit(self.generator, TASKS[:1], dict(folder='simplex'))
+        self.assertEqual(self.queue._names('pending')[-1], '00003.pkl')
+
+    def test_claim_and_complete(self):
+        lease = self.queue.claim()
+        self.assertEqual(lease.name, '00000')
+        self.assertEqual(lease.job['task'], TASKS[0])
+        self.assertEqual(lease.job['sweep_tasks'], 2)
+        self.assertTrue(lease.renew())
+        self.assertEqual(self.queue.counts()['claimed'], 1)
+
+        self.queue.complete(lease, ('meta', []))
+        self.assertEqual(self.queue.counts(), dict(pending=2, claimed=0, done=1, failed=0, collected=0))
+        self.assertEqual(self.queue.done_jobs()[0][1]['result'], ('meta', []))
+
+        # Taken back by now
+        self.assertFalse(lease.renew())
+
+    def test_claims_are_exclusive(self):
+        other = WorkQueue(self.queue.path)
+        other.worker = 'other-1'
+        names = [self.queue.claim().name, other.claim().name, self.queue.claim().name]
+        self.assertEqual(names, ['00000', '00001', '00002'])
+        self.assertIsNone(other.claim())
+
+    def test_fail_until_max_attempts(self):
+        lease = self.queue.claim()
+        self.queue.fail(lease, 'error 1')
+        self.assertEqual(self.queue.counts()['pending'], 3)
+
+        lease = self.queue.claim()
+        self.assertEqual((lease.name, lease.job['attempts'], lease.job['error']), ('00000', 1, 'error 1'))
+        self.queue.fail(lease, 'error 2')
+        self.assertEqual(self.queue.counts(), dict(pending=2, claimed=0, done=0, failed=1, collected=0))
+
+        self.queue.retry_failed()
+        self.assertEqual(self.queue.counts()['pending'], 3)
+        lease = self.queue.claim()
+        self.assertEqual((lease.name, lease.job['attempts']), ('00000', 0))
+
+    def test_reclaim_expired_lease(self):
+        lease = self.queue.claim()
+        self.assertEqual(self.queue.reclaim(), [])
+
+        self.expire(lease)
+        self.assertEqual(self.queue.reclaim(), ['00000'])
+        self.assertEqual(self.queue.counts()['claimed'], 0)
+        self.assertFalse(lease.renew())
+
+        again = self.queue.claim()
+        self.assertEqual((again.name, again.job['attempts']), ('00000', 1))
+        self.assertIn('ran out', again.job['error'])
+
+    def test_reclaim_until_failed(self):
+        for attempt in range(self.queue.max_attempts):
+            lease = self.queue.claim()
+            self.assertEqual(lease.name, '00000')
+            self.expire(lease)
+            self.queue.reclaim()
+        self.assertEqual(self.queue._names('failed'), ['00000.pkl'])
+
+    def test_lost_lease_still_completes(self):
+        lease = self.queue.claim()
+        self.expire(lease)
+        self.queue.reclaim()
+
+        # The first worker finishes after all; the task put back is not solved again
+        self.queue.complete(lease, ('meta', []))
+        self.assertEqual(self.queue.claim().name, '00001')
+        self.assertEqual(self.queue.counts(), dict(pending=1, claimed=1, done=1, failed=0, collected=0))
+
+    def test_reclaim_of_finished_task(self):
+        lease = self.queue.claim()
+        self.queue.complete(lease, ('meta', []))
+        # A copy of the claim left behind, e.g. by a worker that lost its lease while writing
+        stale = os.path.join(self.queue._folder('claimed'), '00000.ghost-1.pkl')
+        self.queue._write(stale, lease.job)
+        self.expire(Lease('00000', stale, lease.job))
+
+        self.assertEqual(self.queue.reclaim(), ['00000'])
+        self.assertEqual(self.queue.counts(), dict(pending=2, claimed=0, done=1, failed=0, collected=0))
+
+
+@needs_solver
+class QueueSweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_submit_work_collect(self):
+        dg = DataframeGenerator(parameters=small_parameters(), time_range=4, df_path=self.path)
+        queue = WorkQueue(os.path.join(self.path, 'queue'), heartbeat=1)
+        points = [(1.0, 0.0, 0.0), (0.5, 0.5, 0.0), (0.0, 1.0, 0.0)]
+        submit_sweep(dg, queue, [(450, 900)], simplex_slice=points, chunk_size=2)
+
+        # One task solved by hand, as a worker does
+        lease = queue.claim()
+        _init_worker(lease.job['settings'])
+        queue.complete(lease, _solve_task(lease.job['task'] + (lease.job['options'],)))
+        # A sweep is only written once all of its tasks are done
+        self.assertEqual(collect_sweep(dg, queue), ['d(450, 900)'])
+
+        # The other one claimed by a worker that died; work takes it back and solves it
+        lease = queue.claim()
+        stale = queue.now() - 2 * queue.lease
+        os.utime(lease.filename, (stale, stale))
+        self.assertEqual(queue.work(poll=0), 1)
+
+        self.assertEqual(collect_sweep(dg, queue), [])
+        self.assertEqual(queue.counts()['collected'], 2)
+
+        store = ColumnStore(os.path.join(self.path, 'simplex', 'store_d(450, 900)'))
+        self.assertEqual(len(store), len(points))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,320 @@
+'''
+Sweeps spread over several machines through a work queue on a shared filesystem, e.g. an NFS mount.
+
+A queue is a folder with one file per task of run_parallel_sweep, (demand, varying_label, points),
+that moves between subfolders as it is worked on:
+
+    pending/00012.pkl                   waiting to be claimed
+    claimed/00012.<worker>.pkl          leased by a worker
+    done/00012.pkl                      solved, with its (sweep_meta, results)
+    failed/00012.pkl                    gave up on, with the last error
+    collected/00012.pkl                 written to its sweep's store by collect_sweep
+
+A worker claims a task by renaming its file into claimed/, which only one of several workers renaming
+the same file can do. While it solves, a heartbeat thread touches the claimed file; a claimed file
+that has not been touched for lease seconds belongs to a dead worker, and whichever worker notices
+first puts the task back to pending (or to failed after max_attempts). Times are compared against
+the modification time of the queue's clock file, so the clocks of the nodes do not have to agree.
+A task whose lease was taken back but which still finished is done all the same: solving a task
+twice gives the same results, and claims of tasks already done are dropped.
+
+Every job file carries the generator settings and sweep options, so a worker needs only the queue
+path: on every node, run
+
+    python -m batchrunners.workqueue work QUEUE
+
+and the workers pull tasks until no task is left pending or claimed. Submitting and collecting are
+done from one machine, with submit_sweep and collect_sweep, e.g. through batchrunner_script.py.
+'''
+
+import os
+import pickle
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from batchrunners.const import generate_simplex
+from batchrunners.parallel import _init_worker, _solve_task, _worker_settings, campaign_tasks, sweep_options
+
+
+STATES = ('pending', 'claimed', 'done', 'failed', 'collected')
+
+
+def worker_name():
+    '''Name of this worker process, unique across the nodes of the queue'''
+    return '{}-{}'.format(socket.gethostname().split('.')[0], os.getpid())
+
+
+def _job_name(filename):
+    return filename.split('.')[0]
+
+
+class Lease(object):
+    '''A task claimed by this worker, held by touching its file in claimed/'''
+
+    def __init__(self, name, filename, job):
+        self.name = name
+        self.filename = filename
+        self.job = job
+        self.lost = False
+
+    def renew(self):
+        try:
+            os.utime(self.filename, None)
+        except OSError:
+            # Taken back by another worker
+            self.lost = True
+        return not self.lost
+
+
+def _heartbeat(lease, interval, stop):
+    while not stop.wait(interval):
+        if not lease.renew():
+            break
+
+
+class WorkQueue(object):
+
+    def __init__(self, path, lease=600, heartbeat=60, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self.worker = worker_name()
+
+        for state in STATES + ('tmp',):
+            folder = os.path.join(path, state)
+            if not os.path.isdir(folder):
+                try:
+                    os.makedirs(folder)
+                except OSError:
+                    # Made by another node in the meantime
+                    pass
+
+    def _folder(self, state):
+        return os.path.join(self.path, state)
+
+    def _file(self, state, name):
+        return os.path.join(self.path, state, name + '.pkl')
+
+    def _names(self, state):
+        return sorted(f for f in os.listdir(self._folder(state)) if f.endswith('.pkl'))
+
+    def _read(self, filename):
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+    def _write(self, filename, job):
+        tmp = os.path.join(self._folder('tmp'), '{}.{}'.format(os.path.basename(filename), self.worker))
+        with open(tmp, 'wb') as f:
+            pickle.dump(job, f, protocol=2)
+        os.rename(tmp, filename)
+
+    def now(self):
+        '''Current time on the filesystem's clock'''
+        clock = os.path.join(self.path, 'clock')
+        with open(clock, 'a'):
+            os.utime(clock, None)
+        return os.stat(clock).st_mtime
+
+    def counts(self):
+        return {state: len(self._names(state)) for state in STATES}
+
+    def submit(self, generator, tasks, options, threads=1):
+        '''Queues tasks, (demand, varying_label, points), to be solved with copies of the generator'''
+        settings = _worker_settings(generator, threads)
+        names = [_job_name(f) for state in STATES for f in self._names(state)]
+        start = max([int(n) for n in names] or [-1]) + 1
+
+        for n, task in enumerate(tasks, start):
+            # collect_sweep writes a sweep once all of its tasks are done
+            sweep_tasks = len([t for t in tasks if t[1] == task[1]])
+            job = dict(task=task, settings=settings, options=options, sweep_tasks=sweep_tasks, attempts=0, error=None)
+            self._write(self._file('pending', '{:05d}'.format(n)), job)
+
+    def claim(self):
+        '''Lease on the first pending task, or None if there is none'''
+        for filename in self._names('pending'):
+            name = _job_name(filename)
+            claimed = os.path.join(self._folder('claimed'), '{}.{}.pkl'.format(name, self.worker))
+            try:
+                os.rename(self._file('pending', name), claimed)
+            except OSError:
+                # Claimed by another worker first
+                continue
+
+            if os.path.exists(self._file('done', name)) or os.path.exists(self._file('collected', name)):
+                # Put back after its lease ran out, but finished by its worker all the same
+                os.remove(claimed)
+                continue
+
+            os.utime(claimed, None)
+            return Lease(name, claimed, self._read(claimed))
+        return None
+
+    def complete(self, lease, outcome):
+        job = dict(lease.job, result=outcome, error=None)
+        self._write(self._file('done', lease.name), job)
+        try:
+            os.remove(lease.filename)
+        except OSError:
+            pass
+
+    def fail(self, lease, error):
+        '''Puts a task back to pending, or to failed once it has been attempted max_attempts times'''
+        job = dict(lease.job, attempts=lease.job['attempts'] + 1, error=error)
+        state = 'failed' if job['attempts'] >= self.max_attempts else 'pending'
+        self._write(self._file(state, lease.name), job)
+        try:
+            os.remove(lease.filename)
+        except OSError:
+            pass
+
+    def reclaim(self):
+        '''Takes back the tasks of workers whose lease ran out; returns their names'''
+        now = self.now()
+        reclaimed = []
+        for filename in self._names('claimed'):
+            claimed = os.path.join(self._folder('claimed'), filename)
+            try:
+                expired = now - os.stat(claimed).st_mtime > self.lease
+            except OSError:
+                continue
+            if not expired:
+                continue
+
+            # The rename is the lock: only one worker takes back a lease
+            taken = os.path.join(self._folder('tmp'), '{}.{}'.format(filename, self.worker))
+            try:
+                os.rename(claimed, taken)
+            except OSError:
+                continue
+
+            name = _job_name(filename)
+            lease = Lease(name, taken, self._read(taken))
+            if os.path.exists(self._file('done', name)):
+                os.remove(taken)
+            else:
+                self.fail(lease, 'Lease of {} ran out'.format(filename.split('.')[1]))
+            reclaimed.append(name)
+        return reclaimed
+
+    def retry_failed(self):
+        for filename in self._names('failed'):
+            name = _job_name(filename)
+            job = dict(self._read(self._file('failed', name)), attempts=0)
+            self._write(self._file('pending', name), job)
+            os.remove(self._file('failed', name))
+
+    def work(self, poll=None):
+        '''Solves tasks until none is left pending or claimed; returns the number this worker solved'''
+        settings = None
+        solved = 0
+
+        while True:
+            self.reclaim()
+            lease = self.claim()
+            if lease is None:
+                if not self._names('claimed'):
+                    return solved
+                # Others are still working; their tasks come back here if they die
+                time.sleep(self.heartbeat if poll is None else poll)
+                continue
+
+            job = lease.job
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, args=(lease, self.heartbeat, stop))
+            heartbeat.daemon = True
+            heartbeat.start()
+            try:
+                if job['settings'] != settings:
+                    _init_worker(job['settings'])
+                    settings = job['settings']
+                outcome = _solve_task(job['task'] + (job['options'],))
+            except Exception:
+                self.fail(lease, traceback.format_exc())
+            else:
+                self.complete(lease, outcome)
+                solved += 1
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            print("[{}] {} task {} {} ({})".format(self.worker, 'lost' if lease.lost else 'solved',
+                                                   lease.name, job['task'][1], self.counts()))
+            sys.stdout.flush()
+
+    def done_jobs(self):
+        '''(name, job) of the done tasks, in submission order'''
+        return [(_job_name(f), self._read(self._file('done', _job_name(f)))) for f in self._names('done')]
+
+    def mark_collected(self, name):
+        os.rename(self._file('done', name), self._file('collected', name))
+
+
+def submit_sweep(generator, queue, demands, simplex_slice=generate_simplex(10), folder='simplex', threads=1, chunk_size=11, log_output=False, save_decision_variables=False, warm_start=True, save_pickles=False):
+    '''Queues the tasks of run_parallel_sweep; the workers use the generator's settings'''
+    options = sweep_options(folder, log_output, save_decision_variables, warm_start, save_pickles)
+    queue.submit(generator, campaign_tasks(demands, simplex_slice, chunk_size, warm_start), options, threads)
+
+
+def collect_sweep(generator, queue):
+    '''
+    Writes the sweeps whose tasks are all done to their stores, catalog and results_simplex frames, as
+    run_parallel_sweep does, and moves their tasks to collected. Returns the labels of the sweeps left.
+    '''
+    sweeps = {}
+    for name, job in queue.done_jobs():
+        sweeps.setdefault((job['options']['folder'], job['task'][1]), []).append((name, job))
+
+    left = []
+    for (folder, varying_label), jobs in sorted(sweeps.items()):
+        if len(jobs) < jobs[0][1]['sweep_tasks']:
+            left.append(varying_label)
+            continue
+
+        path = os.path.join(generator.df_path, folder)
+        parameters = jobs[0][1]['settings']['parameters']
+        meta = jobs[0][1]['result'][0]
+        store, plans = generator.open_store(path, varying_label, parameters, meta)
+
+        _df_tuples = []
+        for name, job in jobs:
+            demand = job['task'][0]
+            for p, misc, elapsed in job['result'][1]:
+                _df_tuples.append(generator.record_point(store, plans, meta, parameters, demand, p, misc,
+                                                         elapsed, job['options']['save_decision_variables']))
+        generator.save_results(_df_tuples, path, varying_label)
+
+        for name, _ in jobs:
+            queue.mark_collected(name)
+
+    return left
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Works on, or reports on, a shared sweep queue')
+    parser.add_argument('command', choices=('work', 'status', 'retry-failed'))
+    parser.add_argument('queue', help='queue folder, on a filesystem shared by the nodes')
+    parser.add_argument('--lease', type=float, default=600, help='seconds without heartbeat before a task is taken back')
+    parser.add_argument('--heartbeat', type=float, default=60, help='seconds between heartbeats')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue, args.lease, args.heartbeat, args.max_attempts)
+    if args.command == 'work':
+        solved = queue.work()
+        print("[{}] Queue empty after solving {} tasks: {}".format(queue.worker, solved, queue.counts()))
+    elif args.command == 'retry-failed':
+        queue.retry_failed()
+        print(queue.counts())
+    else:
+        print(queue.counts())
+
+
+if __name__ == '__main__':
+    main()
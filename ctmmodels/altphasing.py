@@ -1,53 +1,40 @@
-import docplex.mp.model as cpx
-from docplex.mp.solution import SolveSolution
-from numpy import sum as npsum
-import pandas as pd
+import numpy as np
 import time
 
 from ctmmodels.const import *
 from ctmmodels.base import BaseModel
+from ctmmodels.registry import TupleView, value_array, var_array
+from ctmmodels.sparse import ConstraintTemplate
 
 class Constraint5AltPhasingModel(BaseModel):
 
+    variable_names = dict(BaseModel.variable_names, g="g_{}^{}")
+
+    # The phase conflicts are only invariant under a half turn of the approaches
+    approach_rotations = (0, 2)
+
     def __init__(self, *args, **kwargs):
         super(Constraint5AltPhasingModel, self).__init__(*args, **kwargs)
     
     def generate_sets(self):
         super(Constraint5AltPhasingModel, self).generate_sets()
 
-        self.set_Phases = [(r, b, i) for r in range(2) for b in range(2) for i in range(2)]
+        # Phases: (ring, barrier, index), the movements each one serves, and the phases it conflicts with
+        self.set_Phases = list(self.topology.phases)
 
-        _tmp = CELL_MOVEMENT
+        self.Phase_map = self.topology.phase_map
 
-        self.Phase_map = {
-            (0,0,0): [(_tmp, LEFT_TURN, WESTBOUND), (_tmp, RIGHT_TURN, NORTHBOUND)], # WBL, NBR
-            (0,0,1): [(_tmp, THROUGH_TURN, EASTBOUND), (_tmp, RIGHT_TURN, EASTBOUND)],
-            (0,1,0): [(_tmp, LEFT_TURN, SOUTHBOUND), (_tmp, RIGHT_TURN, WESTBOUND)],
-            (0,1,1): [(_tmp, THROUGH_TURN, SOUTHBOUND), (_tmp, RIGHT_TURN, SOUTHBOUND)],
-            (1,0,0): [(_tmp, LEFT_TURN, EASTBOUND), (_tmp, RIGHT_TURN, SOUTHBOUND)],
-            (1,0,1): [(_tmp, THROUGH_TURN, WESTBOUND), (_tmp, RIGHT_TURN, WESTBOUND)],
-            (1,1,0): [(_tmp, LEFT_TURN, NORTHBOUND), (_tmp, RIGHT_TURN, EASTBOUND)],
-            (1,1,1): [(_tmp, THROUGH_TURN, NORTHBOUND), (_tmp, RIGHT_TURN, NORTHBOUND)],
-        }
-
-        self.PJ = {
-            (0,0,0): [intToBinTuple(x) for x in [1,2,3,6,7]],
-            (0,0,1): [intToBinTuple(x) for x in [0,2,3,6,7]],
-            (0,1,0): [intToBinTuple(x) for x in [0,1,3,4,5]],
-            (0,1,1): [intToBinTuple(x) for x in [0,1,2,4,5]],
-            (1,0,0): [intToBinTuple(x) for x in [2,3,5,6,7]],
-            (1,0,1): [intToBinTuple(x) for x in [2,3,4,6,7]],
-            (1,1,0): [intToBinTuple(x) for x in [0,1,4,5,7]],
-            (1,1,1): [intToBinTuple(x) for x in [0,1,4,5,6]],
-        }
+        self.PJ = self.topology.phase_conflicts
 
     def generate_decision_vars(self):
         super(Constraint5AltPhasingModel, self).generate_decision_vars()
 
-        self.g_vars = {(p,t): self.model.binary_var(
-            name="g_{}^{}".format(p,t))
-        for p in self.set_Phases
-        for t in self.set_T}
+        self.g_array = var_array(self.model.binary_var_list(
+            [(p,t) for p in self.set_Phases for t in self.set_T],
+            name=lambda k: "g_{}^{}".format(*k)),
+        len(self.set_Phases), self.time_range)
+
+        self.g_vars = TupleView(self.g_array, {p: n for n, p in enumerate(self.set_Phases)}, self.time_range)
 
         self._g_count = len(self.g_vars)
         self._vars_count = self._g_count + self._x_count + self._y_count
@@ -131,49 +118,99 @@ class Constraint5AltPhasingModel(BaseModel):
 
         return self._constraints_count
 
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
+    def rotate_key(self, block, key, r):
+        if block == 'g':
+            return self.topology.phase_rotations[r][key]
+        return super(Constraint5AltPhasingModel, self).rotate_key(block, key, r)
 
-    def return_solution(self):
-        df_x, df_y = super(Constraint5AltPhasingModel, self).return_solution()
+    def variable_blocks(self):
+        return super(Constraint5AltPhasingModel, self).variable_blocks() + [
+            ('g', self.set_Phases, self.g_array),
+        ]
+
+    def generate_templates(self):
+        super(Constraint5AltPhasingModel, self).generate_templates()
+
+        green_flowrate = ConstraintTemplate('green_flowrate', 'le', self.set_T)
+        slowstart_flowrate = ConstraintTemplate('slowstart_flowrate', 'le', self.set_T[1:])
+        for p in self.set_Phases:
+            for i in self.Phase_map[p]:
+                for j in self.S[i]:
+                    green_flowrate.add_row(
+                        [('y', (i,j), 0, 1), ('g', p, 0, -self.F[i])],
+                        0, "green_flowrate_{},{}".format(i,j))
+                    slowstart_flowrate.add_row(
+                        [('y', (i,j), 0, 1),
+                         ('g', p, 0, self.F[i]*self.flow_rate_reduction),
+                         ('g', p, -1, -self.F[i]*self.flow_rate_reduction)],
+                        self.F[i], "slowstart_flowrate_{},{}".format(i,j))
+
+        self._templates['greenflowrate'] = {
+            'green_flowrate': green_flowrate,
+            'slowstart_flowrate': slowstart_flowrate
+        }
+
+        green_max = ConstraintTemplate('green_max', 'le', range(self.time_range - self.g_max - 1))
+        green_min = ConstraintTemplate('green_min', 'ge', range(self.time_range - self.g_min))
+        for i in self.set_Phases:
+            green_max.add_row(
+                [('g', i, dt, 1) for dt in range(self.g_max+2)],
+                self.g_max, 'green_max_{}'.format(i))
+            green_min.add_row(
+                [('g', i, dt, 1) for dt in range(1, self.g_min+1)]
+                + [('g', i, 1, -self.g_min), ('g', i, 0, self.g_min)],
+                0, 'green_min_{}'.format(i))
+
+        self._templates['greentime'] = {
+            'green_max': green_max,
+            'green_min': green_min
+        }
 
-        df_g_raw = pd.DataFrame.from_dict(self.g_vars, orient="index", 
-                                          columns = ["variable_object"])
+        return self._templates
 
-        df_g_raw.reset_index(inplace=True)
-        df_g_raw["is_green"] = df_g_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_g_raw['cell'] = df_g_raw['index'].apply(lambda x: x[0])
-        df_g_raw['timestep'] = df_g_raw['index'].apply(lambda x: x[1])
+    def return_solution(self, values=None):
+        import pandas as pd
 
-        df_g_stacked = df_g_raw[['timestep', 'cell', 'is_green']]
-        df_g_converted = pd.DataFrame(columns=['timestep', 'cell', 'is_green'])
+        if values is None:
+            values = self.solution_arrays()
 
-        for row in df_g_stacked.itertuples():
-            raw = row[1:]
-            converteds = [(raw[0], c, int(raw[2])) for c in self.Phase_map[raw[1]]]
-            for entry in converteds:
-                df_g_converted.loc[-1] = entry
-                df_g_converted.index += 1
+        df_x, df_y = super(Constraint5AltPhasingModel, self).return_solution(values)
 
-        df_g = df_g_converted.sort_values(by='timestep').pivot_table(index='timestep', columns='cell', values='is_green', aggfunc=npsum)
-        df_g = df_g.replace(2,1)
+        # The same movement greens the KPIs are computed from
+        df_g = pd.DataFrame(self.movement_greens(values).T,
+            index=pd.Index(np.arange(self.time_range), name='timestep'),
+            columns=pd.Index(list(self.topology.movements), name='cell', tupleize_cols=False))
 
         return df_x, df_y, df_g
 
-    def return_phases(self):
-        df_g_raw = pd.DataFrame.from_dict(self.g_vars, orient="index", 
-                                          columns = ["variable_object"])
+    def movement_greens(self, values):
+        '''
+        Movement greens are the phase greens times the phase-movement incidence matrix; a movement
+        served by two green phases is still just green. Binaries come back from the solver within its
+        integrality tolerance, e.g. 0.9999999, so they are rounded, not truncated.
+        '''
+        g = np.rint(values['g']).astype(np.int64)
+        return np.minimum(self.topology.phase_incidence.T.dot(g), 1)
+
+    def phase_frame(self, g):
+        '''Green frame of the phases; g is the (phase, t) solution array'''
+        import pandas as pd
+
+        phases = np.empty(len(self.set_Phases), dtype=object)
+        for n, p in enumerate(self.set_Phases):
+            phases[n] = p
+
+        return pd.DataFrame({
+            'timestep': self._timesteps(len(self.set_Phases)),
+            'cell': np.repeat(phases, self.time_range),
+            'is_green': g.ravel(),
+            'phase_id': np.repeat(np.arange(len(self.set_Phases), dtype=np.int8), self.time_range),
+        }, columns=['timestep', 'cell', 'is_green', 'phase_id'])
 
-        df_g_raw.reset_index(inplace=True)
-        df_g_raw["is_green"] = df_g_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_g_raw['cell'] = df_g_raw['index'].apply(lambda x: x[0])
-        df_g_raw['timestep'] = df_g_raw['index'].apply(lambda x: x[1])
+    def return_phases(self):
+        import pandas as pd
 
-        df_g = df_g_raw[['timestep', 'cell', 'is_green']]
+        df_g = self.phase_frame(np.rint(value_array(self.model.solution, self.g_array)))
         df_g.is_green = pd.to_numeric(df_g.is_green, 'is_green', downcast='integer')
         return df_g
 
@@ -232,9 +269,29 @@ class Constraint6AltPhasingModel(Constraint5AltPhasingModel):
 
         return self._constraints_count
 
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
+    def generate_templates(self):
+        super(Constraint6AltPhasingModel, self).generate_templates()
+
+        movements_count = ConstraintTemplate('movements_count', 'eq', self.set_T)
+        movements_count.add_row([('g', p, 0, 1) for p in self.set_Phases], 2, 'movements_count')
+
+        movements_guarantee = ConstraintTemplate('movements_guarantee', 'ge', [0], timed_names=False)
+        for p in self.set_Phases:
+            movements_guarantee.add_row(
+                [('g', p, t, 1) for t in self.set_T],
+                self.g_min, 'movements_guarantee^{}'.format(p))
+
+        movements_conflicting = ConstraintTemplate('movements_conflicting', 'le', self.set_T)
+        for i in self.set_Phases:
+            for j in self.PJ[i]:
+                movements_conflicting.add_row(
+                    [('g', i, 0, 1), ('g', j, 0, 1)],
+                    1, 'movements_conflicting_{},{}'.format(i,j))
+
+        self._templates['conflicts'] = {
+            'movements_count': movements_count,
+            'movements_guarantee': movements_guarantee,
+            'movements_conflicting': movements_conflicting
+        }
+
+        return self._templates
@@ -0,0 +1,116 @@
+'''
+Archive of solved green plans, used to warm start new solves from the nearest solved point.
+
+A plan is the vector of binary variable values (green, barrier and ring variables) of a solved model,
+in the order the model creates them. Plans are grouped by model class and the parameters that fix
+the model structure; within a group, points are compared by demand (as a fraction of the saturation
+flow rate) and objective weights.
+
+An archive with a path saves itself every save_every plans it adds, so that an interrupted sweep keeps
+most of what it solved; sweeps save it once more when they end, however they end. Archived plans are
+handed to CPLEX as partial MIP starts, which it checks and repairs within the solve itself.
+'''
+
+import os
+import pickle
+import numpy as np
+
+
+class SolutionArchive(object):
+
+    def __init__(self, path=None, save_every=10):
+        self.path = path
+        self.save_every = save_every
+        self.entries = {}
+
+        # Plans added since the last save
+        self._unsaved = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.entries = pickle.load(f)
+
+    @staticmethod
+    def key(model):
+        return (
+            type(model).__name__,
+            model.time_range,
+            model.time_step,
+            model.g_min,
+            model.g_max,
+            round(model.sat_flow_rate, 9),
+            model.flow_rate_reduction,
+            tuple(model.turn_ratios),
+        )
+
+    @staticmethod
+    def point(model):
+        '''Coordinates of a model in the archive: demand over saturation flow, then the weights'''
+        return np.array(
+            [d / model.sat_flow_rate for d in model.demand]
+            + [getattr(model, w, 0) for w in ('alpha', 'beta', 'gamma')],
+            dtype=np.float64)
+
+    def __len__(self):
+        return sum(len(points) for points, _ in self.entries.values())
+
+    def add(self, model):
+        '''Archives the green plan of a solved model'''
+        if model.model.solution is None:
+            return False
+
+        plan = np.array([v.solution_value for v in model.model.iter_binary_vars()])
+        plan = np.round(plan).astype(np.uint8)
+
+        points, plans = self.entries.setdefault(self.key(model), ([], []))
+        points.append(self.point(model))
+        plans.append(plan)
+
+        self._unsaved += 1
+        if self.path is not None and self.save_every and self._unsaved >= self.save_every:
+            self.save()
+        return True
+
+    def nearest(self, model):
+        '''Returns (distance, plan) of the archived plan closest to the model, or None'''
+        if self.key(model) not in self.entries:
+            return None
+
+        points, plans = self.entries[self.key(model)]
+        distances = np.linalg.norm(np.array(points) - self.point(model), axis=1)
+        n = int(np.argmin(distances))
+        return float(distances[n]), plans[n]
+
+    def save(self, path=None):
+        path = self.path if path is None else path
+        # Written aside and renamed, so that an interrupted save leaves the previous archive
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(self.entries, f, protocol=2)
+        os.rename(tmp, path)
+        self._unsaved = 0
+
+
+def plan_mip_start(model, plan):
+    '''
+    Partial MIP start of a green plan on a built model: the binaries only, as a (solution, effort level)
+    start for model.solve. CPLEX checks the plan and completes the continuous variables with its repair
+    effort level, as part of the solve; a plan it cannot repair is dropped. None if the plan does not
+    have the model's binaries.
+    '''
+    mdl = model.model
+    binaries = list(mdl.iter_binary_vars())
+    if len(binaries) != len(plan):
+        return None
+
+    return mdl.new_solution(dict(zip(binaries, plan.tolist()))), 'repair'
+
+
+def archived_mip_start(model, archive):
+    '''Partial MIP start from the nearest archived plan, or None'''
+    found = archive.nearest(model)
+    if found is None:
+        return None
+
+    _, plan = found
+    return plan_mip_start(model, plan)
@@ -1,9 +1,12 @@
-import docplex.mp.model as cpx
-import pandas as pd
+import numpy as np
 import time
 from ctmmodels.const import *
+from ctmmodels.registry import var_array
+from ctmmodels.results import ResultsMixin
+from ctmmodels.sparse import SparseBuildMixin, process_rss
+from ctmmodels.symmetry import SymmetryMixin
 
-class BaseModel(object):
+class BaseModel(SparseBuildMixin, ResultsMixin, SymmetryMixin):
     # sat_flow_rate       = 0.5 # vehicles / second
     # flow_rate_reduction = 0.5 # Not specified in the paper
     # g_min               = 6 # seconds (change to 30 seconds)
@@ -16,6 +19,7 @@ class BaseModel(object):
     # model_name          = 'Thesis MILP Model'
 
     cell_length         = FREE_FLOW_SPEED # requirement to meaasure delay accurately in CTM
+    topology            = TOPOLOGY # cells, adjacency and conflicts, shared by all instances
 
     '''
     NOTE: The original paper used a saturation flow rate of 1 vehicle per time step per cell. This gives us a saturated inflow of 1 veh / 4 lanes / 2 sec = 0.125 veh per second, or 450 veh per hr per lane, which the paper labels as undersaturated. The paper gave no threshold for saturated flow, hence the usage of 1 as the saturated flow rate per timestep.
@@ -34,10 +38,18 @@ class BaseModel(object):
                 r_right             = 0.25,
                 alpha               = 1,
                 preload             = None,
+                bulk_build          = False,
+                anonymous           = False,
+                lean                = False,
                 model_name          = 'Base Extended Model'):
 
         self.model_name = model_name
-        self.model = cpx.Model(name=self.model_name)
+
+        # Anonymous models carry no names; they are resolved from indices only when needed (see export_lp)
+        # Lean models also keep no constraint objects, only the row ranges of each family (implies anonymous)
+        self.lean = lean
+        self.anonymous = anonymous or lean
+        self.reset_model()
 
         # Convert all units from seconds to timesteps
         self.time_step = time_step
@@ -62,30 +74,30 @@ class BaseModel(object):
         self.alpha = alpha
         self.preload = preload
 
+        # Build constraints from sparse per-timestep templates instead of row by row (implied by anonymous)
+        self.bulk_build = bulk_build
+
     def generate_sets(self):
         self.set_T = range(self.time_range)
         self.set_T_bounded = range(self.time_range-1)
 
+        # Cells and adjacency come from the shared intersection topology; the lists are copies
+        topo = self.topology
+
         # Source cells: (0,approach_id)
-        self.set_C_O = [(CELL_SOURCE,0,i)
-            for i in range(APPROACHES)]
+        self.set_C_O = list(topo.sources)
 
         # Sink cells: (0,approach_id)
-        self.set_C_S = [(CELL_SINK,0,i)
-            for i in range(APPROACHES)]
+        self.set_C_S = list(topo.sinks)
 
         # Movement cells: (movement_id, apporach_id)
-        self.set_C_I = [(CELL_MOVEMENT,i,j)
-            for i in range(MOVEMENT_CELLS)
-            for j in range(APPROACHES)]
+        self.set_C_I = list(topo.movements)
 
         # Normal cells: (cell_id, approach_id)
-        self.set_C_N = [(CELL_NORMAL,i,j)
-            for i in range(APPROACH_CELLS)
-            for j in range(APPROACHES)]
+        self.set_C_N = list(topo.normals)
 
         # Set of all cells: (cell_type, x, y)
-        self.set_C = self.set_C_O + self.set_C_S + self.set_C_I + self.set_C_N
+        self.set_C = list(topo.cells)
         self.set_C_labels = [
             'source',
             'sink',
@@ -93,64 +105,83 @@ class BaseModel(object):
             'normal'
         ]
 
-        # Set of all cells except sink cells
-        self.set_C_minS = [i for i in self.set_C if i not in self.set_C_S]
+        # Set of all cells except sink cells, except source cells, and except both
+        self.set_C_minS = list(topo.non_sinks)
+        self.set_C_minO = list(topo.non_sources)
+        self.set_C_inner = list(topo.inner)
+
+        self.P = topo.P
 
-        self.P = {i: P_mapping(i)
-            for i in self.set_C}
+        self.S = topo.S
 
-        self.S = {i: S_mapping(i)
-            for i in self.set_C}
+        self.J = topo.J
 
-        self.J = {i: J_mapping(i)
-            for i in self.set_C_I}
+        # Integer ids for all cells and edges (links between cells)
+        self.registry = topo.registry
+
+        # Set of all edges: (cell_from, cell_to)
+        self.set_E = list(topo.edges)
 
     def generate_parameters(self):
         def M_mapping(i):
-            if i in self.set_C_I:
+            if i in self.topology.movement_set:
                 return (self.cell_length / MEAN_CAR_LENGTH) * TURN_LANES[i[1]]
-            elif i in self.set_C_O:
+            elif i in self.topology.source_set:
                 return float("inf")
             return (self.cell_length / MEAN_CAR_LENGTH) * APPROACH_LANES
 
         def F_mapping(i):
-            if i in self.set_C_I:
+            if i in self.topology.movement_set:
                 return self.sat_flow_rate * TURN_LANES[i[1]]
             return self.sat_flow_rate * APPROACH_LANES
 
-        self.d = {(i,t): self.demand[i[2]] * APPROACH_LANES
-            for i in self.set_C_O
-            for t in self.set_T}
+        # Parameters are stored per cell id; M, F, d and r are tuple-keyed views of them
+        self.capacity = np.array([M_mapping(i) for i in self.set_C])
+        self.max_flow = np.array([F_mapping(i) for i in self.set_C])
+        self.turn_ratio = np.array([self.turn_ratios[i[1]] if i in self.topology.movement_set else 0.0
+            for i in self.set_C])
+
+        self.inflow = np.zeros((self.registry.n_cells, self.time_range))
+        for i in self.set_C_O:
+            self.inflow[self.registry.cell_ids[i], :] = self.demand[i[2]] * APPROACH_LANES
+
+        self.d = self.registry.view(self.inflow, self.set_C_O, self.time_range)
 
-        self.M = {i: M_mapping(i)
-            for i in self.set_C}
+        self.M = self.registry.view(self.capacity)
 
-        self.F = {i: F_mapping(i)
-            for i in self.set_C}
+        self.F = self.registry.view(self.max_flow)
 
-        self.r = {i: self.turn_ratios[i[1]]
-            for i in self.set_C_I}
+        self.r = self.registry.view(self.turn_ratio, self.set_C_I)
 
     def reset_model(self):
-        self.model = cpx.Model(name=self.model_name)
+        # docplex is only loaded once a model is created, so that importing the models stays cheap
+        import docplex.mp.model as cpx
+
+        self.model = cpx.Model(name=self.model_name, ignore_names=self.anonymous)
 
     def generate_decision_vars(self):
         # We won't generate g variables yet
 
-        self.x_vars = {(i,t): self.model.continuous_var(
+        T = self.time_range
+        reg = self.registry
+
+        # Variables are created in one batch per family and kept as (cell, t) and (edge, t) arrays
+        self.x_array = var_array(self.model.continuous_var_list(
+            [(i,t) for i in self.set_C for t in self.set_T],
             lb=0,
-            ub=self.M[i],
-            name="x_{}^{}".format(i,t))
-        for i in self.set_C
-        for t in self.set_T}
+            ub=np.repeat(self.capacity, T).tolist(),
+            name=lambda k: "x_{}^{}".format(*k)),
+        reg.n_cells, T)
 
-        self.y_vars = {(i,j,t): self.model.continuous_var(
+        self.y_array = var_array(self.model.continuous_var_list(
+            [(i,j,t) for (i,j) in self.set_E for t in self.set_T],
             lb=0,
-            ub=min(self.F[i],self.F[j]),
-            name="y_{}_{}^{}".format(i,j,t))
-        for i in self.set_C
-        for j in self.S[i]
-        for t in self.set_T}
+            ub=np.repeat(np.minimum(self.max_flow[reg.edge_from], self.max_flow[reg.edge_to]), T).tolist(),
+            name=lambda k: "y_{}_{}^{}".format(*k)),
+        reg.n_edges, T)
+
+        self.x_vars = reg.view(self.x_array, time_range=T)
+        self.y_vars = reg.edge_view(self.y_array, T)
 
         self._g_count = 0
         self._x_count = len(self.x_vars)
@@ -181,7 +212,7 @@ class BaseModel(object):
                 ),
                 ctname="init_rest_{}".format(i)
             ))
-            for i in self.set_C if i not in self.set_C_O
+            for i in self.set_C_minO
         ]
 
         constraint_init = {
@@ -248,7 +279,7 @@ class BaseModel(object):
                 ctname="flowrate_srccap_{}^{}".format(i,t)
             ))
             for t in self.set_T
-            for i in self.set_C if i not in self.set_C_S
+            for i in self.set_C_minS
         ]
 
         flowrate_2 = [
@@ -262,7 +293,7 @@ class BaseModel(object):
                 ctname="flowrate_destcap_{}^{}".format(j,t)
             ))
             for t in self.set_T
-            for j in self.set_C if j not in self.set_C_O
+            for j in self.set_C_minO
         ]
 
         flowrate_3 = [
@@ -275,7 +306,7 @@ class BaseModel(object):
                 ctname="flowrate_succcap_{}^{}".format(i,t)
             ))
             for t in self.set_T
-            for i in self.set_C if i not in self.set_C_S
+            for i in self.set_C_minS
         ]
 
         flowrate_4 = [
@@ -288,7 +319,7 @@ class BaseModel(object):
                 ctname="flowrate_predcap_{}^{}".format(j,t)
             ))
             for t in self.set_T
-            for j in self.set_C if j not in self.set_C_O
+            for j in self.set_C_minO
         ]
 
         constraint_flowrate = {
@@ -339,7 +370,7 @@ class BaseModel(object):
                 self.x_vars[(i,t)] - self.model.sum(
                     self.y_vars[(i,j,t)]
                     for j in self.S[i])
-                for i in self.set_C if i not in self.set_C_S)
+                for i in self.set_C_minS)
             for t in self.set_T)
 
         self._objective = self.alpha*D_term
@@ -347,82 +378,73 @@ class BaseModel(object):
         self.model.minimize(self._objective)
     
     def generate(self):
+        rss = process_rss()
+
         self.generate_sets()
         self.generate_parameters()
         self.generate_decision_vars()
-        self.generate_constraints()
+        if self.bulk_build or self.anonymous:
+            self.generate_constraints_bulk()
+        else:
+            self.generate_constraints()
         self.generate_objective_fxn()
 
-    def solve(self, log_output=False):
+        # Memory taken by the build, see memory_report
+        self._build_rss = None if rss is None else process_rss() - rss
+
+    def solve(self, log_output=False, mip_start=None):
+        '''
+        Solves the model and returns the solve time. mip_start, e.g. the solution of a previous solve
+        or a list of such solutions, is passed to CPLEX as a warm start; a start may also be a
+        (solution, effort level) pair, e.g. a partial solution for CPLEX to repair. For MIPs, the time
+        to the first incumbent is kept in _time_to_incumbent.
+        '''
+        from ctmmodels.listeners import IncumbentTimer
+
+        is_mip = self.model.number_of_binary_variables > 0
+        timer = IncumbentTimer()
+
+        if is_mip:
+            self.model.clear_mip_starts()
+            for start in (mip_start if isinstance(mip_start, list) else [mip_start]):
+                if isinstance(start, tuple):
+                    self.model.add_mip_start(*start)
+                elif start is not None:
+                    self.model.add_mip_start(start)
+            self.model.add_progress_listener(timer)
+
         start = time.time()
         print("Solving...")
         self.model.solve(log_output=log_output)
         print("Done!")
         end = time.time()
         self._time = end - start
-        print("Time elapsed: {}".format(self._time))
-        return self._time
-
-    def return_solution(self):
-        df_x_raw = pd.DataFrame.from_dict(self.x_vars, orient="index", 
-                                          columns = ["variable_object"])
-
-        df_x_raw.reset_index(inplace=True)
-        df_x_raw["volume"] = df_x_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_x_raw['cell'] = df_x_raw['index'].apply(lambda x: x[0])
-        df_x_raw['timestep'] = df_x_raw['index'].apply(lambda x: x[1])
 
-        df_x = df_x_raw[['timestep', 'cell', 'volume']]
+        if is_mip:
+            self.model.remove_progress_listener(timer)
+            # A MIP start that is already optimal may be accepted before any progress is reported
+            self._time_to_incumbent = timer.time_to_incumbent
+            if self._time_to_incumbent is None and self.model.solution is not None:
+                self._time_to_incumbent = self._time
+        else:
+            self._time_to_incumbent = None
 
-        df_y_raw = pd.DataFrame.from_dict(self.y_vars, orient="index", 
-                                          columns = ["variable_object"])
+        print("Time elapsed: {}".format(self._time))
+        return self._time
 
-        df_y_raw.reset_index(inplace=True)
-        df_y_raw["flow"] = df_y_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_y_raw['cell_from'] = df_y_raw['index'].apply(lambda x: x[0])
-        df_y_raw['cell_to'] = df_y_raw['index'].apply(lambda x: x[1])
-        df_y_raw['timestep'] = df_y_raw['index'].apply(lambda x: x[2])
+    def return_solution(self, values=None):
+        if values is None:
+            values = self.solution_arrays()
 
-        df_y = df_y_raw[['timestep', 'cell_from', 'cell_to', 'flow']]
+        df_x = self.volume_frame(values['x'])
+        df_y = self.flow_frame(values['y'])
 
         return df_x, df_y
 
     def return_parameters(self):
+        import pandas as pd
+
         df_M = pd.DataFrame.from_dict(self.M, orient="index", columns=["capacity"])
         df_F = pd.DataFrame.from_dict(self.F, orient="index", columns=["max_flow"])
 
         return pd.concat([df_M, df_F], axis=1)
-
-    def return_objective_value(self):
-        D_term = sum(
-            sum(
-                self.x_vars[(i,t)].solution_value - sum(
-                    self.y_vars[(i,j,t)].solution_value
-                    for j in self.S[i])
-                for i in self.set_C if i not in self.set_C_S)
-            for t in self.set_T) * self.time_step
-
-        return D_term
-
-    def return_volume(self):
-        '''Returns final volumes of approaches'''
-        V = [
-            sum(
-                self.x_vars[(i,self.time_range-1)].solution_value
-            for i in self.set_C_minS if i[2] == k)
-        for k in range(APPROACHES)]
-
-        return V
-
-    def return_delay_equity(self):
-        '''Returns delay per approach'''
-        D_equity = [sum(
-            sum(
-                self.x_vars[(i,t)].solution_value - sum(
-                    self.y_vars[(i,j,t)].solution_value
-                    for j in self.S[i])
-                for i in self.set_C_minS if i[2] == k)
-            for t in self.set_T) * self.time_step
-        for k in range(APPROACHES)]
-
-        return D_equity
@@ -1,3 +1,7 @@
+import numpy as np
+
+from ctmmodels.registry import CellRegistry, FrozenMap
+
 PAPER_PARAMETERS    = {
     'FREE_FLOW_SPEED': 44,
     'SAT_FLOW_RATE': 1,
@@ -57,7 +61,7 @@ WESTBOUND           = 1
 NORTHBOUND          = 2
 EASTBOUND           = 3
 
-def P_mapping(i):
+def P_mapping(i, approach_cells=APPROACH_CELLS):
     # 1. For source cells, return empty set
     if i[0] == CELL_SOURCE:
         return []
@@ -73,7 +77,7 @@ def P_mapping(i):
         return output
     # 3. For movement cells, return the previous cell
     if i[0] == CELL_MOVEMENT:
-        return [(CELL_NORMAL,APPROACH_CELLS-1,i[2])]
+        return [(CELL_NORMAL,approach_cells-1,i[2])]
     # 4. For normal cells, return the previous cell
     if i[0] == CELL_NORMAL:
         if i[1] == 0:
@@ -81,7 +85,7 @@ def P_mapping(i):
         else:
             return [(CELL_NORMAL,i[1]-1,i[2])]
 
-def S_mapping(i):
+def S_mapping(i, approach_cells=APPROACH_CELLS):
     # 1. For source cells, return the next cell
     if i[0] == CELL_SOURCE:
         return [(CELL_NORMAL,0,i[2])]
@@ -93,7 +97,7 @@ def S_mapping(i):
         return [(CELL_SINK,0,(i[2]+i[1]+1)%4)]
     # 4. For normal cells, return the next cell/s
     if i[0] == CELL_NORMAL:
-        if i[1] == APPROACH_CELLS-1:
+        if i[1] == approach_cells-1:
             return [(CELL_MOVEMENT,x,i[2]) for x in range(MOVEMENT_CELLS)]
         else:
             return [(CELL_NORMAL,i[1]+1,i[2])]
@@ -136,4 +140,167 @@ def J_mapping(i):
             return output
 
 def intToBinTuple(x):
-    return (x / 4, (x / 2) % 2, (x) % 2)
+    return (x // 4, (x // 2) % 2, (x) % 2)
+
+
+class IntersectionTopology(object):
+    '''
+    Cells, adjacency and conflict structure of one intersection geometry.
+
+    None of this depends on the model parameters, so it is built once per geometry and shared by every
+    model instance (see intersection_topology). Instances are immutable: the cell sets are tuples and
+    frozensets, the lookup tables are FrozenMaps and the arrays are read-only.
+    '''
+
+    def __init__(self, approach_cells=APPROACH_CELLS):
+        self.approach_cells = approach_cells
+
+        # Cells, in the order of set_C
+        self.sources = tuple((CELL_SOURCE,0,i) for i in range(APPROACHES))
+        self.sinks = tuple((CELL_SINK,0,i) for i in range(APPROACHES))
+        self.movements = tuple((CELL_MOVEMENT,i,j)
+            for i in range(MOVEMENT_CELLS)
+            for j in range(APPROACHES))
+        self.normals = tuple((CELL_NORMAL,i,j)
+            for i in range(approach_cells)
+            for j in range(APPROACHES))
+        self.cells = self.sources + self.sinks + self.movements + self.normals
+
+        self.source_set = frozenset(self.sources)
+        self.sink_set = frozenset(self.sinks)
+        self.movement_set = frozenset(self.movements)
+
+        # Filtered cell lists that the constraints iterate over
+        self.non_sinks = tuple(i for i in self.cells if i not in self.sink_set)
+        self.non_sources = tuple(i for i in self.cells if i not in self.source_set)
+        self.inner = tuple(i for i in self.non_sinks if i not in self.source_set)
+
+        self.lefts = tuple(c for c in self.movements if c[1] == LEFT_TURN)
+        self.throughs = tuple(c for c in self.movements if c[1] == THROUGH_TURN)
+        self.rights = tuple(c for c in self.movements if c[1] == RIGHT_TURN)
+
+        # Adjacency
+        self.P = FrozenMap((i, tuple(P_mapping(i, approach_cells))) for i in self.cells)
+        self.S = FrozenMap((i, tuple(S_mapping(i, approach_cells))) for i in self.cells)
+        self.registry = CellRegistry(self.cells, self.S).freeze()
+        self.edges = tuple(self.registry.edges)
+
+        # Movement conflicts (no phasing)
+        self.J = FrozenMap((i, tuple(J_mapping(i))) for i in self.movements)
+        self.movement_ids = FrozenMap((c, n) for n, c in enumerate(self.movements))
+        self.movement_conflicts = self._conflict_matrix(self.movement_ids, self.J)
+
+        # Alternate phasing: phases are (ring, barrier, index) and each serves two movements
+        self.phases = tuple((r, b, i) for r in range(2) for b in range(2) for i in range(2))
+        self.phase_ids = FrozenMap((p, n) for n, p in enumerate(self.phases))
+        self.phase_map = FrozenMap({
+            (0,0,0): ((CELL_MOVEMENT, LEFT_TURN, WESTBOUND), (CELL_MOVEMENT, RIGHT_TURN, NORTHBOUND)), # WBL, NBR
+            (0,0,1): ((CELL_MOVEMENT, THROUGH_TURN, EASTBOUND), (CELL_MOVEMENT, RIGHT_TURN, EASTBOUND)),
+            (0,1,0): ((CELL_MOVEMENT, LEFT_TURN, SOUTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, WESTBOUND)),
+            (0,1,1): ((CELL_MOVEMENT, THROUGH_TURN, SOUTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, SOUTHBOUND)),
+            (1,0,0): ((CELL_MOVEMENT, LEFT_TURN, EASTBOUND), (CELL_MOVEMENT, RIGHT_TURN, SOUTHBOUND)),
+            (1,0,1): ((CELL_MOVEMENT, THROUGH_TURN, WESTBOUND), (CELL_MOVEMENT, RIGHT_TURN, WESTBOUND)),
+            (1,1,0): ((CELL_MOVEMENT, LEFT_TURN, NORTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, EASTBOUND)),
+            (1,1,1): ((CELL_MOVEMENT, THROUGH_TURN, NORTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, NORTHBOUND)),
+        })
+        self.phase_conflicts = FrozenMap({
+            (0,0,0): tuple(intToBinTuple(x) for x in [1,2,3,6,7]),
+            (0,0,1): tuple(intToBinTuple(x) for x in [0,2,3,6,7]),
+            (0,1,0): tuple(intToBinTuple(x) for x in [0,1,3,4,5]),
+            (0,1,1): tuple(intToBinTuple(x) for x in [0,1,2,4,5]),
+            (1,0,0): tuple(intToBinTuple(x) for x in [2,3,5,6,7]),
+            (1,0,1): tuple(intToBinTuple(x) for x in [2,3,4,6,7]),
+            (1,1,0): tuple(intToBinTuple(x) for x in [0,1,4,5,7]),
+            (1,1,1): tuple(intToBinTuple(x) for x in [0,1,4,5,6]),
+        })
+        self.phase_conflict_matrix = self._conflict_matrix(self.phase_ids, self.phase_conflicts)
+        self.phase_incidence = self._incidence_matrix(self.phase_ids, self.movement_ids, self.phase_map)
+
+        # Rotating the approaches by r maps phase p to phase_rotations[r][p], the phase of the rotated movements
+        self.phase_rotations = tuple(
+            FrozenMap(
+                (p, next(q for q in self.phases
+                         if set(self.phase_map[q]) == set((c[0], c[1], (c[2]+r)%APPROACHES) for c in self.phase_map[p])))
+                for p in self.phases)
+            for r in range(APPROACHES))
+
+        # Phase-based ring barrier: rings and barrier sides
+        self.ring_1 = tuple(p for p in self.phases if p[0] == 0)
+        self.ring_2 = tuple(p for p in self.phases if p[0] == 1)
+        self.barrier_1 = frozenset(p for p in self.phases if p[1] == 0)
+        self.barrier_2 = frozenset(p for p in self.phases if p[1] == 1)
+
+        # Movement-based ring barrier (parent model)
+        self.lt_conflicts = tuple([
+            ((CELL_MOVEMENT, LEFT_TURN, i), (CELL_MOVEMENT, THROUGH_TURN, j))
+            for i in range(APPROACHES)
+            for j in range(APPROACHES) if j != i
+        ] + [
+            ((CELL_MOVEMENT, LEFT_TURN, i), (CELL_MOVEMENT, LEFT_TURN, j))
+            for i in range(APPROACHES)
+            for j in range(i) if (i - j != 2)
+        ] + [
+            ((CELL_MOVEMENT, THROUGH_TURN, i), (CELL_MOVEMENT, THROUGH_TURN, j))
+            for i in range(APPROACHES)
+            for j in range(i) if (i - j != 2)
+        ])
+        self.left_right_pairs = tuple(
+            ((CELL_MOVEMENT, LEFT_TURN, i), (CELL_MOVEMENT, RIGHT_TURN, (i+1)%APPROACHES))
+            for i in range(APPROACHES))
+        self.right_through_pairs = tuple(
+            ((CELL_MOVEMENT, RIGHT_TURN, i), (CELL_MOVEMENT, THROUGH_TURN, i))
+            for i in range(APPROACHES))
+        self.lt_conflict_matrix = self._conflict_matrix(self.movement_ids,
+            FrozenMap((i, tuple(b for a, b in self.lt_conflicts if a == i)) for i in self.movements))
+
+        self.ring_H1 = (
+            (CELL_MOVEMENT, LEFT_TURN, WESTBOUND), (CELL_MOVEMENT, RIGHT_TURN, NORTHBOUND),
+            (CELL_MOVEMENT, THROUGH_TURN, EASTBOUND), (CELL_MOVEMENT, RIGHT_TURN, EASTBOUND),
+            (CELL_MOVEMENT, LEFT_TURN, EASTBOUND), (CELL_MOVEMENT, RIGHT_TURN, SOUTHBOUND),
+            (CELL_MOVEMENT, THROUGH_TURN, WESTBOUND), (CELL_MOVEMENT, RIGHT_TURN, WESTBOUND),
+        )
+        self.ring_H2 = (
+            (CELL_MOVEMENT, LEFT_TURN, SOUTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, WESTBOUND),
+            (CELL_MOVEMENT, THROUGH_TURN, SOUTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, SOUTHBOUND),
+            (CELL_MOVEMENT, LEFT_TURN, NORTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, EASTBOUND),
+            (CELL_MOVEMENT, THROUGH_TURN, NORTHBOUND), (CELL_MOVEMENT, RIGHT_TURN, NORTHBOUND),
+        )
+        self.ring_H1_set = frozenset(self.ring_H1)
+        self.ring_H2_set = frozenset(self.ring_H2)
+
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("IntersectionTopology is immutable")
+        object.__setattr__(self, name, value)
+
+    @staticmethod
+    def _conflict_matrix(ids, conflicts):
+        matrix = np.zeros((len(ids), len(ids)), dtype=bool)
+        for i, js in conflicts.items():
+            for j in js:
+                matrix[ids[i], ids[j]] = True
+                matrix[ids[j], ids[i]] = True
+        matrix.flags.writeable = False
+        return matrix
+
+    @staticmethod
+    def _incidence_matrix(row_ids, col_ids, mapping):
+        matrix = np.zeros((len(row_ids), len(col_ids)), dtype=np.int64)
+        for i, js in mapping.items():
+            for j in js:
+                matrix[row_ids[i], col_ids[j]] = 1
+        matrix.flags.writeable = False
+        return matrix
+
+
+_topologies = {}
+
+def intersection_topology(approach_cells=APPROACH_CELLS):
+    '''Returns the shared topology of a geometry, building it on first use'''
+    if approach_cells not in _topologies:
+        _topologies[approach_cells] = IntersectionTopology(approach_cells)
+    return _topologies[approach_cells]
+
+TOPOLOGY = intersection_topology()
@@ -0,0 +1,21 @@
+'''
+Progress listeners attached to the models during solve.
+'''
+
+from docplex.mp.progress import ProgressListener
+
+
+class IncumbentTimer(ProgressListener):
+    '''Records the solve time at which the first incumbent (integer feasible solution) was reported'''
+
+    def __init__(self):
+        super(IncumbentTimer, self).__init__()
+        self.time_to_incumbent = None
+
+    def notify_start(self):
+        super(IncumbentTimer, self).notify_start()
+        self.time_to_incumbent = None
+
+    def notify_progress(self, progress_data):
+        if self.time_to_incumbent is None and progress_data.has_incumbent:
+            self.time_to_incumbent = progress_data.time
@@ -0,0 +1,124 @@
+'''
+On-disk cache of built models.
+
+A built model is saved in CPLEX's native SAV format, next to a pickle of the constraint templates it was
+built from. Entries are keyed by a hash of the structural parameters only (model class, time_range,
+time_step, g_min, g_max, the intersection geometry and naming), so one entry serves every demand,
+turn ratio, saturation flow and set of weights. A model loaded from the cache is wired up exactly like a
+bulk-built one, then brought to its own parameters by pushing the constraint rows that differ from the
+cached templates, as the set_* methods do.
+'''
+
+import hashlib
+import json
+import os
+import pickle
+
+import ctmmodels
+
+
+STRUCTURAL_PARAMETERS = ('time_range', 'time_step', 'g_min', 'g_max', 'anonymous')
+
+
+class _LoadedVariables(object):
+    '''
+    Stands in for the docplex model while generate_decision_vars runs on a loaded model: variable
+    lists are handed out from the loaded variables, in the order they were created in
+    '''
+
+    def __init__(self, model):
+        self._model = model
+        self._next = 0
+
+    def _variable_list(self, keys, *args, **kwargs):
+        start = self._next
+        self._next = start + len(keys)
+        return [self._model.get_var_by_index(n) for n in range(start, self._next)]
+
+    continuous_var_list = _variable_list
+    binary_var_list = _variable_list
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class ModelCache(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, model):
+        structure = dict((p, getattr(model, p)) for p in STRUCTURAL_PARAMETERS)
+        structure['model'] = type(model).__name__
+        structure['cells'] = [list(c) for c in model.topology.cells]
+        structure['version'] = ctmmodels.__version__
+        return hashlib.sha1(json.dumps(structure, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _files(self, key):
+        return os.path.join(self.path, key + '.sav'), os.path.join(self.path, key + '.pkl')
+
+    def generate(self, model):
+        '''
+        Generates a model that was created but not yet generated: loaded from the cache if its structure
+        was built before, otherwise built in bulk and saved
+        '''
+        if model.lean:
+            # Lean models build faster than they load, and have no constraint objects to wire up
+            model.generate()
+            return model
+
+        sav, pkl = self._files(self.key(model))
+
+        if os.path.exists(sav) and os.path.exists(pkl):
+            with open(pkl, 'rb') as f:
+                templates = pickle.load(f)
+            try:
+                self.load(model, sav, templates)
+                self.hits += 1
+                return model
+            except ValueError:
+                # A parameter changed the shape of a constraint family; this model needs its own build
+                model.reset_model()
+
+        self.misses += 1
+        model.bulk_build = True
+        model.generate()
+
+        # Per-process temporary files, for workers that build the same structure at the same time
+        tmp = '.{}.tmp'.format(os.getpid())
+        model.model.get_cplex().write(sav + tmp, 'sav')
+        os.rename(sav + tmp, sav)
+        with open(pkl + tmp, 'wb') as f:
+            pickle.dump(model._templates, f, protocol=2)
+        os.rename(pkl + tmp, pkl)
+
+        return model
+
+    def load(self, model, sav, templates):
+        from docplex.mp.model_reader import ModelReader
+
+        model.generate_sets()
+        model.generate_parameters()
+
+        loaded = ModelReader.read(sav, model_name=model.model_name, ignore_names=model.anonymous)
+
+        # Variables: the normal creation code, with the loaded variables handed out in order
+        model.model = _LoadedVariables(loaded)
+        try:
+            model.generate_decision_vars()
+        finally:
+            model.model = loaded
+
+        # Constraints: the loaded rows are in bulk-build order, one run of rows per template
+        model._templates = templates
+        model.wire_constraints(list(loaded.iter_linear_constraints()))
+        model.generate_objective_fxn()
+
+        # Parameter-dependent rows and bounds are brought to this model's parameters
+        model.update_constraints(templates)
+        return model
@@ -1,22 +1,26 @@
-import docplex.mp.model as cpx
-import pandas as pd
 import time
 
 from ctmmodels.const import *
 from ctmmodels.base import BaseModel
+from ctmmodels.registry import TupleView, var_array
+from ctmmodels.sparse import ConstraintTemplate
 
 class Constraint5Model(BaseModel):
 
+    variable_names = dict(BaseModel.variable_names, g="g_{}^{}")
+
     def __init__(self, *args, **kwargs):
         super(Constraint5Model, self).__init__(*args, **kwargs)
         
     def generate_decision_vars(self):
         super(Constraint5Model, self).generate_decision_vars()
 
-        self.g_vars = {(i,t): self.model.binary_var(
-            name="g_{}^{}".format(i,t))
-        for i in self.set_C_I
-        for t in self.set_T}
+        self.g_array = var_array(self.model.binary_var_list(
+            [(i,t) for i in self.set_C_I for t in self.set_T],
+            name=lambda k: "g_{}^{}".format(*k)),
+        len(self.set_C_I), self.time_range)
+
+        self.g_vars = TupleView(self.g_array, {i: n for n, i in enumerate(self.set_C_I)}, self.time_range)
 
         self._g_count = len(self.g_vars)
         self._vars_count = self._g_count + self._x_count + self._y_count
@@ -97,25 +101,57 @@ class Constraint5Model(BaseModel):
 
         return self._constraints_count
 
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
+    def variable_blocks(self):
+        return super(Constraint5Model, self).variable_blocks() + [
+            ('g', self.set_C_I, self.g_array),
+        ]
+
+    def generate_templates(self):
+        super(Constraint5Model, self).generate_templates()
+
+        green_flowrate = ConstraintTemplate('green_flowrate', 'le', self.set_T)
+        slowstart_flowrate = ConstraintTemplate('slowstart_flowrate', 'le', self.set_T[1:])
+        for i in self.set_C_I:
+            for j in self.S[i]:
+                green_flowrate.add_row(
+                    [('y', (i,j), 0, 1), ('g', i, 0, -self.F[i])],
+                    0, "green_flowrate_{},{}".format(i,j))
+                slowstart_flowrate.add_row(
+                    [('y', (i,j), 0, 1),
+                     ('g', i, 0, self.F[i]*self.flow_rate_reduction),
+                     ('g', i, -1, -self.F[i]*self.flow_rate_reduction)],
+                    self.F[i], "slowstart_flowrate_{},{}".format(i,j))
+
+        self._templates['greenflowrate'] = {
+            'green_flowrate': green_flowrate,
+            'slowstart_flowrate': slowstart_flowrate
+        }
+
+        green_max = ConstraintTemplate('green_max', 'le', range(self.time_range - self.g_max - 1))
+        green_min = ConstraintTemplate('green_min', 'ge', range(self.time_range - self.g_min))
+        for i in self.set_C_I:
+            green_max.add_row(
+                [('g', i, dt, 1) for dt in range(self.g_max+2)],
+                self.g_max, 'green_max_{}'.format(i))
+            green_min.add_row(
+                [('g', i, dt, 1) for dt in range(1, self.g_min+1)]
+                + [('g', i, 1, -self.g_min), ('g', i, 0, self.g_min)],
+                0, 'green_min_{}'.format(i))
+
+        self._templates['greentime'] = {
+            'green_max': green_max,
+            'green_min': green_min
+        }
 
-    def return_solution(self):
-        df_x, df_y = super(Constraint5Model, self).return_solution()
+        return self._templates
 
-        df_g_raw = pd.DataFrame.from_dict(self.g_vars, orient="index", 
-                                          columns = ["variable_object"])
+    def return_solution(self, values=None):
+        if values is None:
+            values = self.solution_arrays()
 
-        df_g_raw.reset_index(inplace=True)
-        df_g_raw["is_green"] = df_g_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_g_raw['cell'] = df_g_raw['index'].apply(lambda x: x[0])
-        df_g_raw['timestep'] = df_g_raw['index'].apply(lambda x: x[1])
+        df_x, df_y = super(Constraint5Model, self).return_solution(values)
 
-        df_g = df_g_raw[['timestep', 'cell', 'is_green']]
+        df_g = self.green_frame(values['g'], self.set_C_I)
 
         return df_x, df_y, df_g
 
@@ -186,9 +222,33 @@ class Constraint6Model(Constraint5Model):
 
         return self._constraints_count
 
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
\ No newline at end of file
+    def generate_templates(self):
+        super(Constraint6Model, self).generate_templates()
+
+        movements_min = ConstraintTemplate('movements_min', 'ge', self.set_T)
+        movements_min.add_row([('g', i, 0, 1) for i in self.set_C_I], 2, 'movements_min')
+
+        movements_max = ConstraintTemplate('movements_max', 'le', self.set_T)
+        movements_max.add_row([('g', i, 0, 1) for i in self.set_C_I], 4, 'movements_max')
+
+        movements_guarantee = ConstraintTemplate('movements_guarantee', 'ge', [0], timed_names=False)
+        for i in self.set_C_I:
+            movements_guarantee.add_row(
+                [('g', i, t, 1) for t in self.set_T],
+                self.g_min, 'movements_guarantee^{}'.format(i))
+
+        movements_conflicting = ConstraintTemplate('movements_conflicting', 'le', self.set_T)
+        for i in self.set_C_I:
+            for j in self.J[i]:
+                movements_conflicting.add_row(
+                    [('g', i, 0, 1), ('g', j, 0, 1)],
+                    1, 'movements_conflicting_{},{}'.format(i,j))
+
+        self._templates['conflicts'] = {
+            'movements_min': movements_min,
+            'movements_max': movements_max,
+            'movements_guarantee': movements_guarantee,
+            'movements_conflicting': movements_conflicting
+        }
+
+        return self._templates
@@ -1,9 +1,12 @@
-import docplex.mp.model as cpx
-import pandas as pd
+import numpy as np
 import time
 from ctmmodels.const import *
+from ctmmodels.registry import TupleView, var_array
+from ctmmodels.results import ResultsMixin
+from ctmmodels.sparse import SparseBuildMixin, ConstraintTemplate, process_rss
+from ctmmodels.symmetry import SymmetryMixin
 
-class ParentModel(object):
+class ParentModel(SparseBuildMixin, ResultsMixin, SymmetryMixin):
     # sat_flow_rate       = 0.5 # vehicles / second
     # flow_rate_reduction = 0.5 # Not specified in the paper
     # g_min               = 6 # seconds (change to 30 seconds)
@@ -16,6 +19,8 @@ class ParentModel(object):
     # model_name          = 'Thesis MILP Model'
 
     cell_length         = FREE_FLOW_SPEED # requirement to meaasure delay accurately in CTM
+    topology            = TOPOLOGY # cells, adjacency and conflicts, shared by all instances
+    variable_names      = dict(SparseBuildMixin.variable_names, g="g_{}^{}", f="f_{}^{}", r="r{}^{}")
 
     '''
     NOTE: The original paper used a saturation flow rate of 1 vehicle per time step per cell. This gives us a saturated inflow of 1 veh / 4 lanes / 2 sec = 0.125 veh per second, or 450 veh per hr per lane, which the paper labels as undersaturated. The paper gave no threshold for saturated flow, hence the usage of 1 as the saturated flow rate per timestep.
@@ -33,10 +38,18 @@ class ParentModel(object):
                 r_through           = 0.5,
                 r_right             = 0.25,
                 preload             = None,
+                bulk_build          = False,
+                anonymous           = False,
+                lean                = False,
                 model_name          = 'Parent Model'):
 
         self.model_name = model_name
-        self.model = cpx.Model(name=self.model_name)
+
+        # Anonymous models carry no names; they are resolved from indices only when needed (see export_lp)
+        # Lean models also keep no constraint objects, only the row ranges of each family (implies anonymous)
+        self.lean = lean
+        self.anonymous = anonymous or lean
+        self.reset_model()
 
         # Convert all units from seconds to timesteps
         self.time_step = time_step
@@ -60,39 +73,35 @@ class ParentModel(object):
         self.flow_rate_reduction = flow_rate_reduction
         self.preload = preload
 
+        # Build constraints from sparse per-timestep templates instead of row by row (implied by anonymous)
+        self.bulk_build = bulk_build
+
     def generate_sets(self):
         self.set_T = range(self.time_range)
         self.set_T_bounded = range(self.time_range-1)
 
+        # Cells and adjacency come from the shared intersection topology; the lists are copies
+        topo = self.topology
+
         # Source cells: (0,approach_id)
-        self.set_C_O = [(CELL_SOURCE,0,i)
-            for i in range(APPROACHES)]
+        self.set_C_O = list(topo.sources)
 
         # Sink cells: (0,approach_id)
-        self.set_C_S = [(CELL_SINK,0,i)
-            for i in range(APPROACHES)]
+        self.set_C_S = list(topo.sinks)
 
         # Movement cells: (movement_id, apporach_id)
-        self.set_C_I = [(CELL_MOVEMENT,i,j)
-            for i in range(MOVEMENT_CELLS)
-            for j in range(APPROACHES)]
+        self.set_C_I = list(topo.movements)
 
         # Specific Movement cells
-        self.set_C_R = [c for c in self.set_C_I if c[1] == RIGHT_TURN]
-        self.set_C_T = [c for c in self.set_C_I if c[1] == THROUGH_TURN]
-        self.set_C_L = [c for c in self.set_C_I if c[1] == LEFT_TURN]
+        self.set_C_R = list(topo.rights)
+        self.set_C_T = list(topo.throughs)
+        self.set_C_L = list(topo.lefts)
 
         # Normal cells: (cell_id, approach_id)
-        self.set_C_N = [(CELL_NORMAL,i,j)
-            for i in range(APPROACH_CELLS)
-            for j in range(APPROACHES)]
+        self.set_C_N = list(topo.normals)
 
         # Set of all cells: (cell_type, x, y)
-        self.set_C = self.set_C_O + self.set_C_S + self.set_C_I + self.set_C_N
-
-        # Set of all cells except sink cells
-        self.set_C_minS = [i for i in self.set_C if i not in self.set_C_S]
-
+        self.set_C = list(topo.cells)
         self.set_C_labels = [
             'source',
             'sink',
@@ -100,116 +109,111 @@ class ParentModel(object):
             'normal'
         ]
 
-        # Pairs of CONFLICTING left and through turns
-        self.set_CF_LT = [
-            ((2, LEFT_TURN, i), (2, THROUGH_TURN, j))
-            for i in range(APPROACHES)
-            for j in range(APPROACHES) if j != i
-        ] + [
-            ((2, LEFT_TURN, i), (2, LEFT_TURN, j))
-            for i in range(APPROACHES)
-            for j in range(i) if (i - j != 2)
-        ] + [
-            ((2, THROUGH_TURN, i), (2, THROUGH_TURN, j))
-            for i in range(APPROACHES)
-            for j in range(i) if (i - j != 2)
-        ]
+        # Set of all cells except sink cells, except source cells, and except both
+        self.set_C_minS = list(topo.non_sinks)
+        self.set_C_minO = list(topo.non_sources)
+        self.set_C_inner = list(topo.inner)
 
-        self.set_CC_LR = [
-            ((2, LEFT_TURN, i), (2, RIGHT_TURN, (i+1)%APPROACHES))
-            for i in range(APPROACHES)
-        ]
+        self.P = topo.P
 
-        self.set_CC_RT = [
-            ((2, RIGHT_TURN, i), (2, THROUGH_TURN, i))
-            for i in range(APPROACHES)
-        ]
+        self.S = topo.S
 
-        self.P = {i: P_mapping(i)
-            for i in self.set_C}
+        # Pairs of CONFLICTING left and through turns
+        self.set_CF_LT = list(topo.lt_conflicts)
 
-        self.S = {i: S_mapping(i)
-            for i in self.set_C}
+        self.set_CC_LR = list(topo.left_right_pairs)
 
-        # self.J = {i: J_mapping(i)
-        #     for i in self.set_C_I}
+        self.set_CC_RT = list(topo.right_through_pairs)
 
-        # Rings
+        # Integer ids for all cells and edges (links between cells)
+        self.registry = topo.registry
 
-        self.set_H1 = [
-            (2, LEFT_TURN, WESTBOUND), (2, RIGHT_TURN, NORTHBOUND),
-            (2, THROUGH_TURN, EASTBOUND), (2, RIGHT_TURN, EASTBOUND),
-            (2, LEFT_TURN, EASTBOUND), (2, RIGHT_TURN, SOUTHBOUND),
-            (2, THROUGH_TURN, WESTBOUND), (2, RIGHT_TURN, WESTBOUND),
-        ]
+        # Set of all edges: (cell_from, cell_to)
+        self.set_E = list(topo.edges)
 
-        self.set_H2 = [
-            (2, LEFT_TURN, SOUTHBOUND), (2, RIGHT_TURN, WESTBOUND),
-            (2, THROUGH_TURN, SOUTHBOUND), (2, RIGHT_TURN, SOUTHBOUND),
-            (2, LEFT_TURN, NORTHBOUND), (2, RIGHT_TURN, EASTBOUND),
-            (2, THROUGH_TURN, NORTHBOUND), (2, RIGHT_TURN, NORTHBOUND),
-        ]
+        # Rings (only used for membership tests)
+        self.set_H1 = topo.ring_H1_set
+        self.set_H2 = topo.ring_H2_set
 
     def generate_parameters(self):
         def M_mapping(i):
-            if i in self.set_C_I:
+            if i in self.topology.movement_set:
                 return (self.cell_length / MEAN_CAR_LENGTH) * TURN_LANES[i[1]]
-            elif i in self.set_C_O:
+            elif i in self.topology.source_set:
                 return float("inf")
             return (self.cell_length / MEAN_CAR_LENGTH) * APPROACH_LANES
 
         def F_mapping(i):
-            if i in self.set_C_I:
+            if i in self.topology.movement_set:
                 return self.sat_flow_rate * TURN_LANES[i[1]]
             return self.sat_flow_rate * APPROACH_LANES
 
-        self.d = {(i,t): self.demand[i[2]] * APPROACH_LANES
-            for i in self.set_C_O
-            for t in self.set_T}
+        # Parameters are stored per cell id; M, F, d and r are tuple-keyed views of them
+        self.capacity = np.array([M_mapping(i) for i in self.set_C])
+        self.max_flow = np.array([F_mapping(i) for i in self.set_C])
+        self.turn_ratio = np.array([self.turn_ratios[i[1]] if i in self.topology.movement_set else 0.0
+            for i in self.set_C])
+
+        self.inflow = np.zeros((self.registry.n_cells, self.time_range))
+        for i in self.set_C_O:
+            self.inflow[self.registry.cell_ids[i], :] = self.demand[i[2]] * APPROACH_LANES
 
-        self.M = {i: M_mapping(i)
-            for i in self.set_C}
+        self.d = self.registry.view(self.inflow, self.set_C_O, self.time_range)
 
-        self.F = {i: F_mapping(i)
-            for i in self.set_C}
+        self.M = self.registry.view(self.capacity)
 
-        self.r = {i: self.turn_ratios[i[1]]
-            for i in self.set_C_I}
+        self.F = self.registry.view(self.max_flow)
+
+        self.r = self.registry.view(self.turn_ratio, self.set_C_I)
 
     def reset_model(self):
-        self.model = cpx.Model(name=self.model_name)
+        # docplex is only loaded once a model is created, so that importing the models stays cheap
+        import docplex.mp.model as cpx
+
+        self.model = cpx.Model(name=self.model_name, ignore_names=self.anonymous)
 
     def generate_decision_vars(self):
-        self.x_vars = {(i,t): self.model.continuous_var(
+        T = self.time_range
+        reg = self.registry
+
+        # Variables are created in one batch per family and kept as (cell, t) and (edge, t) arrays
+        self.x_array = var_array(self.model.continuous_var_list(
+            [(i,t) for i in self.set_C for t in self.set_T],
             lb=0,
-            ub=self.M[i],
-            name="x_{}^{}".format(i,t))
-        for i in self.set_C
-        for t in self.set_T}
+            ub=np.repeat(self.capacity, T).tolist(),
+            name=lambda k: "x_{}^{}".format(*k)),
+        reg.n_cells, T)
 
-        self.y_vars = {(i,j,t): self.model.continuous_var(
+        self.y_array = var_array(self.model.continuous_var_list(
+            [(i,j,t) for (i,j) in self.set_E for t in self.set_T],
             lb=0,
-            ub=min(self.F[i],self.F[j]),
-            name="y_{}_{}^{}".format(i,j,t))
-        for i in self.set_C
-        for j in self.S[i]
-        for t in self.set_T}
-
-        self.g_vars = {(i,t): self.model.binary_var(
-            name="g_{}^{}".format(i,t))
-        for i in self.set_C_I
-        for t in self.set_T}
-
-        self.f_vars = {(i,t): self.model.continuous_var(
+            ub=np.repeat(np.minimum(self.max_flow[reg.edge_from], self.max_flow[reg.edge_to]), T).tolist(),
+            name=lambda k: "y_{}_{}^{}".format(*k)),
+        reg.n_edges, T)
+
+        self.x_vars = reg.view(self.x_array, time_range=T)
+        self.y_vars = reg.edge_view(self.y_array, T)
+
+        self.g_array = var_array(self.model.binary_var_list(
+            [(i,t) for i in self.set_C_I for t in self.set_T],
+            name=lambda k: "g_{}^{}".format(*k)),
+        len(self.set_C_I), T)
+
+        self.f_array = var_array(self.model.continuous_var_list(
+            [(i,t) for i in self.set_C_I for t in self.set_T],
             lb=0,
-            name="f_{}^{}".format(i,t))
-        for i in self.set_C_I
-        for t in self.set_T}
+            name=lambda k: "f_{}^{}".format(*k)),
+        len(self.set_C_I), T)
 
-        self.r_vars = {(r,t): self.model.binary_var(
-            name="r{}^{}".format(r,t))
-        for r in [1,2]
-        for t in self.set_T}
+        self.r_array = var_array(self.model.binary_var_list(
+            [(r,t) for r in [1,2] for t in self.set_T],
+            name=lambda k: "r{}^{}".format(*k)),
+        2, T)
+
+        movement_ids = {i: n for n, i in enumerate(self.set_C_I)}
+        self.g_vars = TupleView(self.g_array, movement_ids, T)
+        self.f_vars = TupleView(self.f_array, movement_ids, T)
+        self.r_vars = TupleView(self.r_array, {1: 0, 2: 1}, T)
 
         self._g_count = len(self.g_vars)
         self._x_count = len(self.x_vars)
@@ -239,7 +243,7 @@ class ParentModel(object):
                 ),
                 ctname="init_rest_{}".format(i)
             ))
-            for i in self.set_C if i not in self.set_C_O
+            for i in self.set_C_minO
         ]
 
         constraint_init = {
@@ -308,7 +312,7 @@ class ParentModel(object):
                 ctname="flowrate_srccap_{}^{}".format(i,t)
             ))
             for t in self.set_T
-            for i in self.set_C if i not in self.set_C_S
+            for i in self.set_C_minS
         ]
 
         flowrate_2 = [
@@ -322,7 +326,7 @@ class ParentModel(object):
                 ctname="flowrate_destcap_{}^{}".format(j,t)
             ))
             for t in self.set_T
-            for j in self.set_C if j not in self.set_C_O
+            for j in self.set_C_minO
         ]
 
         flowrate_3 = [
@@ -335,7 +339,7 @@ class ParentModel(object):
                 ctname="flowrate_succcap_{}^{}".format(i,t)
             ))
             for t in self.set_T
-            for i in self.set_C if i not in self.set_C_S
+            for i in self.set_C_minS
         ]
 
         flowrate_4 = [
@@ -348,7 +352,7 @@ class ParentModel(object):
                 ctname="flowrate_predcap_{}^{}".format(j,t)
             ))
             for t in self.set_T
-            for j in self.set_C if j not in self.set_C_O
+            for j in self.set_C_minO
         ]
 
         constraint_flowrate = {
@@ -565,6 +569,108 @@ class ParentModel(object):
         
         return self._constraints_count
 
+    def rotate_key(self, block, key, r):
+        # A quarter turn swaps the two halves of the ring barrier
+        if block == 'r':
+            return 3 - key if r % 2 else key
+        return super(ParentModel, self).rotate_key(block, key, r)
+
+    def variable_blocks(self):
+        return super(ParentModel, self).variable_blocks() + [
+            ('g', self.set_C_I, self.g_array),
+            ('f', self.set_C_I, self.f_array),
+            ('r', [1,2], self.r_array),
+        ]
+
+    def generate_templates(self):
+        # 0 to 3. Initial values, flow conservation, flow rates and turn ratios
+        super(ParentModel, self).generate_templates()
+
+        # 4. Flow rates for intersection cells
+        movement_flow_1 = ConstraintTemplate('movement_flow_1', 'eq', self.set_T)
+        for i in self.set_C_T + self.set_C_L:
+            movement_flow_1.add_row(
+                [('f', i, 0, 1), ('g', i, 0, -self.F[i])],
+                0, "movement_flow_1_{}".format(i))
+
+        movement_flow_2 = ConstraintTemplate('movement_flow_2', 'eq', self.set_T)
+        for (j,i) in self.set_CC_LR:
+            movement_flow_2.add_row(
+                [('f', i, 0, 1), ('g', i, 0, -self.F[i]), ('g', j, 0, -self.F[i])],
+                0, "movement_flow_2_{},{}".format(i,j))
+
+        green_flowrate = ConstraintTemplate('green_flowrate', 'le', self.set_T)
+        slowstart_flowrate = ConstraintTemplate('slowstart_flowrate', 'le', self.set_T[1:])
+        for i in self.set_C_I:
+            green_flowrate.add_row(
+                [('y', (i,j), 0, 1) for j in self.S[i]] + [('f', i, 0, -1)],
+                0, "green_flowrate_{}".format(i))
+            slowstart_flowrate.add_row(
+                [('y', (i,j), 0, 1) for j in self.S[i]]
+                + [('g', i, 0, self.F[i]*self.flow_rate_reduction),
+                   ('g', i, -1, -self.F[i]*self.flow_rate_reduction)],
+                self.F[i], "slowstart_flowrate_{}".format(i))
+
+        self._templates['greenflowrate'] = {
+            'movement_flow_1': movement_flow_1,
+            'movement_flow_2': movement_flow_2,
+            'green_flowrate': green_flowrate,
+            'slowstart_flowrate': slowstart_flowrate
+        }
+
+        # 5. Ring Barrier
+        ring_constraint = ConstraintTemplate('ring_constraint', 'eq', self.set_T)
+        ring_constraint.add_row([('r', 1, 0, 1), ('r', 2, 0, 1)], 1, "ring_constraint")
+
+        first_ring = ConstraintTemplate('first_ring', 'eq', self.set_T)
+        first_ring.add_row(
+            [('g', i, 0, 1) for i in self.set_C_T if i in self.set_H1]
+            + [('g', j, 0, 1) for j in self.set_C_L if j in self.set_H1]
+            + [('r', 1, 0, -2)],
+            0, "ring1")
+
+        second_ring = ConstraintTemplate('second_ring', 'eq', self.set_T)
+        second_ring.add_row(
+            [('g', i, 0, 1) for i in self.set_C_T if i in self.set_H2]
+            + [('g', j, 0, 1) for j in self.set_C_L if j in self.set_H2]
+            + [('r', 2, 0, -2)],
+            0, "ring2")
+
+        conflicting_movements = ConstraintTemplate('conflicting_movements', 'le', self.set_T, time_major=False)
+        for (i,j) in self.set_CF_LT:
+            conflicting_movements.add_row([('g', i, 0, 1), ('g', j, 0, 1)], 1, "conflict_{},{}".format(i,j))
+
+        right_thru_movements = ConstraintTemplate('right_thru_movements', 'eq', self.set_T, time_major=False)
+        for (i,j) in self.set_CC_RT:
+            right_thru_movements.add_row([('g', i, 0, 1), ('g', j, 0, -1)], 0, "right_thru_{},{}".format(i,j))
+
+        self._templates['ringbarrier'] = {
+            'ring_constraint': ring_constraint,
+            'first_ring': first_ring,
+            'second_ring': second_ring,
+            'conflicting_movements': conflicting_movements,
+            'right_thru_movements': right_thru_movements
+        }
+
+        # 6. Green Time limits
+        green_max = ConstraintTemplate('green_max', 'le', range(self.time_range - self.g_max - 1))
+        green_min = ConstraintTemplate('green_min', 'ge', range(self.time_range - self.g_min))
+        for i in self.set_C_I:
+            green_max.add_row(
+                [('g', i, dt, 1) for dt in range(self.g_max+2)],
+                self.g_max, 'green_max_{}'.format(i))
+            green_min.add_row(
+                [('g', i, dt, 1) for dt in range(1, self.g_min+1)]
+                + [('g', i, 1, -self.g_min), ('g', i, 0, self.g_min)],
+                0, 'green_min_{}'.format(i))
+
+        self._templates['greentime'] = {
+            'green_max': green_max,
+            'green_min': green_min
+        }
+
+        return self._templates
+
     def generate_objective_fxn(self):
         self._objective = self.model.sum(
             self.model.sum(
@@ -575,102 +681,83 @@ class ParentModel(object):
         self.model.maximize(self._objective)
     
     def generate(self):
+        rss = process_rss()
+
         self.generate_sets()
         self.generate_parameters()
         self.generate_decision_vars()
-        self.generate_constraints()
+        if self.bulk_build or self.anonymous:
+            self.generate_constraints_bulk()
+        else:
+            self.generate_constraints()
         self.generate_objective_fxn()
 
-    def solve(self, log_output=False):
+        # Memory taken by the build, see memory_report
+        self._build_rss = None if rss is None else process_rss() - rss
+
+    def solve(self, log_output=False, mip_start=None):
+        '''
+        Solves the model and returns the solve time. mip_start, e.g. the solution of a previous solve
+        or a list of such solutions, is passed to CPLEX as a warm start; a start may also be a
+        (solution, effort level) pair, e.g. a partial solution for CPLEX to repair. For MIPs, the time
+        to the first incumbent is kept in _time_to_incumbent.
+        '''
+        from ctmmodels.listeners import IncumbentTimer
+
+        is_mip = self.model.number_of_binary_variables > 0
+        timer = IncumbentTimer()
+
+        if is_mip:
+            self.model.clear_mip_starts()
+            for start in (mip_start if isinstance(mip_start, list) else [mip_start]):
+                if isinstance(start, tuple):
+                    self.model.add_mip_start(*start)
+                elif start is not None:
+                    self.model.add_mip_start(start)
+            self.model.add_progress_listener(timer)
+
         start = time.time()
         print("Solving...")
         self.model.solve(log_output=log_output)
         print("Done!")
         end = time.time()
         self._time = end - start
-        print("Time elapsed: {}".format(self._time))
-        return self._time
 
-    def return_solution(self):
-        df_x_raw = pd.DataFrame.from_dict(self.x_vars, orient="index", 
-                                          columns = ["variable_object"])
+        if is_mip:
+            self.model.remove_progress_listener(timer)
+            # A MIP start that is already optimal may be accepted before any progress is reported
+            self._time_to_incumbent = timer.time_to_incumbent
+            if self._time_to_incumbent is None and self.model.solution is not None:
+                self._time_to_incumbent = self._time
+        else:
+            self._time_to_incumbent = None
 
-        df_x_raw.reset_index(inplace=True)
-        df_x_raw["volume"] = df_x_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_x_raw['cell'] = df_x_raw['index'].apply(lambda x: x[0])
-        df_x_raw['timestep'] = df_x_raw['index'].apply(lambda x: x[1])
-
-        df_x = df_x_raw[['timestep', 'cell', 'volume']]
-
-        df_y_raw = pd.DataFrame.from_dict(self.y_vars, orient="index", 
-                                          columns = ["variable_object"])
-
-        df_y_raw.reset_index(inplace=True)
-        df_y_raw["flow"] = df_y_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_y_raw['cell_from'] = df_y_raw['index'].apply(lambda x: x[0])
-        df_y_raw['cell_to'] = df_y_raw['index'].apply(lambda x: x[1])
-        df_y_raw['timestep'] = df_y_raw['index'].apply(lambda x: x[2])
-
-        df_y = df_y_raw[['timestep', 'cell_from', 'cell_to', 'flow']]
+        print("Time elapsed: {}".format(self._time))
+        return self._time
 
-        df_g_raw = pd.DataFrame.from_dict(self.g_vars, orient="index", 
-                                          columns = ["variable_object"])
+    def return_solution(self, values=None):
+        if values is None:
+            values = self.solution_arrays()
 
-        df_g_raw.reset_index(inplace=True)
-        df_g_raw["is_green"] = df_g_raw["variable_object"].apply(lambda item: item.solution_value)
-        df_g_raw['cell'] = df_g_raw['index'].apply(lambda x: x[0])
-        df_g_raw['timestep'] = df_g_raw['index'].apply(lambda x: x[1])
+        df_x = self.volume_frame(values['x'])
+        df_y = self.flow_frame(values['y'])
 
-        df_g_stacked = df_g_raw[['timestep', 'cell', 'is_green']]
+        df_g_stacked = self.green_frame(values['g'], self.set_C_I)
 
-        df_g = df_g_stacked.sort_values(by='timestep').pivot(index='timestep', columns='cell', values='is_green').astype('int16')
+        df_g = df_g_stacked.sort_values(by='timestep').pivot(index='timestep', columns='cell', values='is_green')
+        # Rounded, not truncated: binaries come back within the solver's integrality tolerance
+        df_g = np.rint(df_g).astype('int16')
 
         return df_x, df_y, df_g
 
     def return_parameters(self):
+        import pandas as pd
+
         df_M = pd.DataFrame.from_dict(self.M, orient="index", columns=["capacity"])
         df_F = pd.DataFrame.from_dict(self.F, orient="index", columns=["max_flow"])
 
         return pd.concat([df_M, df_F], axis=1)
 
     def return_objective_value(self):
-        D_term = sum(
-            sum(
-                self.x_vars[(i,t)].solution_value - sum(
-                    self.y_vars[(i,j,t)].solution_value
-                    for j in self.S[i])
-                for i in self.set_C if i not in self.set_C_S)
-            for t in self.set_T) * self.time_step
-
-        T_term = sum(
-            sum(
-                self.x_vars[(i,t)].solution_value
-                for i in self.set_C_S)
-            for t in self.set_T)
-
-        Obj_value = self.model.objective_value
-
-        return (D_term, T_term, Obj_value)
-
-    def return_volume(self):
-        '''Returns final volumes of approaches'''
-        V = [
-            sum(
-                self.x_vars[(i,self.time_range-1)].solution_value
-            for i in self.set_C_minS if i[2] == k)
-        for k in range(APPROACHES)]
-
-        return V
-
-    def return_delay_equity(self):
-        '''Returns delay per approach'''
-        D_equity = [sum(
-            sum(
-                self.x_vars[(i,t)].solution_value - sum(
-                    self.y_vars[(i,j,t)].solution_value
-                    for j in self.S[i])
-                for i in self.set_C_minS if i[2] == k)
-            for t in self.set_T) * self.time_step
-        for k in range(APPROACHES)]
-
-        return D_equity
+        kpis = self.kpis()
+        return (kpis.delay, kpis.throughput, kpis.objective_value)
@@ -0,0 +1,148 @@
+'''
+Integer-indexed storage for the cells and edges of the intersection.
+
+Cells are identified by (type, x, approach) tuples throughout the models, which makes every lookup hash
+a nested tuple. The registry gives each cell and each edge (i, j), j in S[i], a contiguous integer id,
+so that variables and parameters can be kept in (cell, t) and (edge, t) arrays instead.
+TupleView keeps the old tuple-keyed access working on top of those arrays.
+'''
+
+import numpy as np
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class CellRegistry(object):
+
+    def __init__(self, cells, successors):
+        self.cells = list(cells)
+        self.cell_ids = {c: n for n, c in enumerate(self.cells)}
+
+        self.edges = [(i, j) for i in self.cells for j in successors[i]]
+        self.edge_ids = {e: n for n, e in enumerate(self.edges)}
+
+        # The cell tuples themselves, for tuple-valued result columns
+        self.cell_array = np.empty(self.n_cells, dtype=object)
+        for n, c in enumerate(self.cells):
+            self.cell_array[n] = c
+
+        self.cell_type = np.array([c[0] for c in self.cells], dtype=np.int8)
+        self.cell_position = np.array([c[1] for c in self.cells], dtype=np.int8)
+        self.cell_approach = np.array([c[2] for c in self.cells], dtype=np.int8)
+
+        self.edge_from = np.array([self.cell_ids[i] for i, _ in self.edges], dtype=np.int32)
+        self.edge_to = np.array([self.cell_ids[j] for _, j in self.edges], dtype=np.int32)
+
+        # Adjacency in CSR form: the successors of cell c are succ_ids[succ_ptr[c]:succ_ptr[c+1]],
+        # and the edges leaving it are the same range of edge ids, since edges are ordered by source cell
+        self.succ_ptr = np.zeros(self.n_cells + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.edge_from, minlength=self.n_cells), out=self.succ_ptr[1:])
+        self.succ_ids = self.edge_to.copy()
+
+        # The predecessors of cell c are pred_ids[pred_ptr[c]:pred_ptr[c+1]], entering through pred_edges
+        self.pred_edges = np.argsort(self.edge_to, kind='mergesort').astype(np.int32)
+        self.pred_ptr = np.zeros(self.n_cells + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.edge_to, minlength=self.n_cells), out=self.pred_ptr[1:])
+        self.pred_ids = self.edge_from[self.pred_edges]
+
+    def freeze(self):
+        '''Marks all arrays read-only, for registries shared between models'''
+        for value in vars(self).values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+        return self
+
+    @property
+    def n_cells(self):
+        return len(self.cells)
+
+    @property
+    def n_edges(self):
+        return len(self.edges)
+
+    def ids(self, cells):
+        '''Cell ids of a list of cell tuples'''
+        return np.array([self.cell_ids[c] for c in cells], dtype=np.int32)
+
+    def view(self, array, cells=None, time_range=None):
+        '''Tuple-keyed view of a per-cell array, optionally restricted to a subset of cells'''
+        ids = self.cell_ids if cells is None else {c: self.cell_ids[c] for c in cells}
+        return TupleView(array, ids, time_range)
+
+    def edge_view(self, array, time_range):
+        '''Tuple-keyed view of an (edge, t) array, keyed by (i, j, t)'''
+        return TupleView(array, self.edge_ids, time_range, flat_keys=True)
+
+
+class FrozenMap(Mapping):
+    '''Read-only dict, for lookup tables shared between models'''
+
+    def __init__(self, *args, **kwargs):
+        self._data = dict(*args, **kwargs)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "FrozenMap({!r})".format(self._data)
+
+
+def value_array(solution, array):
+    '''Solution values of a (row, t) variable array, fetched in one call, as a float array of the same shape'''
+    return np.array(solution.get_values(array.ravel().tolist()), dtype=np.float64).reshape(array.shape)
+
+
+def var_array(dvars, rows, time_range):
+    '''Arranges a flat, row-major list of variables into a (row, t) object array'''
+    array = np.empty(len(dvars), dtype=object)
+    for n, v in enumerate(dvars):
+        array[n] = v
+    return array.reshape((rows, time_range))
+
+
+class TupleView(Mapping):
+    '''
+    Read-only mapping over a (row,) or (row, t) array, keyed the way the old dicts were:
+    M[i], d[(i,t)], x_vars[(i,t)], g_vars[(p,t)], or y_vars[(i,j,t)] when flat_keys is set.
+    '''
+
+    def __init__(self, array, ids, time_range=None, flat_keys=False):
+        self.array = array
+        self.ids = ids
+        self.time_range = time_range
+        self.flat_keys = flat_keys
+        self._keys = sorted(ids, key=ids.get)
+
+    def __getitem__(self, key):
+        if self.time_range is None:
+            return self.array.item(self.ids[key])
+
+        if self.flat_keys:
+            row, t = key[:-1], key[-1]
+        else:
+            row, t = key
+
+        if not 0 <= t < self.time_range:
+            raise KeyError(key)
+        return self.array.item(self.ids[row], t)
+
+    def __iter__(self):
+        if self.time_range is None:
+            return iter(self._keys)
+        if self.flat_keys:
+            return (k + (t,) for k in self._keys for t in range(self.time_range))
+        return ((k, t) for k in self._keys for t in range(self.time_range))
+
+    def __len__(self):
+        if self.time_range is None:
+            return len(self._keys)
+        return len(self._keys) * self.time_range
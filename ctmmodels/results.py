@@ -0,0 +1,144 @@
+'''
+Solution extraction shared by the model classes.
+
+The solution values of each variable block are fetched in one call into a (key, t) array, in the
+same order as the variables, and the result frames are built from those arrays column by column.
+Besides the tuple-valued columns the frames always had (cell, cell_from, cell_to), they carry the
+integer cell ids and approaches of the registry.
+
+The key performance indicators of a solution are computed the same way, in one pass over the
+solution arrays, and returned as a KPIRecord.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+from ctmmodels.const import APPROACHES, CELL_SINK
+from ctmmodels.registry import value_array
+
+
+KPIRecord = namedtuple('KPIRecord', [
+    'delay',                # total delay, in vehicle-seconds
+    'throughput',           # sum over t of the sink volumes
+    'flow',                 # sum over t of all cell to cell flows
+    'objective_value',      # objective value reported by the solver
+    'approach_delay',       # (APPROACHES,) delay per approach
+    'approach_volume',      # (APPROACHES,) volume per approach at the last timestep
+    'green_share',          # (movements,) fraction of timesteps each movement is green; None without greens
+    'queue_max',            # (movements,) maximum volume of each movement cell
+])
+
+
+class ResultsMixin(object):
+
+    def solution_arrays(self):
+        '''Solution values of every variable block, as {block: (key, t) float array}'''
+        solution = self.model.solution
+        return {
+            block: value_array(solution, array)
+            for block, _, array in self.variable_blocks()
+        }
+
+    def movement_greens(self, values):
+        '''(movement, t) green array of the movements in set_C_I order; None for models without greens'''
+        return values.get('g')
+
+    def kpis(self, values=None, objective_value=None):
+        '''
+        Key performance indicators of the solution, as a KPIRecord. Solution arrays and objective value
+        that did not come from this model's last solve (e.g. a cached solution) can be passed in.
+        '''
+        if values is None:
+            values = self.solution_arrays()
+        if objective_value is None:
+            objective_value = self.model.objective_value
+
+        reg = self.registry
+        x = values['x']
+        y = values['y']
+
+        # Volume of each cell that does not leave it: x_i^t - sum_j y_ij^t
+        outflow = np.zeros_like(x)
+        np.add.at(outflow, reg.edge_from, y)
+        remaining = (x - outflow).sum(axis=1) * self.time_step
+
+        non_sinks = reg.cell_type != CELL_SINK
+        approach_delay = np.bincount(reg.cell_approach[non_sinks], weights=remaining[non_sinks],
+                                     minlength=APPROACHES)
+        approach_volume = np.bincount(reg.cell_approach[non_sinks], weights=x[non_sinks, -1],
+                                      minlength=APPROACHES)
+
+        movements = reg.ids(self.set_C_I)
+        greens = self.movement_greens(values)
+
+        return KPIRecord(
+            delay=float(remaining[non_sinks].sum()),
+            throughput=float(x[~non_sinks].sum()),
+            flow=float(y.sum()),
+            objective_value=objective_value,
+            approach_delay=approach_delay,
+            approach_volume=approach_volume,
+            green_share=None if greens is None else np.round(greens).mean(axis=1),
+            queue_max=x[movements].max(axis=1),
+        )
+
+    def return_objective_value(self):
+        return self.kpis().delay
+
+    def return_volume(self):
+        '''Returns final volumes of approaches'''
+        return self.kpis().approach_volume.tolist()
+
+    def return_delay_equity(self):
+        '''Returns delay per approach'''
+        return self.kpis().approach_delay.tolist()
+
+    def _timesteps(self, rows):
+        return np.tile(np.arange(self.time_range, dtype=np.int16), rows)
+
+    def volume_frame(self, x):
+        import pandas as pd
+
+        reg = self.registry
+        T = self.time_range
+
+        return pd.DataFrame({
+            'timestep': self._timesteps(reg.n_cells),
+            'cell': np.repeat(reg.cell_array, T),
+            'volume': x.ravel(),
+            'cell_id': np.repeat(np.arange(reg.n_cells, dtype=np.int16), T),
+            'approach': np.repeat(reg.cell_approach, T),
+        }, columns=['timestep', 'cell', 'volume', 'cell_id', 'approach'])
+
+    def flow_frame(self, y):
+        import pandas as pd
+
+        reg = self.registry
+        T = self.time_range
+
+        return pd.DataFrame({
+            'timestep': self._timesteps(reg.n_edges),
+            'cell_from': np.repeat(reg.cell_array[reg.edge_from], T),
+            'cell_to': np.repeat(reg.cell_array[reg.edge_to], T),
+            'flow': y.ravel(),
+            'cell_from_id': np.repeat(reg.edge_from.astype(np.int16), T),
+            'cell_to_id': np.repeat(reg.edge_to.astype(np.int16), T),
+            'approach': np.repeat(reg.cell_approach[reg.edge_from], T),
+        }, columns=['timestep', 'cell_from', 'cell_to', 'flow', 'cell_from_id', 'cell_to_id', 'approach'])
+
+    def green_frame(self, g, cells):
+        '''Green frame of movement cells; g is the (movement, t) solution array'''
+        import pandas as pd
+
+        reg = self.registry
+        T = self.time_range
+        ids = reg.ids(cells)
+
+        return pd.DataFrame({
+            'timestep': self._timesteps(len(cells)),
+            'cell': np.repeat(reg.cell_array[ids], T),
+            'is_green': g.ravel(),
+            'cell_id': np.repeat(ids.astype(np.int16), T),
+            'approach': np.repeat(reg.cell_approach[ids], T),
+        }, columns=['timestep', 'cell', 'is_green', 'cell_id', 'approach'])
@@ -1,33 +1,38 @@
-import docplex.mp.model as cpx
-import pandas as pd
 import time
-from math import log10
 
 from ctmmodels.const import *
+from ctmmodels.simplex import SimplexObjectiveMixin
 from ctmmodels.altphasing import Constraint5AltPhasingModel
+from ctmmodels.sparse import ConstraintTemplate
+from ctmmodels.registry import TupleView, var_array
 
 
 class RingBarrier(Constraint5AltPhasingModel):
 
+    variable_names = dict(Constraint5AltPhasingModel.variable_names, b="b_{}^{}")
+
     def __init__(self, *args, **kwargs):
         super(RingBarrier, self).__init__(*args, **kwargs)
 
     def generate_sets(self):
         super(RingBarrier, self).generate_sets()
 
-        self.set_R1 = [(0, b, i) for b in range(2) for i in range(2)]
-        self.set_R2 = [(1, b, i) for b in range(2) for i in range(2)]
+        self.set_R1 = list(self.topology.ring_1)
+        self.set_R2 = list(self.topology.ring_2)
 
-        self.set_B1 = [(r, 0, i) for r in range(2) for i in range(2)]
-        self.set_B2 = [(r, 1, i) for r in range(2) for i in range(2)]
+        # Barrier sides are only used for membership tests
+        self.set_B1 = self.topology.barrier_1
+        self.set_B2 = self.topology.barrier_2
 
     def generate_decision_vars(self):
         super(RingBarrier, self).generate_decision_vars()
 
-        self.b_vars = {(b,t): self.model.binary_var(
-            name="b_{}^{}".format(b,t))
-        for b in range(2)
-        for t in self.set_T}
+        self.b_array = var_array(self.model.binary_var_list(
+            [(b,t) for b in range(2) for t in self.set_T],
+            name=lambda k: "b_{}^{}".format(*k)),
+        2, self.time_range)
+
+        self.b_vars = TupleView(self.b_array, {0: 0, 1: 1}, self.time_range)
 
     def generate_constraints(self):
         super(RingBarrier, self).generate_constraints()
@@ -107,15 +112,61 @@ class RingBarrier(Constraint5AltPhasingModel):
 
         return self._constraints_count
 
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
+    def rotate_key(self, block, key, r):
+        # Half turns, the only symmetry of the phases, keep each phase on its barrier side
+        if block == 'b':
+            return key
+        return super(RingBarrier, self).rotate_key(block, key, r)
+
+    def variable_blocks(self):
+        return super(RingBarrier, self).variable_blocks() + [
+            ('b', range(2), self.b_array),
+        ]
+
+    def generate_templates(self):
+        super(RingBarrier, self).generate_templates()
+
+        barrier_limit = ConstraintTemplate('barrier_limit', 'eq', self.set_T)
+        barrier_limit.add_row([('b', 0, 0, 1), ('b', 1, 0, 1)], 1, 'barrier_limit')
+
+        barrierside_1 = ConstraintTemplate('barrierside_1', 'eq', self.set_T)
+        barrierside_1.add_row(
+            [('g', i, 0, 1) for i in self.set_R1 if i in self.set_B1]
+            + [('g', i, 0, 1) for i in self.set_R2 if i in self.set_B1]
+            + [('b', 0, 0, -2)],
+            0, 'barrierside_1')
+
+        barrierside_2 = ConstraintTemplate('barrierside_2', 'eq', self.set_T)
+        barrierside_2.add_row(
+            [('g', i, 0, 1) for i in self.set_R1 if i in self.set_B2]
+            + [('g', i, 0, 1) for i in self.set_R2 if i in self.set_B2]
+            + [('b', 1, 0, -2)],
+            0, 'barrierside_2')
+
+        ring_1_limit = ConstraintTemplate('ring_1_limit', 'le', self.set_T, time_major=False)
+        for i in self.set_R1:
+            for j in self.set_R1:
+                if j != i:
+                    ring_1_limit.add_row([('g', i, 0, 1), ('g', j, 0, 1)], 1, 'ring1_limit_{},{}'.format(i,j))
+
+        ring_2_limit = ConstraintTemplate('ring_2_limit', 'le', self.set_T, time_major=False)
+        for i in self.set_R2:
+            for j in self.set_R2:
+                if j != i:
+                    ring_2_limit.add_row([('g', i, 0, 1), ('g', j, 0, 1)], 1, 'ring1_limit_{},{}'.format(i,j))
+
+        self._templates['conflicts'] = {
+            'barrier_limit': barrier_limit,
+            'barrierside_1': barrierside_1,
+            'barrierside_2': barrierside_2,
+            'ring_1_limit': ring_1_limit,
+            'ring_2_limit': ring_2_limit,
+        }
+
+        return self._templates
 
 
-class DTSimplexRingBarrier(RingBarrier):
+class DTSimplexRingBarrier(SimplexObjectiveMixin, RingBarrier):
     '''Simply copy-pasted from DelayThroughputSimplex because i don't know OOP'''
 
     def __init__(self, normalize=True, beta=0, gamma=0, *args, **kwargs):
@@ -124,72 +175,6 @@ class DTSimplexRingBarrier(RingBarrier):
         self.beta = beta
         self.gamma = gamma
 
-    def generate_objective_fxn(self):
-        # Capacities in all but the source and sink cells are full during maximum delay
-        D_max = sum([ self.M[i] for i in self.set_C if i not in self.set_C_S + self.set_C_O for t in self.set_T ])
-
-        # The volume in the source cell increases by the demand for each timestep
-        D_max = D_max + sum([ self.d[(i,t)] for i in self.set_C_O for t in self.set_T ])
-
-        # The volume in the sink cell indicates the throughput of the intersection
-        T_max =  sum([ self.M[i] for i in self.set_C_S for t in self.set_T ])
-
-        # The maximum flow in the cells
-        F_max = sum([ self.F[i] for i in self.set_C if i not in self.set_C_S for t in self.set_T ])
-
-        # To prevent loss of precision, we can scale up normalized results by the magnitude of the larger of the 2 values
-        scale = 10**int(log10(max(D_max, T_max, F_max)))
-        
-        D_term = self.model.sum(
-            self.model.sum(
-                self.x_vars[(i,t)] - self.model.sum(
-                    self.y_vars[(i,j,t)]
-                    for j in self.S[i])
-                for i in self.set_C if i not in self.set_C_S)
-            for t in self.set_T)
-
-        T_term = self.model.sum(
-            self.model.sum(
-                self.x_vars[(i,t)]
-                for i in self.set_C_S)
-            for t in self.set_T)
-
-        F_term = self.model.sum(
-            self.model.sum(
-                self.model.sum(
-                    self.y_vars[(i,j,t)]
-                for j in self.S[i])
-                for i in self.set_C if i not in self.set_C_S)
-            for t in self.set_T)
-
-        if (self.normalize):
-            D_coeff = (float) (self.alpha * scale) / D_max
-            T_coeff = (float) (self.beta * scale) / T_max
-            F_coeff = (float) (self.gamma * scale) / F_max
-        else:
-            D_coeff = (float) (self.alpha)
-            T_coeff = (float) (self.beta)
-            F_coeff = (float) (self.gamma)
-
-        self._objective = D_coeff*D_term - T_coeff*T_term - F_coeff*F_term
-        self.model.minimize(self._objective)
-
-    def generate(self):
-        self.generate_sets()
-        self.generate_parameters()
-        self.generate_decision_vars()
-        self.generate_constraints()
-        self.generate_objective_fxn()
-
     def return_objective_value(self):
-        D_term = super(DTSimplexRingBarrier, self).return_objective_value()
-
-        T_term = sum(
-            sum(
-                self.x_vars[(i,t)].solution_value
-                for i in self.set_C_S)
-            for t in self.set_T)
-
-        Obj_value = self.model.objective_value
-
-        return (D_term, T_term, Obj_value)
\ No newline at end of file
+        kpis = self.kpis()
+        return (kpis.delay, kpis.throughput, kpis.objective_value)
@@ -0,0 +1,95 @@
+'''
+Weighted delay/throughput/flow objective of the simplex models.
+
+Only the objective depends on the (alpha, beta, gamma) weights, so the D, T and F terms and their
+normalization constants are built once and kept; set_weights then swaps the objective coefficients
+on the already built model, and a weight sweep only pays for the build once.
+'''
+
+from math import log10
+
+
+class SimplexObjectiveMixin(object):
+
+    def generate_objective_normalization(self):
+        # Capacities in all but the source and sink cells are full during maximum delay
+        D_max = sum([ self.M[i] for i in self.set_C_inner for t in self.set_T ])
+
+        # The volume in the source cell increases by the demand for each timestep
+        D_max = D_max + sum([ self.d[(i,t)] for i in self.set_C_O for t in self.set_T ])
+
+        # The volume in the sink cell indicates the throughput of the intersection
+        T_max =  sum([ self.M[i] for i in self.set_C_S for t in self.set_T ])
+
+        # The maximum flow in the cells
+        F_max = sum([ self.F[i] for i in self.set_C_minS for t in self.set_T ])
+
+        # To prevent loss of precision, we can scale up normalized results by the magnitude of the larger of the 3 values
+        scale = 10**int(log10(max(D_max, T_max, F_max)))
+
+        self._objective_max = (D_max, T_max, F_max)
+        self._objective_scale = scale
+
+    def generate_objective_terms(self):
+        self.generate_objective_normalization()
+
+        D_term = self.model.sum(
+            self.model.sum(
+                self.x_vars[(i,t)] - self.model.sum(
+                    self.y_vars[(i,j,t)]
+                    for j in self.S[i])
+                for i in self.set_C_minS)
+            for t in self.set_T)
+
+        T_term = self.model.sum(
+            self.model.sum(
+                self.x_vars[(i,t)]
+                for i in self.set_C_S)
+            for t in self.set_T)
+
+        F_term = self.model.sum(
+            self.model.sum(
+                self.model.sum(
+                    self.y_vars[(i,j,t)]
+                for j in self.S[i])
+                for i in self.set_C_minS)
+            for t in self.set_T)
+
+        self._objective_terms = (D_term, T_term, F_term)
+
+    def objective_coefficients(self):
+        if (self.normalize):
+            D_max, T_max, F_max = self._objective_max
+            scale = self._objective_scale
+            D_coeff = (float) (self.alpha * scale) / D_max
+            T_coeff = (float) (self.beta * scale) / T_max
+            F_coeff = (float) (self.gamma * scale) / F_max
+        else:
+            D_coeff = (float) (self.alpha)
+            T_coeff = (float) (self.beta)
+            F_coeff = (float) (self.gamma)
+
+        return (D_coeff, T_coeff, F_coeff)
+
+    def update_objective(self):
+        D_term, T_term, F_term = self._objective_terms
+        D_coeff, T_coeff, F_coeff = self.objective_coefficients()
+
+        self._objective = D_coeff*D_term - T_coeff*T_term - F_coeff*F_term
+        self.model.minimize(self._objective)
+
+    def generate_objective_fxn(self):
+        self.generate_objective_terms()
+        self.update_objective()
+
+    def refresh_objective(self):
+        # The terms do not depend on the parameters, only the normalization constants do
+        self.generate_objective_normalization()
+        self.update_objective()
+
+    def set_weights(self, alpha, beta, gamma):
+        '''Changes the objective weights of a built model; the next solve uses the new objective'''
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.update_objective()
@@ -0,0 +1,658 @@
+'''
+Sparse per-timestep constraint templates.
+
+The CTM constraints have the same structure at every timestep, so a constraint family only needs to
+be written down once, for a single timestep. A template row is a list of (block, key, dt, coef)
+terms, standing for coef * block[(key, t+dt)]. Expanding the template repeats its rows over a set of
+timesteps as CSR arrays (indptr, indices, data, rhs), which are then loaded into the model in one batch.
+
+Variables are laid out the same way the models create them: each block (x, y, g, ...) is a run of
+columns ordered by key, then by timestep, so variable (key, t) of a block sits at column
+offset + position(key) * time_range + t.
+
+Lean models skip the docplex constraint objects altogether: the expanded rows are added to the CPLEX
+engine directly, and each family is only kept as its range of row indices.
+'''
+
+import bisect
+import os
+
+import numpy as np
+
+try:
+    row_range = xrange
+except NameError:
+    row_range = range
+
+SENSES = ('le', 'ge', 'eq')
+
+# CPLEX sense codes of the template senses
+CPLEX_SENSES = {'le': 'L', 'ge': 'G', 'eq': 'E'}
+
+
+class ConstraintTemplate(object):
+
+    def __init__(self, name, sense, timesteps, time_major=True, timed_names=True):
+        if sense not in SENSES:
+            raise ValueError("Unknown constraint sense: {}".format(sense))
+
+        self.name = name
+        self.sense = sense
+        self.timesteps = list(timesteps)
+        self.time_major = time_major        # rows ordered by (t, row) instead of (row, t)
+        self.timed_names = timed_names      # append ^t to the row labels
+
+        self.rows = []
+        self.rhs = []
+        self.labels = []
+
+    def add_row(self, terms, rhs=0, label=None):
+        # Repeated variables are merged into one term, as model.sum would
+        coefs = {}
+        order = []
+        for block, key, dt, coef in terms:
+            var = (block, key, dt)
+            if var not in coefs:
+                coefs[var] = 0
+                order.append(var)
+            coefs[var] = coefs[var] + coef
+
+        self.rows.append([(var, coefs[var]) for var in order if coefs[var] != 0])
+        self.rhs.append(rhs)
+        self.labels.append(label)
+
+    def __len__(self):
+        return len(self.rows) * len(self.timesteps)
+
+    def expand(self, layout, time_range):
+        '''
+        Returns the CSR arrays (indptr, indices, data, rhs) of the template over all its timesteps.
+        `layout` maps each block to (column offset, {key: position}).
+        '''
+        n_rows = len(self.rows)
+        n_steps = len(self.timesteps)
+
+        base, dts, coefs, term_rows = [], [], [], []
+        for r, row in enumerate(self.rows):
+            for (block, key, dt), coef in row:
+                offset, positions = layout[block]
+                base.append(offset + positions[key] * time_range)
+                dts.append(dt)
+                coefs.append(coef)
+                term_rows.append(r)
+
+        base = np.array(base, dtype=np.int64)
+        dts = np.array(dts, dtype=np.int64)
+        coefs = np.array(coefs, dtype=np.float64)
+        term_rows = np.array(term_rows, dtype=np.int64)
+        steps = np.array(self.timesteps, dtype=np.int64)
+        step_ids = np.arange(n_steps, dtype=np.int64)
+
+        # One copy of the template per timestep, shape (n_steps, nnz)
+        indices = base[None, :] + steps[:, None] + dts[None, :]
+        data = np.tile(coefs, (n_steps, 1))
+
+        if self.time_major:
+            row_ids = step_ids[:, None] * n_rows + term_rows[None, :]
+            rhs = np.tile(np.array(self.rhs, dtype=np.float64), n_steps)
+        else:
+            row_ids = term_rows[None, :] * n_steps + step_ids[:, None]
+            rhs = np.repeat(np.array(self.rhs, dtype=np.float64), n_steps)
+
+        row_ids = row_ids.ravel()
+        order = np.argsort(row_ids, kind='mergesort')
+
+        indptr = np.zeros(n_rows * n_steps + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=n_rows * n_steps), out=indptr[1:])
+
+        return indptr, indices.ravel()[order], data.ravel()[order], rhs
+
+    def row_name(self, n):
+        '''Name of the n-th expanded row, in the same order as names()'''
+        if self.time_major:
+            step, row = divmod(n, len(self.rows))
+        else:
+            row, step = divmod(n, len(self.timesteps))
+
+        if self.timed_names:
+            return "{}^{}".format(self.labels[row], self.timesteps[step])
+        return self.labels[row]
+
+    def names(self):
+        if self.time_major:
+            pairs = ((label, t) for t in self.timesteps for label in self.labels)
+        else:
+            pairs = ((label, t) for label in self.labels for t in self.timesteps)
+
+        if self.timed_names:
+            return ["{}^{}".format(label, t) for label, t in pairs]
+        return [label for label, _ in pairs]
+
+
+def variable_layout(blocks):
+    '''
+    Takes an ordered list of (block, keys, var_array), where var_array is the (key, t) array of the
+    block's variables, and returns the flat variable list together with the layout used by
+    ConstraintTemplate.expand.
+    '''
+    dvars = []
+    layout = {}
+    for block, keys, array in blocks:
+        layout[block] = (len(dvars), {key: n for n, key in enumerate(keys)})
+        dvars.extend(array.ravel().tolist())
+    return dvars, layout
+
+
+def load_template(model, template, dvars, layout, time_range):
+    '''Expands a template and adds all of its rows to the model in a single batch'''
+    if len(template) == 0:
+        return []
+
+    indptr, indices, data, rhs = template.expand(layout, time_range)
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    data = data.tolist()
+
+    cts = [
+        model.linear_constraint(
+            lhs=model.scal_prod([dvars[c] for c in indices[a:b]], data[a:b]),
+            rhs=value,
+            ctsense=template.sense)
+        for a, b, value in zip(indptr[:-1], indptr[1:], rhs.tolist())
+    ]
+
+    # Anonymous models skip the names entirely; they are resolved later through a NameIndex
+    names = None if model.ignore_names else template.names()
+    return model.add_constraints(cts, names)
+
+
+def load_template_rows(cpx, template, columns, layout, time_range):
+    '''
+    Lean counterpart of load_template: expands a template and adds its rows to the CPLEX engine cpx
+    directly, unnamed. columns maps the layout's variable positions to engine columns. Returns the
+    range of row indices the template was loaded into.
+    '''
+    import cplex
+
+    start = cpx.linear_constraints.get_num()
+    if len(template) == 0:
+        return row_range(start, start)
+
+    indptr, indices, data, rhs = template.expand(layout, time_range)
+    indptr = indptr.tolist()
+    indices = columns[indices].tolist()
+    data = data.tolist()
+
+    cpx.linear_constraints.add(
+        lin_expr=[cplex.SparsePair(indices[a:b], data[a:b]) for a, b in zip(indptr[:-1], indptr[1:])],
+        senses=CPLEX_SENSES[template.sense] * len(rhs),
+        rhs=rhs.tolist())
+    return row_range(start, start + len(rhs))
+
+
+def _changed_rows(old, new, layout, time_range):
+    '''
+    Expands templates `old` and `new` and compares them row by row. Returns the old and new CSR arrays,
+    with the masks of the rows whose left-hand side and right-hand side changed.
+    '''
+    old_csr = old.expand(layout, time_range)
+    new_csr = new.expand(layout, time_range)
+    old_ptr, old_ind, old_data, old_rhs = old_csr
+    new_ptr, new_ind, new_data, new_rhs = new_csr
+
+    changed_rhs = old_rhs != new_rhs
+    if np.array_equal(old_ptr, new_ptr) and np.array_equal(old_ind, new_ind):
+        term_rows = np.repeat(np.arange(len(new_rhs)), np.diff(new_ptr))
+        changed_lhs = np.zeros(len(new_rhs), dtype=bool)
+        changed_lhs[term_rows[old_data != new_data]] = True
+    else:
+        # Terms were dropped or added (e.g. a coefficient became zero), compare row by row
+        changed_lhs = np.array([
+            not (np.array_equal(old_ind[a:b], new_ind[c:d]) and np.array_equal(old_data[a:b], new_data[c:d]))
+            for a, b, c, d in zip(old_ptr[:-1], old_ptr[1:], new_ptr[:-1], new_ptr[1:])
+        ], dtype=bool)
+
+    return old_csr, new_csr, changed_lhs, changed_rhs
+
+
+def update_template(model, old, new, cts, dvars, layout, time_range, rhs_only=True):
+    '''
+    Pushes the rows of template `new` that differ from `old` to `cts`, the constraints built from
+    `old`, and returns the number of rows changed. Rows whose coefficients are unchanged only get a
+    new right-hand side when rhs_only is set, which requires cts to be in template form
+    (terms on the left, constant on the right); other changed rows are rewritten entirely.
+    '''
+    if len(old) != len(new) or len(new) != len(cts):
+        raise ValueError("Template {} changed shape, the model has to be rebuilt".format(new.name))
+    if len(new) == 0:
+        return 0
+
+    _, (new_ptr, new_ind, new_data, new_rhs), changed_lhs, changed_rhs = _changed_rows(
+        old, new, layout, time_range)
+
+    if rhs_only:
+        for n in np.flatnonzero(changed_rhs & ~changed_lhs).tolist():
+            cts[n].rhs = float(new_rhs[n])
+        rewrite = changed_lhs
+    else:
+        rewrite = changed_lhs | changed_rhs
+
+    new_ptr = new_ptr.tolist()
+    for n in np.flatnonzero(rewrite).tolist():
+        a, b = new_ptr[n], new_ptr[n+1]
+        ct = cts[n]
+        ct.lhs = model.scal_prod([dvars[c] for c in new_ind[a:b].tolist()], new_data[a:b].tolist())
+        ct.rhs = float(new_rhs[n])
+        ct.set_sense(new.sense)
+
+    return int(np.count_nonzero(changed_lhs | changed_rhs))
+
+
+def update_template_rows(cpx, old, new, rows, columns, layout, time_range):
+    '''
+    Lean counterpart of update_template: pushes the rows of template `new` that differ from `old` to
+    the engine rows `rows` through the CPLEX API, and returns the number of rows changed
+    '''
+    if len(old) != len(new) or len(new) != len(rows):
+        raise ValueError("Template {} changed shape, the model has to be rebuilt".format(new.name))
+    if len(new) == 0:
+        return 0
+
+    (old_ptr, old_ind, _, _), (new_ptr, new_ind, new_data, new_rhs), changed_lhs, changed_rhs = _changed_rows(
+        old, new, layout, time_range)
+
+    changed = np.flatnonzero(changed_rhs)
+    if len(changed):
+        cpx.linear_constraints.set_rhs(list(zip([rows[n] for n in changed.tolist()], new_rhs[changed].tolist())))
+
+    coefficients = []
+    for n in np.flatnonzero(changed_lhs).tolist():
+        # Terms that are gone are zeroed, then the new terms are set
+        terms = dict.fromkeys(columns[old_ind[old_ptr[n]:old_ptr[n+1]]].tolist(), 0.0)
+        terms.update(zip(columns[new_ind[new_ptr[n]:new_ptr[n+1]]].tolist(),
+                         new_data[new_ptr[n]:new_ptr[n+1]].tolist()))
+        coefficients.extend((rows[n], c, v) for c, v in terms.items())
+    if coefficients:
+        cpx.linear_constraints.set_coefficients(coefficients)
+
+    return int(np.count_nonzero(changed_lhs | changed_rhs))
+
+
+def process_rss():
+    '''Resident set size of this process in bytes, or None where it cannot be read (no /proc)'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class NameIndex(object):
+    '''
+    Resolves the names of variables and constraints from their indices, for models built with
+    ignore_names. Variables are located by block, constraints by the template they came from.
+    '''
+
+    def __init__(self, time_range):
+        self.time_range = time_range
+        self.var_starts = []
+        self.var_blocks = []
+        self.ct_starts = []
+        self.ct_templates = []
+
+    def add_block(self, start, keys, name_format):
+        self.var_starts.append(start)
+        self.var_blocks.append((list(keys), name_format))
+
+    def add_template(self, start, template):
+        self.ct_starts.append(start)
+        self.ct_templates.append(template)
+
+    @staticmethod
+    def _locate(starts, index):
+        n = bisect.bisect_right(starts, index) - 1
+        if n < 0:
+            raise KeyError(index)
+        return n, index - starts[n]
+
+    def variable_name(self, index):
+        n, offset = self._locate(self.var_starts, index)
+        keys, name_format = self.var_blocks[n]
+        row, t = divmod(offset, self.time_range)
+        if row >= len(keys):
+            raise KeyError(index)
+        return name_format.format(keys[row], t)
+
+    def constraint_name(self, index):
+        n, offset = self._locate(self.ct_starts, index)
+        template = self.ct_templates[n]
+        if offset >= len(template):
+            raise KeyError(index)
+        return template.row_name(offset)
+
+
+class SparseBuildMixin(object):
+    '''
+    Bulk build mode shared by the model classes. Subclasses extend variable_blocks with their own
+    variables and generate_templates with their own constraint families, mirroring generate_constraints.
+    The templates also drive the set_* methods, which change the parameters of an already built model
+    by pushing only the constraint rows that differ.
+    '''
+
+    # (key, t) arrays of the variable blocks, set by generate_decision_vars; a model that only has its
+    # sets and parameters still lists the keys of its blocks, e.g. to rotate a cached solution
+    x_array = y_array = g_array = f_array = r_array = b_array = None
+
+    # Name of variable (key, t) of each block, formatted as name_format.format(key, t)
+    variable_names = {
+        'x': "x_{}^{}",
+        'y': "y_{0[0]}_{0[1]}^{1}",
+    }
+
+    def variable_blocks(self):
+        '''Variable blocks in column order, as used by the constraint templates'''
+        return [
+            ('x', self.set_C, self.x_array),
+            ('y', self.set_E, self.y_array),
+        ]
+
+    def generate_templates(self):
+        '''
+        Template counterpart of the CTM constraints (0 to 3); every family is written once for a
+        single timestep. Demand is constant over the horizon, so d[(i,0)] stands in for d[(i,t)].
+        '''
+
+        init_src = ConstraintTemplate('init_src', 'eq', [0], timed_names=False)
+        for i in self.set_C_O:
+            init_src.add_row([('x', i, 0, 1)], self.d[(i,0)], "init_src_{}".format(i))
+
+        init_rest = ConstraintTemplate('init_rest', 'eq', [0], timed_names=False)
+        for i in self.set_C_minO:
+            init_rest.add_row([('x', i, 0, 1)],
+                (0 if self.preload is None else min(self.preload[i], self.M[i])),
+                "init_rest_{}".format(i))
+
+        flowcon_1 = ConstraintTemplate('flowcon_normal', 'eq', self.set_T_bounded)
+        for i in self.set_C_N + self.set_C_I:
+            flowcon_1.add_row(
+                [('y', (k,i), 0, 1) for k in self.P[i]]
+                + [('y', (i,j), 0, -1) for j in self.S[i]]
+                + [('x', i, 1, -1), ('x', i, 0, 1)],
+                0, "flowcon_normal_{}".format(i))
+
+        flowcon_2 = ConstraintTemplate('flowcon_source', 'eq', self.set_T_bounded)
+        for i in self.set_C_O:
+            flowcon_2.add_row(
+                [('y', (i,j), 0, -1) for j in self.S[i]]
+                + [('x', i, 1, -1), ('x', i, 0, 1)],
+                -self.d[(i,0)], "flowcon_source_{}".format(i))
+
+        flowcon_3 = ConstraintTemplate('flowcon_sink', 'eq', self.set_T_bounded)
+        for i in self.set_C_S:
+            flowcon_3.add_row(
+                [('y', (k,i), 0, 1) for k in self.P[i]]
+                + [('x', i, 1, -1)],
+                0, "flowcon_sink_{}".format(i))
+
+        flowrate_1 = ConstraintTemplate('flowrate_srccap', 'le', self.set_T)
+        flowrate_3 = ConstraintTemplate('flowrate_succcap', 'le', self.set_T)
+        for i in self.set_C_minS:
+            flowrate_1.add_row(
+                [('y', (i,j), 0, 1) for j in self.S[i]] + [('x', i, 0, -1)],
+                0, "flowrate_srccap_{}".format(i))
+            flowrate_3.add_row(
+                [('y', (i,j), 0, 1) for j in self.S[i]],
+                self.F[i], "flowrate_succcap_{}".format(i))
+
+        flowrate_2 = ConstraintTemplate('flowrate_destcap', 'le', self.set_T)
+        flowrate_4 = ConstraintTemplate('flowrate_predcap', 'le', self.set_T)
+        for j in self.set_C_minO:
+            flowrate_2.add_row(
+                [('y', (i,j), 0, 1) for i in self.P[j]] + [('x', j, 0, 1)],
+                self.M[j], "flowrate_destcap_{}".format(j))
+            flowrate_4.add_row(
+                [('y', (i,j), 0, 1) for i in self.P[j]],
+                self.F[j], "flowrate_predcap_{}".format(j))
+
+        turnratios = ConstraintTemplate('turnratios', 'le', self.set_T)
+        for j in self.set_C_I:
+            for i in self.P[j]:
+                turnratios.add_row(
+                    [('y', (i,j), 0, 1)]
+                    + [('y', (i,k), 0, -self.r[j]) for k in self.S[i]],
+                    0, "turnratios_{},{}".format(i,j))
+
+        self._templates = {
+            'init': {
+                'src': init_src,
+                'rest': init_rest
+            },
+            'flowcon': {
+                'source': flowcon_2,
+                'sink': flowcon_3,
+                'rest': flowcon_1
+            },
+            'flowrate': {
+                'source_cap': flowrate_1,
+                'sink_cap': flowrate_2,
+                'succ_cap': flowrate_3,
+                'pred_cap': flowrate_4,
+            },
+            'turnratios': {
+                'turn_ratios': turnratios
+            },
+        }
+
+        return self._templates
+
+    def generate_constraints_bulk(self):
+        '''Builds every constraint family from its template, loading each family in one batch'''
+        self.generate_templates()
+        dvars, layout = variable_layout(self.variable_blocks())
+
+        if self.lean:
+            return self.generate_constraints_lean(dvars, layout)
+
+        cts = []
+        for group, templates in sorted(self._templates.items()):
+            for name, template in sorted(templates.items()):
+                cts.extend(load_template(self.model, template, dvars, layout, self.time_range))
+
+        return self.wire_constraints(cts)
+
+    def wire_constraints(self, cts):
+        '''
+        Files the constraints of a bulk build under their families. cts are all the constraints, in
+        the order the templates of self._templates are loaded in (sorted by group, then by name).
+        '''
+        self._constraints = {}
+        self._constraints_count = 0
+        self._names = self.variable_name_index()
+
+        # Constraints built from templates can have their right-hand sides updated in place
+        self._template_form = True
+
+        for group, templates in sorted(self._templates.items()):
+            self._constraints[group] = {}
+            for name, template in sorted(templates.items()):
+                family = cts[self._constraints_count:self._constraints_count + len(template)]
+                if family:
+                    self._names.add_template(family[0].index, template)
+                self._constraints[group][name] = family
+                self._constraints_count = self._constraints_count + len(family)
+
+        if self._constraints_count != len(cts):
+            raise ValueError("The templates account for {} constraints, not {}".format(
+                self._constraints_count, len(cts)))
+
+        return self._constraints_count
+
+    def generate_constraints_lean(self, dvars, layout):
+        '''
+        Lean build: the rows of every template go to the CPLEX engine directly, and each family is kept
+        as its range of row indices instead of a list of constraint objects. The variables are kept as
+        an array of their engine columns, in layout order, for the updates.
+        '''
+        cpx = self.model.get_cplex()
+        self._columns = np.array([v.index for v in dvars], dtype=np.int32)
+
+        self._constraints = {}
+        self._constraints_count = 0
+        self._names = self.variable_name_index()
+
+        for group, templates in sorted(self._templates.items()):
+            self._constraints[group] = {}
+            for name, template in sorted(templates.items()):
+                rows = load_template_rows(cpx, template, self._columns, layout, self.time_range)
+                if len(rows):
+                    self._names.add_template(rows[0], template)
+                self._constraints[group][name] = rows
+                self._constraints_count = self._constraints_count + len(rows)
+
+        return self._constraints_count
+
+    def variable_name_index(self):
+        '''NameIndex with the variable blocks of the model, for the constraints to be added to'''
+        names = NameIndex(self.time_range)
+        for block, keys, array in self.variable_blocks():
+            names.add_block(array.item(0, 0).index, keys, self.variable_names[block])
+        return names
+
+    def memory_report(self):
+        '''
+        Size of the built model, for sizing worker pools: engine variables, rows and nonzeros, the
+        constraint objects held on the Python side (none for lean models), and rss, the growth of the
+        process's resident memory while the model was generated (None where it cannot be measured)
+        '''
+        cpx = self.model.get_cplex()
+        return {
+            'variables': cpx.variables.get_num(),
+            'rows': cpx.linear_constraints.get_num(),
+            'nonzeros': cpx.linear_constraints.get_num_nonzeros(),
+            'constraint_objects': self.model.number_of_linear_constraints,
+            'rss': getattr(self, '_build_rss', None),
+        }
+
+    def refresh_objective(self):
+        '''Rebuilds the objective after a parameter change, for its normalization constants'''
+        self.generate_objective_fxn()
+
+    def update_constraints(self, old_templates):
+        '''
+        Brings a built model in line with the current parameters: regenerates the parameters and the
+        templates, pushes the rows that differ from old_templates, and updates the flow bounds and the
+        objective. Returns the number of constraints changed.
+        '''
+        self.generate_parameters()
+        self.generate_templates()
+        dvars, layout = variable_layout(self.variable_blocks())
+        rhs_only = getattr(self, '_template_form', False)
+
+        changed = 0
+        for group, templates in sorted(self._templates.items()):
+            for name, template in sorted(templates.items()):
+                if self.lean:
+                    changed = changed + update_template_rows(self.model.get_cplex(), old_templates[group][name],
+                        template, self._constraints[group][name], self._columns, layout, self.time_range)
+                else:
+                    changed = changed + update_template(self.model, old_templates[group][name], template,
+                        self._constraints[group][name], dvars, layout, self.time_range, rhs_only)
+
+        # Flows are bounded by the smaller saturation flow of the two cells
+        reg = self.registry
+        flow_ub = np.minimum(self.max_flow[reg.edge_from], self.max_flow[reg.edge_to])
+        for e, ub in enumerate(flow_ub.tolist()):
+            for var in self.y_array[e]:
+                if var.ub != ub:
+                    var.ub = ub
+
+        self.refresh_objective()
+        return changed
+
+    def _current_templates(self):
+        # Templates of the parameters the model was last built or updated with
+        if getattr(self, '_templates', None) is None:
+            self.generate_templates()
+        return self._templates
+
+    def set_demand(self, demand):
+        '''Changes the demand (veh / hr / lane, per approach) of a built model'''
+        old_templates = self._current_templates()
+
+        if (isinstance(demand, int)):
+            demand = list([demand]*4)
+        elif (isinstance(demand, tuple)):
+            if (len(demand) == 2):
+                demand = list(demand) + list(demand)
+            else:
+                demand = list(demand)
+
+        self.demand = [(float) (x * self.time_step) / (3600) for x in demand]
+        return self.update_constraints(old_templates)
+
+    def set_preload(self, preload):
+        '''Changes the initial volume of the cells of a built model'''
+        old_templates = self._current_templates()
+        self.preload = preload
+        return self.update_constraints(old_templates)
+
+    def set_turn_ratios(self, r_left, r_through, r_right):
+        '''Changes the turn ratios of a built model'''
+        old_templates = self._current_templates()
+        self.turn_ratios = [r_left, r_through, r_right]
+        return self.update_constraints(old_templates)
+
+    def set_sat_flow_rate(self, sat_flow_rate):
+        '''Changes the saturation flow rate (veh / hr / lane) of a built model'''
+        old_templates = self._current_templates()
+        self.sat_flow_rate = (float) (sat_flow_rate * self.time_step) / (3600)
+        return self.update_constraints(old_templates)
+
+    def variable_name(self, var):
+        '''Readable name of a variable, also for anonymous models'''
+        if not self.model.ignore_names:
+            return var.name
+        return self._names.variable_name(var.index)
+
+    def constraint_name(self, ct):
+        '''Readable name of a constraint, also for anonymous models; lean models pass the row index'''
+        if not self.model.ignore_names:
+            return ct.name
+        return self._names.constraint_name(getattr(ct, 'index', ct))
+
+    def export_lp(self, path):
+        '''
+        Writes the model as an LP file. Anonymous models are named in the CPLEX engine just before
+        writing, so the names are only ever formatted for the export.
+        '''
+        if not self.model.ignore_names:
+            return self.model.export_as_lp(path)
+
+        # Bound changes are only sent to the engine on solve, so they are pushed explicitly here
+        cplex = self.model.get_cplex()
+        cplex.variables.set_upper_bounds([(v.index, v.ub) for v in self.model.iter_variables()])
+        cplex.variables.set_names([
+            (n, self._names.variable_name(n))
+            for n in range(self.model.number_of_variables)])
+        cplex.linear_constraints.set_names([
+            (n, self._names.constraint_name(n))
+            for n in range(cplex.linear_constraints.get_num())])
+        cplex.write(path, 'lp')
+        return path
+
+    def conflict_report(self):
+        '''
+        Runs the conflict refiner on an infeasible model; returns (name, status) pairs, where variable
+        bounds in the conflict are reported under the name of their variable
+        '''
+        from docplex.mp.conflict_refiner import ConflictRefiner, VarBoundWrapper
+
+        if self.lean:
+            raise ValueError("Lean models have no constraint objects to refine; rebuild the model without lean")
+
+        conflicts = ConflictRefiner().refine_conflict(self.model)
+        return [
+            (self.variable_name(c.element.var) if isinstance(c.element, VarBoundWrapper)
+                else self.constraint_name(c.element), c.status)
+            for c in conflicts.iter_conflicts()
+        ]
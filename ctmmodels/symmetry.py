@@ -0,0 +1,81 @@
+'''
+Approach symmetry of the intersection.
+
+Rotating the four approaches by r (approach k becomes approach k + r) maps the cell network onto itself,
+so a model with demand d and the model with the rotated demand are the same problem, with cells, edges and
+phases renamed. Which rotations are exact symmetries depends on the model's phasing constraints: all four
+for movement-based phasing, only the half turn for the alternate phasing and ring barrier models, whose
+phase conflicts are not invariant under a quarter turn. Reflections swap left and right turns, which the
+conflict sets do not allow, so they are never used.
+
+A demand vector (and its preload) is brought to a canonical orientation, the smallest rotation of it in
+lexicographic order, and solutions are moved between orientations by permuting the rows of the solution
+arrays.
+'''
+
+import numpy as np
+
+from ctmmodels.const import APPROACHES
+
+
+def rotate_cell(cell, r):
+    return (cell[0], cell[1], (cell[2] + r) % APPROACHES)
+
+
+def approach_demands(demand):
+    '''Demand per approach, as the models expand it: a single value for all, or a (NS, EW) pair'''
+    if isinstance(demand, (int, float)):
+        return [demand] * APPROACHES
+    demand = list(demand)
+    if len(demand) == 2:
+        return demand + demand
+    return demand
+
+
+def rotate_demand(demand, r):
+    '''Demand of the rotated problem: approach k + r gets the demand of approach k'''
+    return [demand[(k - r) % APPROACHES] for k in range(APPROACHES)]
+
+
+def rotate_preload(preload, r):
+    if preload is None:
+        return None
+    return {rotate_cell(c, r): v for c, v in preload.items()}
+
+
+class SymmetryMixin(object):
+
+    # Rotations of the approaches that map the model onto itself
+    approach_rotations = (0, 1, 2, 3)
+
+    def rotate_key(self, block, key, r):
+        '''Key, in the rotated problem, of the variable with the given key'''
+        if block == 'y':
+            return (rotate_cell(key[0], r), rotate_cell(key[1], r))
+        return rotate_cell(key, r)
+
+    @classmethod
+    def canonical_rotation(cls, demand, preload=None):
+        '''
+        Rotation r that brings a problem to its canonical orientation, with the rotated demand and preload.
+        The solution of the original problem is the canonical solution rotated by -r.
+        '''
+        demand = approach_demands(demand)
+
+        def orientation(r):
+            rotated = rotate_preload(preload, r)
+            return (rotate_demand(demand, r), sorted(rotated.items()) if rotated else [])
+
+        r = min(cls.approach_rotations, key=orientation)
+        return r, rotate_demand(demand, r), rotate_preload(preload, r)
+
+    def rotate_solution(self, values, r):
+        '''Solution arrays of the problem rotated by r, from those of this one'''
+        rotated = {}
+        for block, keys, _ in self.variable_blocks():
+            rows = {k: n for n, k in enumerate(keys)}
+            order = np.array([rows[self.rotate_key(block, k, r)] for k in keys], dtype=np.int32)
+
+            rotated[block] = np.empty_like(values[block])
+            rotated[block][order] = values[block]
+        return rotated
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ctmmodels.archive import SolutionArchive, archived_mip_start, plan_mip_start
+from ctmmodels.test_results import PARAMETERS, needs_solver
+
+
+def solved_model(**weights):
+    from ctmmodels.ringbarrier import DTSimplexRingBarrier
+
+    model = DTSimplexRingBarrier(**dict(PARAMETERS, **weights))
+    model.generate()
+    model.solve()
+    return model
+
+
+@needs_solver
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_partial_mip_start(self):
+        archive = SolutionArchive()
+        archive.add(solved_model(alpha=1.0, beta=0.0, gamma=0.0))
+
+        model = solved_model(alpha=0.2, beta=0.4, gamma=0.4)
+        cold = model.model.objective_value
+
+        start = archived_mip_start(model, archive)
+        solution, effort = start
+        self.assertEqual(effort, 'repair')
+        # Only the plan: CPLEX completes the continuous variables within the solve
+        self.assertEqual(len(list(solution.iter_var_values())), model.model.number_of_binary_variables)
+
+        model.solve(mip_start=[None, start])
+        self.assertAlmostEqual(model.model.objective_value, cold, places=6)
+
+    def test_unrepairable_plan(self):
+        model = solved_model()
+        cold = model.model.objective_value
+        # Every phase green at once breaks the phase constraints
+        start = plan_mip_start(model, np.ones(model.model.number_of_binary_variables, dtype=np.uint8))
+        model.solve(mip_start=start)
+        self.assertAlmostEqual(model.model.objective_value, cold, places=6)
+
+        self.assertIsNone(plan_mip_start(model, np.ones(3, dtype=np.uint8)))
+
+    def test_saves_every_few_plans(self):
+        path = os.path.join(self.path, 'archive.pkl')
+        archive = SolutionArchive(path, save_every=2)
+        model = solved_model()
+
+        archive.add(model)
+        self.assertFalse(os.path.exists(path))
+        archive.add(model)
+        self.assertEqual(len(SolutionArchive(path)), 2)
+        archive.add(model)
+        self.assertEqual(len(SolutionArchive(path)), 2)
+
+    def test_interrupted_sweep_keeps_its_plans(self):
+        from batchrunners.generators.dataframe import DataframeGenerator
+        from batchrunners.test_store import small_parameters
+
+        class Interrupted(DataframeGenerator):
+            def record_point(self, *args, **kwargs):
+                if len(self.archive) == 2:
+                    raise KeyboardInterrupt
+                return super(Interrupted, self).record_point(*args, **kwargs)
+
+        path = os.path.join(self.path, 'archive.pkl')
+        dg = Interrupted(parameters=small_parameters(), time_range=4, df_path=self.path,
+                         archive=SolutionArchive(path))
+        points = [(1.0, 0.0, 0.0), (0.5, 0.5, 0.0), (0.0, 1.0, 0.0)]
+        with self.assertRaises(KeyboardInterrupt):
+            dg.run_on_simplex((450, 900), simplex_slice=points)
+        self.assertEqual(len(SolutionArchive(path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
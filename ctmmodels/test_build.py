@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import unittest
+
+from ctmmodels.modelcache import ModelCache
+from ctmmodels.test_results import PARAMETERS, needs_solver
+
+BUILDS = ('rows', 'bulk', 'anonymous', 'lean', 'cached')
+
+FLAGS = dict(bulk=dict(bulk_build=True), anonymous=dict(anonymous=True), lean=dict(lean=True))
+
+
+def cell_preload(model_class, volume=1.0):
+    '''Preload of every cell of a model'''
+    model = model_class(**PARAMETERS)
+    model.generate_sets()
+    return {cell: volume for cell in model.S}
+
+
+class BuildModesTest(object):
+    '''Every way of building a model gives the same rows and the same optimum as the row by row build'''
+
+    model_class = None
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ModelCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def build(self, how, **parameters):
+        parameters = dict(PARAMETERS, **dict(FLAGS.get(how, {}), **parameters))
+        model = self.model_class(**parameters)
+        if how == 'cached':
+            # The first build of a structure is saved, the second one loaded
+            self.cache.generate(self.model_class(**parameters))
+            hits = self.cache.hits
+            self.cache.generate(model)
+            self.assertEqual(self.cache.hits, hits + 1)
+            return model
+
+        model.generate()
+        return model
+
+    def solved(self, model):
+        model.solve()
+        return (model.model.get_cplex().linear_constraints.get_num(), round(model.model.objective_value, 6))
+
+    def check_update(self, how, update, **parameters):
+        '''A model built with the original parameters and then updated solves like a fresh build'''
+        model = self.build(how)
+        self.solved(model)
+        update(model)
+        self.assertEqual(self.solved(model), self.solved(self.build('rows', **parameters)), how)
+
+    def test_build_modes(self):
+        expected = self.solved(self.build('rows'))
+        for how in BUILDS[1:]:
+            self.assertEqual(self.solved(self.build(how)), expected, how)
+
+    def test_set_weights(self):
+        weights = dict(alpha=0.2, beta=0.1, gamma=0.7)
+        for how in BUILDS:
+            self.check_update(how, lambda model: model.set_weights(**weights), **weights)
+
+    def test_set_demand(self):
+        demand = (900, 300)
+        for how in BUILDS:
+            self.check_update(how, lambda model: model.set_demand(demand), demand=demand)
+
+    def test_set_preload(self):
+        preload = cell_preload(self.model_class)
+        for how in BUILDS:
+            self.check_update(how, lambda model: model.set_preload(preload), preload=preload)
+
+
+@needs_solver
+class RingBarrierBuildTest(BuildModesTest, unittest.TestCase):
+
+    @property
+    def model_class(self):
+        from ctmmodels.ringbarrier import DTSimplexRingBarrier
+        return DTSimplexRingBarrier
+
+
+@needs_solver
+class AlternatePhasingBuildTest(BuildModesTest, unittest.TestCase):
+
+    @property
+    def model_class(self):
+        from ctmmodels.delaythroughput import DelayThroughputSimplex
+        return DelayThroughputSimplex
+
+
+@needs_solver
+class ParentModelBuildTest(BuildModesTest, unittest.TestCase):
+
+    @property
+    def model_class(self):
+        from ctmmodels.delaythroughput import DTSimplexParentModel
+        return DTSimplexParentModel
+
+
+if __name__ == '__main__':
+    unittest.main()
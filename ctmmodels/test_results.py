@@ -0,0 +1,84 @@
+import sys
+import unittest
+
+import numpy as np
+
+try:
+    import docplex
+except ImportError:
+    docplex = None
+
+# The models are Python 2 code (integer division, list comprehension scoping)
+needs_solver = unittest.skipIf(docplex is None or sys.version_info[0] > 2, 'needs docplex on Python 2')
+
+# Small enough for the promotional CPLEX
+PARAMETERS = dict(demand=(450, 900), time_range=4, g_min=2, g_max=4, alpha=0.5, beta=0.3, gamma=0.2)
+
+
+@needs_solver
+class GreenRoundingTest(unittest.TestCase):
+
+    def check_model(self, model_class):
+        model = model_class(**PARAMETERS)
+        model.generate()
+        model.solve()
+        values = model.solution_arrays()
+        _, _, expected = model.return_solution(values)
+
+        # Binaries within the integrality tolerance of the solver
+        near = dict(values, g=np.where(values['g'] > 0.5, values['g'] - 1e-7, values['g'] + 1e-7))
+        _, _, df_g = model.return_solution(near)
+
+        self.assertTrue(expected.values.any())
+        np.testing.assert_array_equal(df_g.values, expected.values)
+        np.testing.assert_array_equal(model.kpis(near).green_share, model.kpis(values).green_share)
+
+    def test_ring_barrier(self):
+        from ctmmodels.ringbarrier import DTSimplexRingBarrier
+        self.check_model(DTSimplexRingBarrier)
+
+    def test_alternate_phasing(self):
+        from ctmmodels.delaythroughput import DelayThroughputSimplex
+        self.check_model(DelayThroughputSimplex)
+
+    def test_parent_model(self):
+        from ctmmodels.delaythroughput import DTSimplexParentModel
+        self.check_model(DTSimplexParentModel)
+
+
+@needs_solver
+class KPITest(unittest.TestCase):
+
+    def test_model_without_greens(self):
+        from ctmmodels.base import BaseModel
+
+        model = BaseModel(demand=450, time_range=3, g_min=1, g_max=2)
+        model.generate()
+        model.solve()
+
+        kpis = model.kpis()
+        self.assertIsNone(kpis.green_share)
+        self.assertEqual(model.return_objective_value(), kpis.delay)
+        self.assertEqual(model.return_volume(), [3.0] * 4)
+        self.assertEqual(model.return_delay_equity(), [0.0] * 4)
+
+    def test_green_share(self):
+        from ctmmodels.ringbarrier import DTSimplexRingBarrier
+
+        model = DTSimplexRingBarrier(**PARAMETERS)
+        model.generate()
+        model.solve()
+        values = model.solution_arrays()
+
+        kpis = model.kpis(values)
+        np.testing.assert_allclose(kpis.green_share, model.movement_greens(values).mean(axis=1))
+        self.assertTrue(((kpis.green_share >= 0) & (kpis.green_share <= 1)).all())
+        self.assertAlmostEqual(kpis.delay, float(np.sum(kpis.approach_delay)))
+
+        # The green frame shows the greens the KPIs are computed from
+        _, _, df_g = model.return_solution(values)
+        np.testing.assert_array_equal(df_g.values.T, model.movement_greens(values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from ctmmodels.symmetry import approach_demands, rotate_demand, rotate_preload
+from ctmmodels.test_results import needs_solver
+
+# Different on every approach, so that no rotation maps the demand onto itself
+DEMAND = (300, 900, 450, 600)
+
+PARAMETERS = dict(time_range=4, g_min=2, g_max=4, alpha=0.5, beta=0.3, gamma=0.2)
+
+
+class CanonicalRotationTest(unittest.TestCase):
+
+    def test_rotations_share_their_canonical_form(self):
+        from ctmmodels.symmetry import SymmetryMixin
+
+        preload = {(1, 0, 0): 1.0, (2, 1, 3): 2.0}
+        canonical = SymmetryMixin.canonical_rotation(DEMAND, preload)
+        for r in range(4):
+            r_canonical, demand, rotated = SymmetryMixin.canonical_rotation(
+                rotate_demand(list(DEMAND), r), rotate_preload(preload, r))
+            self.assertEqual(demand, canonical[1])
+            self.assertEqual(rotated, canonical[2])
+            # Rotating by r and then by r_canonical is the canonical rotation
+            self.assertEqual((r + r_canonical) % 4, canonical[0])
+
+    def test_pair_demands(self):
+        self.assertEqual(approach_demands((450, 900)), [450, 900, 450, 900])
+        self.assertEqual(approach_demands(600), [600] * 4)
+
+
+def pin_solution(model, values):
+    '''Fixes every variable of a built model to the given solution arrays'''
+    for block, _, array in model.variable_blocks():
+        for var, value in zip(array.ravel(), values[block].ravel()):
+            var.lb = var.ub = value
+
+
+@needs_solver
+class RotatedSolutionTest(unittest.TestCase):
+    '''A solution rotated by a symmetry of the model is an optimal solution of the rotated demand'''
+
+    def check_model(self, model_class):
+        model = model_class(demand=DEMAND, **PARAMETERS)
+        model.generate()
+        model.solve()
+        values = model.solution_arrays()
+        objective = model.model.objective_value
+
+        for r in model_class.approach_rotations[1:]:
+            fresh = model_class(demand=rotate_demand(list(DEMAND), r), **PARAMETERS)
+            fresh.generate()
+            fresh.solve()
+            self.assertAlmostEqual(fresh.model.objective_value, objective, places=6)
+
+            rotated = model.rotate_solution(values, r)
+            expected = fresh.kpis()
+            kpis = fresh.kpis(rotated, objective)
+            self.assertAlmostEqual(kpis.delay, expected.delay, places=6)
+            self.assertAlmostEqual(kpis.throughput, expected.throughput, places=6)
+            np.testing.assert_allclose(kpis.approach_delay, expected.approach_delay, atol=1e-6)
+
+            # The rotated solution is feasible for the rotated demand, with the same objective
+            pin_solution(fresh, dict(rotated, **{k: np.rint(v) for k, v in rotated.items() if k in ('g', 'b', 'r')}))
+            fresh.solve()
+            self.assertIsNotNone(fresh.model.solution)
+            self.assertAlmostEqual(fresh.model.objective_value, objective, places=6)
+
+    def test_ring_barrier(self):
+        from ctmmodels.ringbarrier import DTSimplexRingBarrier
+        self.check_model(DTSimplexRingBarrier)
+
+    def test_alternate_phasing(self):
+        from ctmmodels.delaythroughput import DelayThroughputSimplex
+        self.check_model(DelayThroughputSimplex)
+
+    def test_parent_model(self):
+        from ctmmodels.delaythroughput import DTSimplexParentModel
+        self.check_model(DTSimplexParentModel)
+
+
+if __name__ == '__main__':
+    unittest.main()